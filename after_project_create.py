@@ -22,9 +22,185 @@ the following keyword arguments:
                standard logger methods (info, warning, error etc)
 
 """
+import os
+import sys
+import time
+
+# code shared between the hooks of this configuration lives in hooks/lib,
+# which pick_environment adds to sys.path. This runs in the process setting
+# the project up, before any engine, see cbfx.
+_HOOKS_LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hooks", "lib")
+if _HOOKS_LIB not in sys.path:
+    sys.path.append(_HOOKS_LIB)
+
+from cbfx import lut_manifest
+from cbfx import schema_folders
+
+# Pipeline steps the config expects: (code, short_name, entity_type)
+PIPELINE_STEPS = [
+    ("Editorial", "edit", "Shot"),
+    ("Roto", "roto", "Shot"),
+    ("Paint", "paint", "Shot"),
+    ("Tracking", "track", "Shot"),
+    ("Comp", "comp", "Shot"),
+    ("Model", "model", "Asset"),
+    ("Texture", "tex", "Asset"),
+    ("Comp", "comp", "Asset"),
+]
+
+# Task templates: code -> (entity_type, [(task content, step short_name)])
+TASK_TEMPLATES = {
+    "CBFX Shot - Comp": ("Shot", [("roto", "roto"), ("paint", "paint"), ("comp", "comp")]),
+    "CBFX Shot - Track and Comp": ("Shot", [("track", "track"), ("comp", "comp")]),
+    "CBFX Asset - Element": ("Asset", [("comp", "comp")]),
+}
+
+# Project folders created up front, relative to the project folder of the schema.
+BOOTSTRAP_FOLDERS = ["editorial/luts", "delivery", "reference"]
+
+# LUT area of the project, as the lut_root template of core/templates.yml.
+LUT_ROOT = "editorial/luts"
+
+# Steps are shared by all the projects of the site, the missing ones are only
+# created when this environment variable is set to 1.
+CREATE_STEPS_ENV = "CBFX_CREATE_STEPS"
+
+# Local storage path field for the current platform.
+if sys.platform == "win32":
+    STORAGE_PATH_FIELD = "windows_path"
+elif sys.platform == "darwin":
+    STORAGE_PATH_FIELD = "mac_path"
+else:
+    STORAGE_PATH_FIELD = "linux_path"
+
 
 def create(sg, project_id, log, **kwargs):
     """
-    Insert post-project code here
+    Seeds the Shotgun data and creates the initial folders of the project.
+
+    The LUTs of the project live in its ``editorial/luts`` folder, on the
+    primary storage: no LocalStorage is created for them, a storage is
+    shared by the whole site and mapped in core/roots.yml. Their folders are
+    created with the others and their manifest is written, see
+    :mod:`cbfx.lut_manifest`.
+    """
+    start = time.time()
+    seed_steps(sg, log, create=os.environ.get(CREATE_STEPS_ENV) == "1")
+    seed_task_templates(sg, log)
+    create_bootstrap_folders(sg, project_id, log)
+    log.info("Project bootstrap done in %.2fs" % (time.time() - start))
+
+
+def seed_steps(sg, log, create=False):
+    """
+    Creates the missing pipeline steps, in a single batch.
+
+    :param bool create: Whether to create them. Steps are shared by all the
+        projects of the site, they are only reported by default.
     """
-    pass
+    existing = set(
+        (s["short_name"], s["entity_type"])
+        for s in sg.find("Step", [], ["short_name", "entity_type"])
+    )
+    requests = [
+        {
+            "request_type": "create",
+            "entity_type": "Step",
+            "data": {"code": code, "short_name": short_name, "entity_type": entity_type},
+        }
+        for (code, short_name, entity_type) in PIPELINE_STEPS
+        if (short_name, entity_type) not in existing
+    ]
+    if requests and not create:
+        log.warning(
+            "Pipeline steps missing from the site, the tasks of the task templates "
+            "using them get no step: %s. Set %s=1 to create them." % (
+                ", ".join("%s (%s)" % (r["data"]["short_name"], r["data"]["entity_type"]) for r in requests),
+                CREATE_STEPS_ENV,
+            )
+        )
+        return
+    if requests:
+        sg.batch(requests)
+    log.info("Pipeline steps: %d created, %d already existing" % (
+        len(requests), len(PIPELINE_STEPS) - len(requests)))
+
+
+def seed_task_templates(sg, log):
+    """
+    Creates the missing task templates and their tasks, in two batches.
+    """
+    existing = set(t["code"] for t in sg.find("TaskTemplate", [], ["code"]))
+    missing = sorted(code for code in TASK_TEMPLATES if code not in existing)
+    if not missing:
+        log.info("Task templates: all %d already existing" % len(TASK_TEMPLATES))
+        return
+
+    templates = sg.batch([
+        {
+            "request_type": "create",
+            "entity_type": "TaskTemplate",
+            "data": {"code": code, "entity_type": TASK_TEMPLATES[code][0]},
+        }
+        for code in missing
+    ])
+
+    steps = dict(
+        ((s["short_name"], s["entity_type"]), s)
+        for s in sg.find("Step", [], ["short_name", "entity_type"])
+    )
+    requests = []
+    for template in templates:
+        (entity_type, tasks) = TASK_TEMPLATES[template["code"]]
+        for (content, step) in tasks:
+            data = {
+                "content": content,
+                "task_template": {"type": "TaskTemplate", "id": template["id"]},
+            }
+            if (step, entity_type) in steps:
+                data["step"] = {"type": "Step", "id": steps[(step, entity_type)]["id"]}
+            requests.append({"request_type": "create", "entity_type": "Task", "data": data})
+    if requests:
+        sg.batch(requests)
+
+    log.info("Task templates: %d created with %d tasks" % (len(templates), len(requests)))
+
+
+def create_bootstrap_folders(sg, project_id, log):
+    """
+    Creates the editorial/luts, delivery and reference folders of the project,
+    including the LUT folders of all its sequences and shots.
+    """
+    config_root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(config_root, "core", "roots.yml")) as f:
+        roots = schema_folders.yaml.safe_load(f)
+
+    schema = schema_folders.load_schema(os.path.join(config_root, "core", "schema"))
+    project_folder = schema["primary"]
+
+    storage = sg.find_one(
+        "LocalStorage",
+        [["id", "is", roots["primary"]["shotgun_storage_id"]]],
+        [STORAGE_PATH_FIELD],
+    )
+    project = sg.find_one("Project", [["id", "is", project_id]], ["tank_name", "name"])
+    if not storage or not storage.get(STORAGE_PATH_FIELD) or not project.get("tank_name"):
+        log.warning("Unable to find the project folder, skipping folder creation.")
+        return
+
+    entities = schema_folders.fetch_entities(sg, project, ["Sequence", "Shot"])
+    log.info("Expanding the folder schema for %d sequences and %d shots" % (
+        len(entities["Sequence"]), len(entities["Shot"])))
+
+    project_path = os.path.join(storage[STORAGE_PATH_FIELD], project["tank_name"])
+    (folders, copies) = schema_folders.plan_tree(
+        project_folder, project_path, project, entities, BOOTSTRAP_FOLDERS
+    )
+    stats = schema_folders.create_folders(folders, copies)
+    log.info("Created %d of %d folders and %d files in %.2fs" % (
+        stats["created"], stats["planned"], stats["copied"], stats["seconds"]))
+
+    lut_root = os.path.join(project_path, *LUT_ROOT.split("/"))
+    if os.path.isdir(lut_root):
+        (manifest, _) = lut_manifest.refresh(lut_root)
+        log.info("Wrote the LUT manifest of %d folders" % len(manifest.folders))
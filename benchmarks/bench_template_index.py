@@ -0,0 +1,137 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Compares ``Sgtk.template_from_path`` with the config template index.
+
+Publish paths are generated from the shot, asset and review templates of
+the configuration, then matched with both lookups. Requires tk-core::
+
+    python benchmarks/bench_template_index.py /path/to/pipeline_configuration
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hooks", "lib"))
+
+from cbfx import template_index
+
+# Templates the publish paths are generated from.
+TEMPLATE_NAMES = [
+    "nuke_shot_work",
+    "nuke_shot_publish",
+    "nuke_shot_main_publish",
+    "nuke_shot_precomp_publish",
+    "nuke_shot_matte_publish",
+    "nuke_shot_review_filename",
+    "nuke_shot_review_publish",
+    "nuke_shot_render_movie",
+    "maya_shot_publish",
+    "houdini_shot_render",
+    "hiero_plate_path",
+    "nuke_asset_publish",
+    "nuke_asset_main_publish",
+    "nuke_asset_review_publish",
+    "maya_asset_publish",
+    "houdini_asset_publish",
+    "photoshop_asset_publish",
+]
+
+# Values used for the template keys, by key type.
+SAMPLE_VALUES = {
+    "StringKey": "abc010",
+    "IntegerKey": 12,
+    "SequenceKey": 1001,
+}
+
+
+def sample_paths(tk, count):
+    """
+    Returns publish paths generated from :data:`TEMPLATE_NAMES`.
+    """
+    paths = []
+    for name in TEMPLATE_NAMES:
+        template = tk.templates.get(name)
+        if template is None:
+            continue
+        for i in range(count):
+            fields = {}
+            for (key_name, key) in template.keys.items():
+                value = SAMPLE_VALUES.get(type(key).__name__, "abc")
+                if isinstance(value, int):
+                    value += i
+                else:
+                    value = "%s%03d" % (value, i)
+                fields[key_name] = value
+            try:
+                paths.append(template.apply_fields(fields))
+            except Exception:
+                break
+    return paths
+
+
+def timed(func, paths, iterations):
+    start = time.time()
+    for _ in range(iterations):
+        for path in paths:
+            try:
+                func(path)
+            except Exception:
+                pass
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("config", help="Path to the pipeline configuration.")
+    parser.add_argument("--paths", type=int, default=20, help="Paths per template.")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    import sgtk
+
+    tk = sgtk.sgtk_from_path(args.config)
+    paths = sample_paths(tk, args.paths)
+
+    start = time.time()
+    index = template_index.TemplateIndex(tk.templates)
+    build = time.time() - start
+
+    mismatches = 0
+    for path in paths:
+        try:
+            expected = tk.template_from_path(path)
+        except sgtk.TankError:
+            expected = None
+        try:
+            found = index.template_from_path(path)
+        except ValueError:
+            found = None
+        mismatches += expected is not found
+
+    baseline = timed(tk.template_from_path, paths, args.iterations)
+    indexed = timed(index.template_from_path, paths, args.iterations)
+    lookups = len(paths) * args.iterations
+    candidates = sum(len(index.candidates(p)) for p in paths) / float(len(paths) or 1)
+
+    print("templates:        %d" % len(tk.templates))
+    print("paths:            %d" % len(paths))
+    print("index build:      %.2f ms" % (build * 1000))
+    print("candidates/path:  %.1f" % candidates)
+    print("template_from_path: %.1f us/lookup" % (baseline * 1e6 / lookups))
+    print("template index:     %.1f us/lookup" % (indexed * 1e6 / lookups))
+    print("speedup:          %.1fx" % (baseline / (indexed or 1e-9)))
+    print("mismatches:       %d" % mismatches)
+
+
+if __name__ == "__main__":
+    main()
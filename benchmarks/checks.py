@@ -0,0 +1,462 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Checks the caches and indexes of the config hooks are invalidated when what
+they cache changes, against the stand-ins of :mod:`harness`::
+
+    python benchmarks/checks.py
+
+The benchmarks tell how fast the warm paths are, these checks that they
+still return what the cold paths would. Each check raises AssertionError on
+a mismatch, the run fails when any check does.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import traceback
+import types
+
+import harness
+import run_benchmarks
+
+
+def touch(path):
+    """
+    Moves the modification time of a file or folder a second ahead, changes
+    made within a tick of the file system clock don't show otherwise.
+    """
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def write(path, data=""):
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(path, "w") as f:
+        f.write(data)
+    touch(folder)
+
+
+def remove(path):
+    os.remove(path)
+    touch(os.path.dirname(path))
+
+
+class Item(object):
+    """
+    Stand-in for a publish2 item.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.properties = {}
+
+
+##############################################################################################################
+# checks
+#
+# Each check takes the environment, see run_benchmarks.Environment, and
+# leaves it as it found it.
+
+def check_shotgun_cache(env):
+    from cbfx import shotgun_cache
+
+    cache = shotgun_cache.EntityCache(ttl=60, max_size=2)
+    cache.put({"type": "Shot", "id": 1, "code": "a"})
+    assert cache.get("Shot", 1, ["code"]) == {"type": "Shot", "id": 1, "code": "a"}
+    assert cache.get("Shot", 1, ["code", "sg_sequence"]) is None, "missing field served"
+
+    cache.put({"type": "Shot", "id": 1, "sg_sequence": None})
+    assert cache.get("Shot", 1, ["code", "sg_sequence"]) is not None, "fields not merged"
+
+    cache.put({"type": "Shot", "id": 2, "code": "b"})
+    cache.get("Shot", 1, ["code"])
+    cache.put({"type": "Shot", "id": 3, "code": "c"})
+    assert cache.get("Shot", 2, ["code"]) is None, "least recently used record kept"
+    assert cache.get("Shot", 1, ["code"]) is not None
+
+    cache.invalidate("Shot", 1)
+    assert cache.get("Shot", 1, ["code"]) is None
+    assert cache.get("Shot", 3, ["code"]) is not None
+    cache.invalidate()
+    assert len(cache) == 0
+
+    expired = shotgun_cache.EntityCache(ttl=-1)
+    expired.put({"type": "Shot", "id": 1, "code": "a"})
+    assert expired.get("Shot", 1, ["code"]) is None, "expired record served"
+
+
+def check_context_change(env):
+    app = harness.FakeApp(env.tk)
+    hook = harness.load_hook("core/hooks/context_change.py", "ContextChange", app)
+    module = run_benchmarks.hook_module(hook)
+
+    lut_root = os.path.join(env.root, "editorial", "luts")
+    shot_luts = os.path.join(lut_root, "sq010", "sq010_0010")
+    manifest = module.lut_manifest.manifest_path(lut_root)
+    site = env.context()
+    shot = env.shot_context()
+
+    module.shotgun_cache.invalidate()
+    module._first_file_cache.clear()
+    hook.post_context_change(site, shot)
+    assert os.environ["SHOT"] == "sq010_0010"
+    assert os.environ["SEQUENCE"] == "sq010"
+    assert os.environ["SHOT_CC"] == os.path.join(shot_luts, "grade.cube")
+
+    # names come from the entity cache until an engine starts
+    env.shotgun.calls.reset()
+    hook.post_context_change(site, shot)
+    assert env.shotgun.calls.total() == 0, "warm context change queried Shotgun"
+    module.shotgun_cache.invalidate()
+    hook.post_context_change(site, shot)
+    assert env.shotgun.calls.total() == 1, "invalidated entity cache not queried"
+
+    try:
+        # the CC file follows the folder, through the folder cache
+        remove(os.path.join(shot_luts, "grade.cube"))
+        write(os.path.join(shot_luts, "shot.cube"))
+        hook.post_context_change(site, shot)
+        assert os.environ["SHOT_CC"] == os.path.join(shot_luts, "shot.cube"), "stale first_file"
+
+        # and through a manifest written before the change
+        module.lut_manifest.refresh(lut_root)
+        hook.post_context_change(site, shot)
+        assert os.environ["SHOT_CC"] == os.path.join(shot_luts, "shot.cube")
+        remove(os.path.join(shot_luts, "shot.cube"))
+        write(os.path.join(shot_luts, "grade.cube"))
+        hook.post_context_change(site, shot)
+        assert os.environ["SHOT_CC"] == os.path.join(shot_luts, "grade.cube"), "stale manifest entry"
+
+        # a folder emptied since
+        remove(os.path.join(shot_luts, "grade.cube"))
+        hook.post_context_change(site, shot)
+        assert "SHOT_CC" not in os.environ, "CC file of an empty folder"
+        write(os.path.join(shot_luts, "grade.cube"))
+    finally:
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    # records missing from Shotgun leave their variables unset
+    module.shotgun_cache.invalidate()
+    ghost = env.context(project=env.project, entity={"type": "Shot", "id": 1, "name": "ghost"})
+    env_values = module.context_env(ghost)
+    assert env_values["SHOT"] is None and env_values["SEQUENCE"] is None
+    assert env_values["PROJECT"] == "bench"
+
+
+def check_sequence_scan(env):
+    app = harness.FakeApp(env.tk, context=env.shot_context())
+    hook = harness.load_hook("hooks/tk-multi-loader2/tk-nuke_actions.py", "NukeActions", app)
+    module = run_benchmarks.hook_module(hook)
+    module.clear_directory_cache()
+
+    folder = os.path.dirname(env.gap_sequence)
+    scan = module.scan_sequence(env.gap_sequence)
+    assert scan.missing_frames == list(run_benchmarks.GAP_FRAMES)
+    assert module.scan_sequence(env.gap_sequence) is scan, "unchanged folder scanned again"
+
+    frame = os.path.join(folder, "comp.1010.exr")
+    padded = os.path.join(folder, "comp.01011.exr")
+    try:
+        write(frame)
+        write(padded)
+        scan = module.scan_sequence(env.gap_sequence)
+        assert scan.missing_frames == [1012, 1050], "new frames not found"
+        assert len(scan.frames) == len(set(scan.frames))
+    finally:
+        remove(frame)
+        remove(padded)
+
+    write(os.path.join(folder, "comp.01001.exr"))
+    try:
+        scan = module.scan_sequence(env.gap_sequence)
+        assert scan.frames.count(1001) == 1, "frame counted once per padding"
+    finally:
+        remove(os.path.join(folder, "comp.01001.exr"))
+    assert module.scan_sequence(env.gap_sequence).missing_frames == list(run_benchmarks.GAP_FRAMES)
+
+
+def check_template_index(env):
+    from cbfx import template_index
+
+    index = template_index.get_index(env.tk)
+    assert template_index.get_index(env.tk) is index
+    script = env.tk.templates["nuke_shot_script"]
+    assert index.template_from_path(env.script) is script
+    assert index.template_from_path(os.path.join(env.root, "elsewhere", "comp.nk")) is None
+
+    # templates of files without an extension
+    templates = dict(env.tk.templates)
+    templates["nuke_shot_notes"] = harness.FakeTemplate(
+        "nuke_shot_notes", "sequences/{Sequence}/{Shot}/publish/notes/{name}", env.root
+    )
+    notes = os.path.join(env.root, "sequences", "sq010", "sq010_0010", "publish", "notes", "README")
+    tk = harness.FakeTk(env.shotgun, templates, config_path=env.root)
+    index = template_index.get_index(tk)
+    assert index.template_from_path(notes) is templates["nuke_shot_notes"], "extensionless template missed"
+
+    # reloaded templates, matching a path twice
+    templates = dict(templates)
+    templates["nuke_shot_notes_any"] = harness.FakeTemplate(
+        "nuke_shot_notes_any", "sequences/{Sequence}/{Shot}/publish/{kind}/{name}", env.root
+    )
+    tk.templates = templates
+    assert template_index.get_index(tk) is not index, "index of reloaded templates kept"
+    try:
+        template_index.get_index(tk).template_from_path(notes)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ambiguous path resolved to a single template")
+
+
+def check_nuke_tools_index(env):
+    from cbfx import nuke_tools_index
+
+    tree = os.path.join(env.root, "nuke_tools", "_all", "gizmos", "cbfx")
+    (index, _) = nuke_tools_index.refresh(tree, nuke_tools_index.GIZMOS)
+    index = nuke_tools_index.load(tree, nuke_tools_index.GIZMOS)
+    assert index.is_current()
+    count = len(index.tools())
+
+    category = os.path.join(tree, "category03")
+    gizmo = os.path.join(category, "added.gizmo")
+    icons = os.path.join(tree, "icons")
+    try:
+        # a change deep in the tree
+        write(gizmo)
+        assert not index.is_current(), "change in a sub folder missed"
+        updated = nuke_tools_index.scan(tree, nuke_tools_index.GIZMOS, index)
+        assert len(updated.tools()) == count + 1
+        assert gizmo in [t.path for t in updated.tools()], "updated index misses the new tool"
+        assert updated.is_current()
+
+        # folders holding icons only are on the plugin path
+        write(os.path.join(icons, "added.png"))
+        updated = nuke_tools_index.scan(tree, nuke_tools_index.GIZMOS, updated)
+        assert icons in updated.tool_folders(), "icon folder left out"
+    finally:
+        remove(gizmo)
+        shutil.rmtree(icons)
+        touch(tree)
+    nuke_tools_index.refresh(tree, nuke_tools_index.GIZMOS)
+    assert len(nuke_tools_index.load(tree, nuke_tools_index.GIZMOS).tools()) == count
+
+    # terminal sessions only get the plugin path
+    env.nuke.calls.reset()
+    nuke_tools_index.register(nuke_tools_index.load(tree, nuke_tools_index.GIZMOS), "CBFX", menus=False)
+    assert env.nuke.calls.counts["pluginAddPath"] > 0
+    assert env.nuke.calls.counts["addMenu"] == 0, "menus built without a GUI"
+
+
+def check_work_scan_cache(env):
+    from cbfx import work_scan_cache
+
+    area = harness.FakeTemplate("nuke_shot_work_area", "work/{Shot}", env.root)
+    work = harness.FakeTemplate("nuke_shot_work", "work/{Shot}/nuke/{name}.v{version}.nk", env.root)
+    (area.parent, work.parent) = (None, area)
+    nuke = os.path.join(env.root, "work", "sq010_0010", "nuke")
+    fields = {"Shot": "sq010_0010", "name": "comp"}
+    tk = harness.FakeTk(env.shotgun, {"nuke_shot_work": work})
+
+    try:
+        write(os.path.join(nuke, "comp.v001.nk"))
+        write(os.path.join(nuke, "comp.v002.nk"))
+        write(os.path.join(nuke, "light.v001.nk"))
+        paths = work_scan_cache.paths_from_template(tk, work, fields, ["version"])
+        assert sorted(os.path.basename(p) for p in paths) == ["comp.v001.nk", "comp.v002.nk"]
+
+        write(os.path.join(nuke, "comp.v003.nk"))
+        paths = work_scan_cache.paths_from_template(tk, work, fields, ["version"])
+        assert len(paths) == 3, "file saved since the scan missed"
+        path = work_scan_cache.cache_path(os.path.join(env.root, "work", "sq010_0010"), work)
+        assert work_scan_cache.is_current(work_scan_cache.load(path)), "cache file not updated"
+
+        # a template redefined since the scan, over the same unchanged area
+        redefined = harness.FakeTemplate("nuke_shot_work", "work/{Shot}/nuke/{name}.v{version}.{ext}", env.root)
+        redefined.parent = area
+        paths = work_scan_cache.paths_from_template(tk, redefined, dict(fields, ext="nk"), ["version"])
+        assert len(paths) == 3, "scan of the previous definition used"
+        assert work_scan_cache.cache_path(os.path.dirname(nuke), redefined) != path
+
+        # abstract values are matched by Toolkit
+        work.keys["version"] = types.SimpleNamespace(is_abstract=True)
+        tk.calls.reset()
+        work_scan_cache.paths_from_template(tk, work, dict(fields, version="%03d"))
+        assert tk.calls.counts["paths_from_template"] == 1, "abstract lookup not left to Toolkit"
+    finally:
+        shutil.rmtree(os.path.join(env.root, "work"))
+
+
+def check_publish_batch(env):
+    from cbfx import publish_batch
+    from cbfx import transfer
+
+    work = os.path.join(env.root, "publish_check", "work", "comp.v001.nk")
+    published = os.path.join(env.root, "publish_check", "publish", "comp.v001.nk")
+    write(work, "Root {}\n")
+
+    try:
+        root = Item()
+        parent = Item(root)
+        child = Item(parent)
+        batch = publish_batch.current(parent, publish_batch.PUBLISH)
+        batch.add_publish(
+            parent, {"type": "PublishedFile", "code": "comp.v001.nk"}, [(work, published)],
+            manifest=transfer.manifest_path(published),
+        )
+        assert publish_batch.current(child, publish_batch.PUBLISH) is batch
+        batch.add_publish(child, {"type": "PublishedFile", "code": "comp.v001.exr"}, [])
+        assert publish_batch.current(parent, publish_batch.VERSION) is batch
+        batch.add_version(parent, {"code": "comp.v001"})
+        assert publish_batch.queued(child, publish_batch.PUBLISH) is batch
+        assert publish_batch.queued(child, publish_batch.VERSION) is None
+
+        env.shotgun.calls.reset()
+        batch.flush(env.tk)
+        batch.flush(env.tk)
+        assert batch.result(parent)[1] == [] and batch.result(child)[1] == []
+        # parents, children, dependencies, versions
+        assert env.shotgun.calls.counts["batch"] == 4, env.shotgun.calls.counts
+        parent_publish = parent.properties["sg_publish_data"]
+        child_publish = child.properties["sg_publish_data"]
+        dependencies = env.shotgun.find(
+            "PublishedFileDependency", [], ["published_file", "dependent_published_file"]
+        )
+        assert [(d["published_file"]["id"], d["dependent_published_file"]["id"]) for d in dependencies] \
+            == [(child_publish["id"], parent_publish["id"])], "child not linked to its parent"
+        assert parent.properties["sg_version_data"]["published_files"] == [parent_publish]
+        assert sum(parent.properties["publish_transfer"].values()) == 1
+        assert transfer.verify_manifest(transfer.manifest_path(published)) == []
+
+        # a flushed batch isn't reused, by the next session either
+        assert publish_batch.current(parent, publish_batch.PUBLISH) is not batch
+        next_root = Item()
+        batch = publish_batch.current(Item(next_root), publish_batch.PUBLISH)
+        assert publish_batch.current(Item(next_root), publish_batch.PUBLISH) is batch
+        assert publish_batch.current(Item(Item()), publish_batch.PUBLISH) is not batch, \
+            "batch shared between sessions"
+
+        # a session publishing an item again drops its pending batch
+        item = Item(Item())
+        batch = publish_batch.current(item, publish_batch.PUBLISH)
+        batch.add_publish(item, {"type": "PublishedFile", "code": "a"}, [])
+        assert publish_batch.current(item, publish_batch.PUBLISH) is not batch, "stale batch reused"
+
+        # a failed publish drops everything queued
+        batch = publish_batch.current(item, publish_batch.PUBLISH)
+        batch.add_publish(item, {"type": "PublishedFile", "code": "a"}, [])
+        publish_batch.discard()
+        assert publish_batch.queued(item, publish_batch.PUBLISH) is None, "discarded batch kept"
+    finally:
+        shutil.rmtree(os.path.join(env.root, "publish_check"))
+
+
+def check_transfer(env):
+    from cbfx import transfer
+
+    folder = tempfile.mkdtemp(prefix="cbfx_checks_transfer_", dir=env.root)
+    try:
+        sources = []
+        for frame in range(1001, 1004):
+            source = os.path.join(folder, "work", "comp.%d.exr" % frame)
+            write(source, "frame %d" % frame)
+            sources.append(source)
+        transfers = [(s, s.replace("work", "publish")) for s in sources]
+        manifest = transfer.manifest_path(os.path.join(folder, "publish", "comp.%04d.exr"))
+
+        transfer.transfer_files(transfers, manifest, hardlink=False)
+        assert transfer.verify_manifest(manifest) == []
+
+        # same size, other content
+        with open(transfers[1][1], "w") as f:
+            f.write("frame 9999")
+        problems = transfer.verify_manifest(manifest)
+        assert len(problems) == 1 and "checksum" in problems[0], problems
+
+        os.remove(transfers[2][1])
+        assert len(transfer.verify_manifest(manifest)) == 2
+    finally:
+        shutil.rmtree(folder)
+
+
+def check_profiling(env):
+    from cbfx import profiling
+
+    stat = os.stat
+    with profiling.timed("check.outer"):
+        counted = os.stat
+        assert counted is not stat
+        with profiling.timed("check.inner"):
+            assert os.stat is counted, "counters installed again"
+            os.stat(env.root)
+    assert os.stat is stat, "counters left installed"
+    with profiling.timed("check.outer"):
+        pass
+
+    # calls of other threads aren't counted
+    worker = threading.Thread(target=lambda: [os.stat(env.root) for _ in range(10)])
+    with profiling.timed("check.threads"):
+        worker.start()
+        worker.join()
+
+    stats = profiling.stats()
+    assert stats["check.inner"]["fs"] == 1
+    assert stats["check.outer"]["fs"] == 1 and stats["check.outer"]["calls"] == 2
+    assert stats["check.threads"]["fs"] == 0, "calls of another thread counted"
+
+
+CHECKS = (
+    check_shotgun_cache,
+    check_context_change,
+    check_sequence_scan,
+    check_template_index,
+    check_nuke_tools_index,
+    check_work_scan_cache,
+    check_publish_batch,
+    check_transfer,
+    check_profiling,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--match", default="", help="Only run the checks whose name contains this.")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="cbfx_checks_")
+    failures = 0
+    try:
+        env = run_benchmarks.Environment(root, 0.0, [100], 100)
+        for check in CHECKS:
+            name = check.__name__[len("check_"):]
+            if args.match not in name:
+                continue
+            try:
+                check(env)
+            except Exception:
+                failures += 1
+                print("FAIL  %s\n%s" % (name, traceback.format_exc()))
+            else:
+                print("ok    %s" % name)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
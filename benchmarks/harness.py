@@ -0,0 +1,623 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Stand-ins for Toolkit, Shotgun, Nuke and Hiero, to run the config hooks
+outside of a DCC and without a Shotgun site.
+
+:func:`install` registers fake ``sgtk``, ``tank``, ``nuke`` and ``hiero``
+modules, then :func:`load_hook` loads a hook file of the configuration the
+way Toolkit does. The fakes only implement what the hooks of this
+configuration use.
+"""
+import collections
+import importlib.util
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import types
+
+CONFIG_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# added by the pick_environment core hook in a Toolkit process
+_HOOKS_LIB = os.path.join(CONFIG_ROOT, "hooks", "lib")
+if _HOOKS_LIB not in sys.path:
+    sys.path.append(_HOOKS_LIB)
+
+
+class CallCounter(object):
+    """
+    Counts calls by name.
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+
+    def count(self, name):
+        self.counts[name] += 1
+
+    def reset(self):
+        self.counts.clear()
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+##############################################################################################################
+# toolkit
+
+class TankError(Exception):
+    pass
+
+
+class FakeLogger(object):
+    """
+    Logger dropping all the messages, but keeping count of them.
+    """
+
+    def __init__(self):
+        self.calls = CallCounter()
+
+    def __getattr__(self, name):
+        if name in ("debug", "info", "warning", "error", "exception"):
+            return lambda *args, **kwargs: self.calls.count(name)
+        raise AttributeError(name)
+
+
+class Hook(object):
+    """
+    Stand-in for ``sgtk.Hook``.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.logger = FakeLogger()
+
+    @property
+    def sgtk(self):
+        return self.parent.sgtk
+
+    def get_publish_path(self, sg_publish_data):
+        return sg_publish_data["path"]["local_path"]
+
+
+class FakeTemplate(object):
+    """
+    Path template matching with a regular expression built from its definition.
+    """
+
+    def __init__(self, name, definition, root_path):
+        self.name = name
+        self.definition = definition
+        self.root_path = root_path
+        self.keys = dict((k, None) for k in re.findall(r"{(\w+)}", definition))
+
+        # keys used more than once must hold the same value
+        seen = set()
+
+        def group(match):
+            key = match.group(1)
+            if key in seen:
+                return "(?P=%s)" % key
+            seen.add(key)
+            if key == "SEQ":
+                return r"(?P<SEQ>%0\dd|#+|\d+)"
+            return r"(?P<%s>[^/]+)" % key
+
+        pattern = re.escape(os.path.join(root_path, definition).replace("\\", "/"))
+        pattern = re.sub(r"\\{(\w+)\\}", group, pattern)
+        self._regex = re.compile("^%s$" % pattern)
+
+    def __repr__(self):
+        return "<FakeTemplate %s>" % self.name
+
+    def validate(self, path):
+        return bool(self._regex.match(path.replace("\\", "/")))
+
+    def get_fields(self, path):
+        match = self._regex.match(path.replace("\\", "/"))
+        if not match:
+            raise TankError("Path '%s' doesn't match %s" % (path, self.name))
+        fields = match.groupdict()
+        if fields.get("SEQ", "").isdigit():
+            fields["SEQ"] = int(fields["SEQ"])
+        return fields
+
+    def apply_fields(self, fields):
+        try:
+            return os.path.join(self.root_path, self.definition.format(**fields))
+        except KeyError as e:
+            raise TankError("Missing field %s for %s" % (e, self.name))
+
+
+class FakePipelineConfiguration(object):
+
+    def __init__(self, path):
+        self._path = path
+
+    def get_path(self):
+        return self._path
+
+
+class FakeTk(object):
+    """
+    Stand-in for ``sgtk.Sgtk``.
+    """
+
+    def __init__(self, shotgun, templates, config_path=CONFIG_ROOT):
+        self.shotgun = shotgun
+        self.templates = templates
+        self.pipeline_configuration = FakePipelineConfiguration(config_path)
+        self.calls = CallCounter()
+
+    def template_from_path(self, path):
+        self.calls.count("template_from_path")
+        matches = [t for t in self.templates.values() if t.validate(path)]
+        if len(matches) > 1:
+            raise TankError("More than one template matches %s" % path)
+        return matches[0] if matches else None
+
+    def paths_from_template(self, template, fields, skip_keys=None, skip_missing_optional_keys=False):
+        self.calls.count("paths_from_template")
+        return []
+
+
+class FakeContext(object):
+    """
+    Stand-in for ``sgtk.Context``, holding plain entity dictionaries.
+    """
+
+    def __init__(self, tk, project=None, entity=None, step=None, task=None, source_entity=None,
+                 sequence=None):
+        self.sgtk = tk
+        self.project = project
+        self.entity = entity
+        self.step = step
+        self.task = task
+        self.source_entity = source_entity
+        self.sequence = sequence
+
+    def _key(self):
+        ids = lambda e: (e["type"], e["id"]) if e else None
+        return tuple(ids(e) for e in (self.project, self.entity, self.step, self.task, self.source_entity))
+
+    def __eq__(self, other):
+        return isinstance(other, FakeContext) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def as_template_fields(self, template):
+        fields = {}
+        if self.sequence:
+            fields["Sequence"] = self.sequence["code"]
+        if self.entity and self.entity["type"] == "Shot":
+            fields["Shot"] = self.entity["name"]
+        if self.entity and self.entity["type"] == "Sequence":
+            fields["Sequence"] = self.entity["name"]
+        return fields
+
+
+class FakeEngine(object):
+
+    def __init__(self, instance_name="tk-nuke", apps=None, studio_enabled=False):
+        self.instance_name = instance_name
+        self.apps = apps or {}
+        self.logger = FakeLogger()
+        self.studio_enabled = studio_enabled
+        self.hiero_enabled = False
+        self.has_ui = False
+
+
+class FakeApp(object):
+    """
+    Stand-in for the app or engine a hook belongs to.
+    """
+
+    def __init__(self, tk, context=None, engine=None, settings=None, cache_location=None):
+        self.sgtk = tk
+        self.tank = tk
+        self.context = context
+        self.engine = engine or FakeEngine()
+        self.settings = settings or {}
+        self.cache_location = cache_location or tempfile.mkdtemp(prefix="cbfx_bench_cache_")
+        self.logger = FakeLogger()
+
+    @property
+    def shotgun(self):
+        return self.sgtk.shotgun
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def log_debug(self, msg):
+        pass
+
+    def log_info(self, msg):
+        pass
+
+    def log_warning(self, msg):
+        pass
+
+    def log_error(self, msg):
+        pass
+
+
+class LocalFileStorageManager(object):
+    """
+    Stand-in for ``sgtk.util.LocalFileStorageManager``.
+    """
+    LOGGING = "logging"
+    CACHE = "cache"
+    _root = tempfile.mkdtemp(prefix="cbfx_bench_")
+
+    @classmethod
+    def get_global_root(cls, root_type):
+        path = os.path.join(cls._root, root_type)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        return path
+
+
+##############################################################################################################
+# shotgun
+
+class FakeShotgun(object):
+    """
+    In-memory Shotgun API with an injectable latency per call.
+
+    Calls made from the main thread and from background threads are counted
+    apart, in :attr:`calls` and :attr:`background_calls`.
+
+    Entities are plain dictionaries stored by type. Filters support the
+    ``is``, ``is_not``, ``in`` and ``not_in`` relations, and linked fields
+    such as ``project.Project.code`` are resolved on read.
+    """
+
+    def __init__(self, latency=0.0):
+        """
+        :param float latency: Seconds each API call takes.
+        """
+        self.latency = latency
+        self.calls = CallCounter()
+        self.background_calls = CallCounter()
+        self._entities = collections.defaultdict(dict)
+        self._next_id = 1000
+
+    def add(self, entity_type, **data):
+        """
+        Stores an entity without counting an API call.
+        """
+        data.setdefault("id", self._next_id)
+        self._next_id = max(self._next_id, data["id"]) + 1
+        data["type"] = entity_type
+        self._entities[entity_type][data["id"]] = data
+        return data
+
+    def _call(self, name):
+        if threading.current_thread() is threading.main_thread():
+            self.calls.count(name)
+        else:
+            self.background_calls.count(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _value(self, entity, field):
+        if "." in field:
+            (link, linked_type, linked_field) = field.split(".", 2)
+            linked = entity.get(link)
+            if not linked:
+                return None
+            return self._value(self._entities[linked_type].get(linked["id"], {}), linked_field)
+        value = entity.get(field)
+        return value
+
+    def _matches(self, entity, filters):
+        for (field, relation, values) in [(f[0], f[1], f[2:]) for f in filters]:
+            value = self._value(entity, field)
+            if isinstance(value, dict):
+                value = value.get("id")
+            if len(values) == 1 and isinstance(values[0], (list, tuple)):
+                values = values[0]
+            values = [v.get("id") if isinstance(v, dict) else v for v in values]
+            if relation in ("is", "in") and value not in values:
+                return False
+            if relation in ("is_not", "not_in") and value in values:
+                return False
+        return True
+
+    def _read(self, entity, fields):
+        result = {"type": entity["type"], "id": entity["id"]}
+        for field in fields or []:
+            result[field] = self._value(entity, field)
+        return result
+
+    def find(self, entity_type, filters, fields=None, *args, **kwargs):
+        self._call("find")
+        return [
+            self._read(e, fields)
+            for e in self._entities[entity_type].values()
+            if self._matches(e, filters)
+        ]
+
+    def find_one(self, entity_type, filters, fields=None, *args, **kwargs):
+        self._call("find_one")
+        for entity in self._entities[entity_type].values():
+            if self._matches(entity, filters):
+                return self._read(entity, fields)
+        return None
+
+    def update(self, entity_type, entity_id, data, *args, **kwargs):
+        self._call("update")
+        self._entities[entity_type][entity_id].update(data)
+        return self._read(self._entities[entity_type][entity_id], list(data))
+
+    def create(self, entity_type, data, *args, **kwargs):
+        self._call("create")
+        return dict(self.add(entity_type, **dict(data)))
+
+    def batch(self, requests):
+        self._call("batch")
+        results = []
+        for request in requests:
+            if request["request_type"] == "create":
+                results.append(dict(self.add(request["entity_type"], **dict(request["data"]))))
+            elif request["request_type"] == "update":
+                entity = self._entities[request["entity_type"]][request["entity_id"]]
+                entity.update(request["data"])
+                results.append(dict(entity))
+            elif request["request_type"] == "delete":
+                results.append(
+                    self._entities[request["entity_type"]].pop(request["entity_id"], None) is not None
+                )
+        return results
+
+
+##############################################################################################################
+# nuke and hiero
+
+class FakeKnob(object):
+
+    def __init__(self, value=None):
+        self.value_ = value
+
+    def setValue(self, value):
+        self.value_ = value
+
+    def fromUserText(self, value):
+        self.value_ = value
+
+    def value(self):
+        return self.value_
+
+
+class FakeNode(object):
+
+    def __init__(self, node_class, args=""):
+        self.node_class = node_class
+        self.args = args
+        self.knobs = collections.defaultdict(FakeKnob)
+
+    def __getitem__(self, name):
+        return self.knobs[name]
+
+    def Class(self):
+        return self.node_class
+
+
+class FakeNodes(object):
+    """
+    Stand-in for ``nuke.nodes``, creating nodes without UI side effects.
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, node_class):
+        def create(**knobs):
+            self._module.calls.count("nodes.%s" % node_class)
+            node = FakeNode(node_class)
+            for (name, value) in knobs.items():
+                node[name].setValue(value)
+            self._module.created.append(node)
+            return node
+        return create
+
+
+class FakeMenu(object):
+
+    def __init__(self, module):
+        self._module = module
+
+    def addMenu(self, name, *args, **kwargs):
+        self._module.calls.count("addMenu")
+        return FakeMenu(self._module)
+
+    def addCommand(self, name, command=None, *args, **kwargs):
+        self._module.calls.count("addCommand")
+
+
+def make_nuke_module():
+    nuke = types.ModuleType("nuke")
+    nuke.calls = CallCounter()
+    nuke.created = []
+    nuke.env = {"studio": False, "gui": True}
+
+    def createNode(node_class, args="", inpanel=True):
+        nuke.calls.count("createNode")
+        node = FakeNode(node_class, args)
+        nuke.created.append(node)
+        return node
+
+    def nodePaste(path):
+        nuke.calls.count("nodePaste")
+
+    nuke.plugin_path = []
+
+    def pluginAddPath(path):
+        nuke.calls.count("pluginAddPath")
+        nuke.plugin_path.append(path)
+
+    nuke.pluginAddPath = pluginAddPath
+    nuke.toolbar = lambda name: FakeMenu(nuke)
+    nuke.menu = lambda name: FakeMenu(nuke)
+    nuke.createNode = createNode
+    nuke.nodePaste = nodePaste
+    nuke.nodes = FakeNodes(nuke)
+    nuke.Undo = lambda *args: None
+    return nuke
+
+
+def make_hiero_modules():
+    hiero = types.ModuleType("hiero")
+    core = types.ModuleType("hiero.core")
+    hiero.core = core
+    hiero.calls = CallCounter()
+
+    class Bin(object):
+        def __init__(self):
+            self.items = []
+
+        def addItem(self, item):
+            hiero.calls.count("addItem")
+            self.items.append(item)
+
+        def bins(self):
+            return []
+
+    class Project(object):
+        def __init__(self):
+            self._bin = Bin()
+
+        def clipsBin(self):
+            return self._bin
+
+        def beginUndo(self, name):
+            pass
+
+        def endUndo(self):
+            pass
+
+    core._projects = [Project()]
+    core.projects = lambda: list(core._projects)
+    core.openProject = lambda path: hiero.calls.count("openProject")
+    core.MediaSource = lambda path: ("MediaSource", path)
+    core.Clip = lambda source: ("Clip", source)
+    core.BinItem = lambda clip: ("BinItem", clip)
+    return (hiero, core)
+
+
+##############################################################################################################
+# loading
+
+def install():
+    """
+    Registers the stand-in modules, replacing any real ones.
+
+    :returns: The fake ``nuke`` and ``hiero`` modules.
+    """
+    tank = types.ModuleType("tank")
+    tank.Hook = Hook
+    tank.TankError = TankError
+    tank.get_hook_baseclass = lambda: Hook
+    util = types.ModuleType("tank.util")
+    util.LocalFileStorageManager = LocalFileStorageManager
+    tank.util = util
+
+    nuke = make_nuke_module()
+    (hiero, hiero_core) = make_hiero_modules()
+
+    sys.modules.update({
+        "tank": tank,
+        "tank.util": util,
+        "sgtk": tank,
+        "sgtk.util": util,
+        "nuke": nuke,
+        "hiero": hiero,
+        "hiero.core": hiero_core,
+    })
+    return (nuke, hiero)
+
+
+def load_hook(relative_path, class_name, parent):
+    """
+    Loads a hook file of the configuration and instantiates its hook class.
+
+    :param str relative_path: Path of the hook file, relative to the configuration.
+    :param str class_name: Name of the hook class.
+    :param parent: The app or engine the hook belongs to.
+    """
+    path = os.path.join(CONFIG_ROOT, relative_path)
+    module_name = "cbfx_bench_%s" % re.sub(r"\W", "_", relative_path)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)(parent)
+
+
+##############################################################################################################
+# synthetic data
+
+def make_sequence(folder, name, frames, first=1001, missing=(), padding=4, ext="exr"):
+    """
+    Creates an empty frame sequence on disk.
+
+    :param str folder: Folder to create the frames in.
+    :param str name: Base name of the frames.
+    :param int frames: Number of frames.
+    :param int first: First frame number.
+    :param missing: Frame numbers to leave out.
+    :returns: The ``%0Nd`` path of the sequence.
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    missing = set(missing)
+    for frame in range(first, first + frames):
+        if frame in missing:
+            continue
+        open(os.path.join(folder, "%s.%0*d.%s" % (name, padding, frame, ext)), "w").close()
+    return os.path.join(folder, "%s.%%0%dd.%s" % (name, padding, ext)).replace(os.path.sep, "/")
+
+
+def measure(name, func, repeat, setup=None):
+    """
+    Runs a function several times, recording its wall time and the
+    filesystem calls it makes with :func:`cbfx.profiling.timed`.
+
+    :param str name: Name the runs are recorded under.
+    :param func: Callable to measure.
+    :param int repeat: Number of runs.
+    :param setup: Callable run before each run, outside of the measure.
+    :returns: The duration of each run in seconds, and the average number of
+        filesystem calls per run.
+    :rtype: tuple
+    """
+    from cbfx import profiling
+
+    durations = []
+    fs_calls = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.time()
+        with profiling.timed(name):
+            func()
+        durations.append(time.time() - start)
+        fs_calls += profiling.stats()[name]["fs"]
+        # drop the recorded timings, so that each run starts from scratch
+        profiling.write_record("benchmark", path=os.devnull)
+    return (durations, fs_calls / float(repeat))
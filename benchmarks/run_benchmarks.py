@@ -0,0 +1,490 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Benchmarks the config hooks against stand-in Toolkit, Shotgun, Nuke and
+Hiero modules, see :mod:`harness`. Nothing but Python is required::
+
+    python benchmarks/run_benchmarks.py --latency 0.05 --frames 1000,10000,100000
+
+Each case reports its median wall time and the Shotgun, filesystem and
+Nuke calls it makes per run. Shotgun calls made from background threads are
+reported apart, they don't hold the artist up. Results are compared with
+the baseline file when there is one, and the run fails when a case got
+slower than the tolerance allows or makes more calls than before. A baseline is recorded
+with ``--save-baseline``, on the machine the comparisons will run on.
+
+The warm runs are only meaningful if the caches they hit are invalidated
+when what they cache changes, which :mod:`checks` asserts.
+"""
+import argparse
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import harness
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Frame numbers left out of the sequence with gaps.
+GAP_FRAMES = (1010, 1011, 1012, 1050)
+
+# Number of menu categories the synthetic nuke tools are spread over.
+TOOL_CATEGORIES = 40
+
+# Entity ids of the synthetic project.
+PROJECT_ID = 70
+SEQUENCE_ID = 80
+SHOT_ID = 90
+STEP_ID = 100
+TASK_ID = 110
+
+
+class Environment(object):
+    """
+    Synthetic project: Shotgun entities, templates, LUTs and frame sequences.
+    """
+
+    def __init__(self, root, latency, frames, tools):
+        (self.nuke, self.hiero) = harness.install()
+        self.root = root
+
+        self.shotgun = harness.FakeShotgun(latency)
+        project = self.shotgun.add("Project", id=PROJECT_ID, code="bench", name="Bench")
+        sequence = self.shotgun.add("Sequence", id=SEQUENCE_ID, code="sq010", project=project)
+        self.shotgun.add(
+            "Shot", id=SHOT_ID, code="sq010_0010", project=project,
+            sg_sequence={"type": "Sequence", "id": SEQUENCE_ID, "name": sequence["code"]},
+        )
+        self.shotgun.add("Task", id=TASK_ID, content="comp", sg_status_list="rdy", project=project)
+
+        templates = dict(
+            (name, harness.FakeTemplate(name, definition, root))
+            for (name, definition) in (
+                ("lut_root", "editorial/luts"),
+                ("lut_seq", "editorial/luts/{Sequence}"),
+                ("lut_shot", "editorial/luts/{Sequence}/{Shot}"),
+                ("nuke_shot_plate", "sequences/{Sequence}/{Shot}/publish/plates/{name}/{name}.{SEQ}.exr"),
+                ("nuke_shot_render", "sequences/{Sequence}/{Shot}/publish/renders/{name}.{SEQ}.exr"),
+                ("nuke_shot_script", "sequences/{Sequence}/{Shot}/publish/nuke/{name}.nk"),
+                ("nuke_tools_all_gizmos_cbfx", "nuke_tools/_all/gizmos/cbfx"),
+                ("nuke_tools_all_gizmos_nukepedia", "nuke_tools/_all/gizmos/nukepedia"),
+                ("nuke_tools_project_gizmos", "nuke_tools/bench/gizmos/project"),
+                ("nuke_tools_all_toolsets", "nuke_tools/_all/toolsets"),
+                ("nuke_tools_project_toolsets", "nuke_tools/bench/toolsets"),
+                ("nuke_tools_all_plugins", "nuke_tools/_all/plugins"),
+                ("nuke_tools_project_plugins", "nuke_tools/bench/plugins"),
+            )
+        )
+        self.tk = harness.FakeTk(self.shotgun, templates)
+
+        # LUTs for the three levels
+        for path in ("editorial/luts", "editorial/luts/sq010", "editorial/luts/sq010/sq010_0010"):
+            os.makedirs(os.path.join(root, path))
+            open(os.path.join(root, path, "grade.cube"), "w").close()
+
+        # frame sequences, matching a template, and not
+        shot_root = os.path.join(root, "sequences", "sq010", "sq010_0010", "publish")
+        self.sequences = collections.OrderedDict()
+        for count in frames:
+            self.sequences[count] = harness.make_sequence(
+                os.path.join(shot_root, "plates", "plate%d" % count), "plate%d" % count, count
+            )
+        self.gap_sequence = harness.make_sequence(
+            os.path.join(shot_root, "renders"), "comp", 100, missing=GAP_FRAMES
+        )
+        self.loose_sequence = harness.make_sequence(
+            os.path.join(root, "incoming"), "scan", min(frames)
+        )
+
+        # gizmos, toolsets and plugins, spread over categories
+        self.tools = tools
+        for (folder, ext, count) in (
+            ("_all/gizmos/cbfx", "gizmo", tools),
+            ("_all/gizmos/nukepedia", "gizmo", tools),
+            ("bench/gizmos/project", "gizmo", tools // 10),
+            ("_all/toolsets", "nk", tools // 10),
+            ("_all/plugins", "so", tools // 10),
+        ):
+            for i in range(count):
+                category = os.path.join(root, "nuke_tools", folder, "category%02d" % (i % TOOL_CATEGORIES))
+                if not os.path.isdir(category):
+                    os.makedirs(category)
+                open(os.path.join(category, "tool%04d.%s" % (i, ext)), "w").close()
+
+        self.script = os.path.join(shot_root, "nuke", "comp.nk")
+        os.makedirs(os.path.dirname(self.script))
+        with open(self.script, "w") as f:
+            f.write("Root {\n inputs 0\n}\n")
+
+        self.project = {"type": "Project", "id": PROJECT_ID, "name": "Bench"}
+        self.sequence = {"type": "Sequence", "id": SEQUENCE_ID, "code": "sq010"}
+        self.shot = {"type": "Shot", "id": SHOT_ID, "name": "sq010_0010"}
+        self.step = {"type": "Step", "id": STEP_ID, "name": "Comp"}
+        self.task = {"type": "Task", "id": TASK_ID, "name": "comp"}
+
+    def context(self, **kwargs):
+        return harness.FakeContext(self.tk, **kwargs)
+
+    def shot_context(self):
+        return self.context(
+            project=self.project, entity=self.shot, step=self.step, task=self.task,
+            sequence=self.sequence,
+        )
+
+    def publish(self, path, publish_id, publish_type="Image"):
+        return {
+            "type": "PublishedFile",
+            "id": publish_id,
+            "path": {"local_path": path},
+            "published_file_type": {"type": "PublishedFileType", "name": publish_type},
+        }
+
+
+def hook_module(hook):
+    return sys.modules[type(hook).__module__]
+
+
+##############################################################################################################
+# cases
+#
+# Each case takes the environment and returns (runs, setup) pairs by name, see
+# harness.measure. Setup callables reset the caches for the cold runs.
+
+def loader_cases(env):
+    app = harness.FakeApp(env.tk, context=env.shot_context())
+    hook = harness.load_hook("hooks/tk-multi-loader2/tk-nuke_actions.py", "NukeActions", app)
+    module = hook_module(hook)
+
+    def cold():
+        module.clear_directory_cache()
+        module._prefetch_cache.clear()
+
+    cases = collections.OrderedDict()
+    for (count, path) in env.sequences.items():
+        publish = env.publish(path, count)
+        run = lambda publish=publish: hook.execute_action("read_node", None, publish)
+        cases["loader.read_node.%d.cold" % count] = (run, cold)
+        cases["loader.read_node.%d.warm" % count] = (run, None)
+
+    publish = env.publish(env.gap_sequence, 1)
+    cases["loader.read_node.gaps"] = (lambda: hook.execute_action("read_node", None, publish), cold)
+
+    loose = env.publish(env.loose_sequence, 2)
+    cases["loader.read_node.no_template"] = (lambda: hook.execute_action("read_node", None, loose), cold)
+
+    batch = [
+        {"name": "read_node", "params": None, "sg_publish_data": env.publish(path, i)}
+        for (i, path) in enumerate(list(env.sequences.values()) + [env.gap_sequence, env.loose_sequence])
+    ]
+    batch.append({"name": "script_import", "params": None,
+                  "sg_publish_data": env.publish(env.script, 3, "Nuke Script")})
+    cases["loader.batch.cold"] = (lambda: hook.execute_multiple_actions(batch), cold)
+
+    def headless_batch():
+        env.nuke.env["gui"] = False
+        try:
+            hook.execute_multiple_actions(batch)
+        finally:
+            env.nuke.env["gui"] = True
+
+    cases["loader.batch.headless"] = (headless_batch, cold)
+
+    clips = [
+        {"name": "clip_import", "params": None, "sg_publish_data": env.publish(env.loose_sequence, i)}
+        for i in range(300)
+    ]
+    studio_app = harness.FakeApp(env.tk, engine=harness.FakeEngine(studio_enabled=True))
+    studio_hook = harness.load_hook("hooks/tk-multi-loader2/tk-nuke_actions.py", "NukeActions", studio_app)
+    cases["loader.clip_import.300"] = (lambda: studio_hook.execute_multiple_actions(clips), None)
+
+    actions = list(module.ACTIONS)
+    cases["loader.generate_actions"] = (
+        lambda: [hook.generate_actions(p["sg_publish_data"], actions, "main") for p in batch],
+        None,
+    )
+    return cases
+
+
+def context_change_cases(env):
+    app = harness.FakeApp(env.tk)
+    hook = harness.load_hook("core/hooks/context_change.py", "ContextChange", app)
+    module = hook_module(hook)
+
+    def cold():
+        module.shotgun_cache.invalidate()
+        module._first_file_cache.clear()
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def cold_manifest():
+        cold()
+        module.lut_manifest.refresh(lut_root)
+
+    lut_root = os.path.join(env.root, "editorial", "luts")
+    manifest = module.lut_manifest.manifest_path(lut_root)
+    site = env.context()
+    shot = env.shot_context()
+    cases = collections.OrderedDict()
+    cases["context_change.shot.cold"] = (lambda: hook.post_context_change(site, shot), cold)
+    cases["context_change.shot.warm"] = (lambda: hook.post_context_change(site, shot), None)
+    cases["context_change.shot.manifest"] = (lambda: hook.post_context_change(site, shot), cold_manifest)
+    return cases
+
+
+def pick_environment_cases(env):
+    app = harness.FakeApp(env.tk)
+    hook = harness.load_hook("core/hooks/pick_environment.py", "PickEnvironment", app)
+
+    contexts = [
+        env.context(),
+        env.context(project=env.project),
+        env.context(project=env.project, entity=env.shot),
+        env.context(project=env.project, entity=env.shot, step=env.step),
+        env.context(project=env.project, entity=env.sequence),
+        env.context(project=env.project, source_entity={"type": "Version", "id": 1}),
+    ] * 100
+
+    cases = collections.OrderedDict()
+    cases["pick_environment.600"] = (lambda: [hook.execute(c) for c in contexts], None)
+    return cases
+
+
+def nuke_tools_cases(env):
+    from cbfx import nuke_tools_index
+
+    def reset():
+        nuke_tools_index._registered.clear()
+
+    def walk():
+        reset()
+        for (tree, _, _) in nuke_tools_index.tree_paths(env.tk):
+            if os.path.exists(nuke_tools_index.index_path(tree)):
+                os.remove(nuke_tools_index.index_path(tree))
+
+    def indexed():
+        reset()
+        for (tree, kind, _) in nuke_tools_index.tree_paths(env.tk):
+            nuke_tools_index.refresh(tree, kind)
+
+    register = lambda: nuke_tools_index.register_trees(env.tk)
+    cases = collections.OrderedDict()
+    cases["nuke_tools.%d.walk" % env.tools] = (register, walk)
+    cases["nuke_tools.%d.index" % env.tools] = (register, indexed)
+    return cases
+
+
+def before_app_launch_cases(env):
+    app = harness.FakeApp(env.tk, context=env.shot_context())
+    hook = harness.load_hook("hooks/tk-multi-launchapp/before_app_launch.py", "BeforeAppLaunch", app)
+
+    cases = collections.OrderedDict()
+    cases["before_app_launch.task"] = (
+        lambda: hook.execute("/usr/local/Nuke/Nuke", "", "12.0v3", "tk-nuke"),
+        None,
+    )
+    return cases
+
+
+class FakeSnapshotHandler(object):
+    """
+    Stand-in for the snapshot handler of tk-multi-snapshot. Copies the work
+    file to the snapshot folder.
+    """
+
+    def __init__(self, env):
+        self.env = env
+
+    def get_current_file_path(self):
+        return self.env.script
+
+    def save_current_file(self):
+        with open(self.env.script, "a") as f:
+            f.write("# saved %r\n" % time.time())
+
+    def do_snapshot(self, work_path, thumbnail, comment):
+        # Shotgun version lookup, then the copy
+        self.env.shotgun.find_one("Version", [["id", "is", 1]])
+        folder = os.path.join(os.path.dirname(work_path), "snapshots")
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        shutil.copy(work_path, os.path.join(folder, "%r.nk" % time.time()))
+
+
+def quickdaily_snapshot_cases(env):
+    handler = FakeSnapshotHandler(env)
+    snapshot_app = harness.FakeApp(env.tk)
+    snapshot_app.version = "v0.7.4"
+    snapshot_app.tk_multi_snapshot = type("tk_multi_snapshot", (), {})()
+    snapshot_app.tk_multi_snapshot.Snapshot = lambda app: handler
+    engine = harness.FakeEngine(apps={"tk-multi-snapshot": snapshot_app})
+    app = harness.FakeApp(env.tk, engine=engine)
+    hook = harness.load_hook("hooks/snapshot_history_post_quickdaily.py", "SnapshotHistoryPostQuickdaily", app)
+    queue = hook_module(hook).work_queue.get_queue("quickdaily-snapshot")
+
+    def run():
+        hook.execute("/tmp/daily.mov", 1, "bench")
+
+    cases = collections.OrderedDict()
+    cases["quickdaily_snapshot"] = (run, queue.join)
+    return cases
+
+
+CASES = (
+    loader_cases,
+    context_change_cases,
+    pick_environment_cases,
+    nuke_tools_cases,
+    before_app_launch_cases,
+    quickdaily_snapshot_cases,
+)
+
+
+##############################################################################################################
+# running and reporting
+
+def run_case(env, name, func, setup, repeat):
+    env.shotgun.calls.reset()
+    env.shotgun.background_calls.reset()
+    env.tk.calls.reset()
+    env.nuke.calls.reset()
+    try:
+        (durations, fs_calls) = harness.measure(name, func, repeat, setup)
+    except Exception as e:
+        return {"error": "%s: %s" % (type(e).__name__, e)}
+
+    durations.sort()
+    return {
+        "median_ms": durations[len(durations) // 2] * 1000.0,
+        "min_ms": durations[0] * 1000.0,
+        "mean_ms": sum(durations) * 1000.0 / len(durations),
+        "calls": {
+            "shotgun": env.shotgun.calls.total() / float(repeat),
+            "shotgun_background": env.shotgun.background_calls.total() / float(repeat),
+            "filesystem": fs_calls,
+            "templates": env.tk.calls.total() / float(repeat),
+            "nuke": env.nuke.calls.total() / float(repeat),
+        },
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Compares results with a baseline.
+
+    Shotgun calls made from background threads depend on the scheduling and
+    are reported but not compared.
+
+    :returns: A description of each regression.
+    :rtype: list
+    """
+    regressions = []
+    for (name, result) in results.items():
+        reference = baseline.get(name)
+        if not reference or "error" in reference:
+            continue
+        if "error" in result:
+            regressions.append("%s: %s" % (name, result["error"]))
+            continue
+        slower = result["median_ms"] - reference["median_ms"]
+        if slower > min_delta_ms and slower > reference["median_ms"] * tolerance:
+            regressions.append(
+                "%s: %.2fms, baseline %.2fms" % (name, result["median_ms"], reference["median_ms"])
+            )
+        for (kind, count) in result["calls"].items():
+            if kind.endswith("_background"):
+                continue
+            # counts are averaged over the runs, allow for the odd extra call
+            if count - reference["calls"].get(kind, count) >= 1:
+                regressions.append(
+                    "%s: %g %s calls, baseline %g" % (name, count, kind, reference["calls"][kind])
+                )
+    return regressions
+
+
+def report(results, baseline):
+    print("%-32s %10s %10s %9s %9s %9s %9s %9s" % (
+        "case", "median ms", "baseline", "shotgun", "sg async", "fs", "template", "nuke"))
+    for (name, result) in results.items():
+        if "error" in result:
+            print("%-32s %s" % (name, result["error"]))
+            continue
+        reference = baseline.get(name, {}).get("median_ms")
+        calls = result["calls"]
+        print("%-32s %10.2f %10s %9g %9g %9g %9g %9g" % (
+            name,
+            result["median_ms"],
+            "%.2f" % reference if reference is not None else "-",
+            calls["shotgun"],
+            calls["shotgun_background"],
+            calls["filesystem"],
+            calls["templates"],
+            calls["nuke"],
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Seconds each Shotgun call takes.")
+    parser.add_argument("--frames", default="1000,10000,100000",
+                        help="Comma separated frame counts of the synthetic sequences.")
+    parser.add_argument("--tools", type=int, default=2000,
+                        help="Number of gizmos in each synthetic gizmo tree.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case.")
+    parser.add_argument("--match", default="", help="Only run the cases containing this string.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Write the results to the baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Slowdown allowed over the baseline, as a fraction.")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="Slowdown in milliseconds under which a case never regresses.")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    root = tempfile.mkdtemp(prefix="cbfx_bench_")
+    try:
+        frames = [int(f) for f in args.frames.split(",")]
+        env = Environment(root, args.latency, frames, args.tools)
+
+        results = collections.OrderedDict()
+        for cases in CASES:
+            for (name, (func, setup)) in cases(env).items():
+                if args.match in name:
+                    results[name] = run_case(env, name, func, setup, args.repeat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("\nBaseline written to %s" % args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print("\nRegressions:\n  %s" % "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
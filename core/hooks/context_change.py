@@ -11,9 +11,41 @@
 """
 This hook gets executed before and after the context changes in Toolkit.
 """
+import collections
+import logging
 import os
+import threading
+
 from tank import get_hook_baseclass
 
+from cbfx import lut_manifest
+from cbfx import shotgun_cache
+
+PROJECT_FIELDS = ["code"]
+ENTITY_FIELDS = ["code", "sg_sequence"]
+
+# Deep linked field used to fetch the project code along with the entity.
+PROJECT_CODE_FIELD = "project.Project.code"
+
+# LUT templates, from the least to the most specific level.
+CC_TEMPLATES = (
+    ("PROJECT_CC", "lut_root"),
+    ("SEQUENCE_CC", "lut_seq"),
+    ("SHOT_CC", "lut_shot"),
+)
+
+# Environment variables set from the context.
+ENV_KEYS = ("PROJECT", "SEQUENCE", "SHOT", "PROJECT_CC", "SEQUENCE_CC", "SHOT_CC")
+
+# Maximum number of LUT directories kept in the first file cache.
+FIRST_FILE_CACHE_SIZE = 256
+
+# First file found per LUT directory, keyed by path: (directory mtime, file)
+_first_file_cache = collections.OrderedDict()
+_first_file_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
 
 def resolve_template(context, template, fields=None):
     """Resolves sgtk templates.
@@ -40,43 +72,206 @@ def first_file(path):
     Returns the first file found in the given path. Useful if you're only
     expecting to find one file.
 
+    Results are cached per directory and reused for as long as the directory
+    modification time doesn't change, so a cache hit costs a single ``stat``.
+
     :param str path: The directory to search.
     :return: The full path to the found file.
     :rtype: str
     """
     try:
-        file = next(os.path.join(path, f) for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)))
-        return file
-    except StopIteration:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
         return None
 
+    with _first_file_lock:
+        cached = _first_file_cache.get(path)
+        if cached and cached[0] == mtime:
+            _first_file_cache.move_to_end(path)
+            return cached[1]
 
-def shot_cc_file(context):
+    file = None
     try:
-        lut_area = resolve_template(context, "lut_shot")
-        lut_file = first_file(lut_area)
-        return lut_file
-    except:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file = entry.path
+                    break
+    except OSError:
         return None
 
+    with _first_file_lock:
+        _first_file_cache[path] = (mtime, file)
+        _first_file_cache.move_to_end(path)
+        while len(_first_file_cache) > FIRST_FILE_CACHE_SIZE:
+            _first_file_cache.popitem(last=False)
 
-def sequence_cc_file(context):
+    return file
+
+
+def cc_files(context, templates=CC_TEMPLATES):
+    """Returns the CC files of the project, sequence and shot of the context.
+
+    The LUT area and its manifest are resolved once for all the levels, the
+    lookups missing the manifest warm the per-directory cache used by
+    :func:`first_file`.
+
+    :param context: The context to resolve the LUT templates with.
+    :param templates: ``(key, template)`` of the levels to look up, all of
+        them by default.
+    :return: The CC file found for each key, None for the levels without one.
+    :rtype: dict
+    """
+    manifest = _lut_manifest(context)
+    files = {}
+    for (key, template) in templates:
+        files[key] = _cc_file(context, template, manifest)
+    return files
+
+
+def _lut_manifest(context):
     try:
-        lut_area = resolve_template(context, "lut_seq")
-        lut_file = first_file(lut_area)
-        return lut_file
-    except:
+        return lut_manifest.get_manifest(resolve_template(context, "lut_root"))
+    except Exception as e:
+        logger.debug("Failed to load the LUT manifest: %s" % e)
         return None
 
 
-def project_cc_file(context):
+def _cc_file(context, template, manifest):
     try:
-        lut_area = resolve_template(context, "lut_root")
-        lut_file = first_file(lut_area)
-        return lut_file
-    except:
+        lut_area = resolve_template(context, template)
+    except Exception as e:
+        logger.debug("Failed to resolve the %s LUT area: %s" % (template, e))
         return None
 
+    # the LUT manifest answers without listing the folder, unless the
+    # folder changed since it was written.
+    if manifest is not None:
+        lut_file = manifest.lookup(lut_area)
+        if lut_file is not lut_manifest.UNKNOWN:
+            return lut_file
+
+    return first_file(lut_area)
+
+
+def context_entities(context):
+    """Returns the Shotgun records of the context project and entity.
+
+    Records are served from the process-wide entity cache when possible.
+    On a cache miss for the entity, the project code is fetched along with it
+    through a linked field, so both records cost a single round trip.
+
+    :param context: The context to look up.
+    :return: The project and entity records, either of them can be None.
+    :rtype: tuple
+    """
+    cache = shotgun_cache.entities
+    shotgun = context.sgtk.shotgun
+    project = None
+    entity = None
+
+    if context.project:
+        project = cache.get("Project", context.project["id"], PROJECT_FIELDS)
+
+    if context.entity:
+        entity_type = context.entity["type"]
+        entity_id = context.entity["id"]
+        entity = cache.get(entity_type, entity_id, ENTITY_FIELDS)
+
+        if entity is None:
+            fields = list(ENTITY_FIELDS)
+            if context.project and project is None:
+                fields.append(PROJECT_CODE_FIELD)
+
+            entity = shotgun.find_one(entity_type, [["id", "is", entity_id]], fields)
+            if entity:
+                if PROJECT_CODE_FIELD in entity:
+                    project = {
+                        "type": "Project",
+                        "id": context.project["id"],
+                        "code": entity.pop(PROJECT_CODE_FIELD),
+                    }
+                    cache.put(project)
+                cache.put(entity)
+
+    if context.project and project is None:
+        project = shotgun.find_one("Project", [["id", "is", context.project["id"]]], PROJECT_FIELDS)
+        if project:
+            cache.put(project)
+
+    return (project, entity)
+
+
+def context_env(context):
+    """Returns the environment variables to set for a context.
+
+    The shot, sequence and project names come from the process-wide entity
+    cache, which expires its records and is cleared whenever an engine
+    starts, see :func:`context_entities`. The CC files are looked up on every
+    call with :func:`cc_files`, through the LUT manifest and the
+    per-directory cache of :func:`first_file`, both checked against the
+    folder modification times.
+
+    :param context: The context to compute the variables for.
+    :return: The value of each variable, None for the variables to unset.
+    :rtype: dict
+    """
+    env = dict.fromkeys(ENV_KEYS)
+    if not context.project and not context.entity:
+        return env
+
+    (project, entity) = context_entities(context)
+    templates = []
+    if project is not None:
+        env["PROJECT"] = project.get("code")
+        templates.append(("PROJECT_CC", "lut_root"))
+
+    entity_type = context.entity["type"] if context.entity else None
+    if entity is not None and entity_type in ("Shot", "Sequence"):
+        env["SEQUENCE"] = (entity.get("sg_sequence") or {}).get("name")
+        templates.append(("SEQUENCE_CC", "lut_seq"))
+        if entity_type == "Shot":
+            env["SHOT"] = entity.get("code")
+            templates.append(("SHOT_CC", "lut_shot"))
+
+    env.update(cc_files(context, templates))
+    return env
+
+
+def apply_env(env):
+    """Applies environment variables to ``os.environ``.
+
+    Only the variables whose value differs from the one already set are
+    written or removed, each write triggers a ``putenv`` and the callbacks
+    watching it.
+
+    :param dict env: Variable values, None to unset a variable.
+    :return: The names of the variables changed.
+    :rtype: list
+    """
+    changed = []
+    for (key, value) in sorted(env.items()):
+        if not value:
+            if os.environ.get(key):
+                os.environ.pop(key)
+                changed.append(key)
+        elif os.environ.get(key) != value:
+            os.environ[key] = value
+            changed.append(key)
+    return changed
+
+
+def shot_cc_file(context):
+    return _cc_file(context, "lut_shot", _lut_manifest(context))
+
+
+def sequence_cc_file(context):
+    return _cc_file(context, "lut_seq", _lut_manifest(context))
+
+
+def project_cc_file(context):
+    return _cc_file(context, "lut_root", _lut_manifest(context))
+
 
 class ContextChange(get_hook_baseclass()):
     """
@@ -130,39 +325,7 @@ class ContextChange(get_hook_baseclass()):
             self.logger.debug("Current self.parent is: {}".format(self.parent))
 
             if current_context:
-                env_vars = {
-                    "PROJECT": None,
-                    "SHOT": None,
-                    "SEQUENCE": None,
-                    "PROJECT_CC": None,
-                    "SHOT_CC": None,
-                    "SEQUENCE_CC": None
-                }
-
-                if current_context.project:
-                    id = current_context.project['id']
-                    self.logger.debug("Current context project id: {}".format(id))
-                    entity = current_context.sgtk.shotgun.find_one('Project', [['id', 'is', id]], ['code'])
-                    self.logger.debug("Current context project entity: {}".format(entity))
-                    env_vars["PROJECT"] = entity['code']
-                    self.logger.debug("Set env var PROJECT = {}".format(entity['code']))
-                    env_vars["PROJECT_CC"] = project_cc_file(current_context)
-                    self.logger.debug("Set env var PROJECT_CC = {}".format(project_cc_file(current_context)))
-
-                if current_context.entity:
-                    type = current_context.entity['type']
-                    id = current_context.entity['id']
-                    entity = current_context.sgtk.shotgun.find_one(type, [['id', 'is', id]], ['code', 'sg_sequence'])
-                    if type == "Shot" or type == "Sequence":
-                        env_vars["SEQUENCE"] = entity.get('sg_sequence').get('name')
-                        env_vars["SEQUENCE_CC"] = sequence_cc_file(current_context)
-                    if type == "Shot":
-                        env_vars["SHOT"] = entity.get("code")
-                        env_vars["SHOT_CC"] = shot_cc_file(current_context)
-
-                for key, value in env_vars.iteritems():
-                    if not value:
-                        if os.environ.get(key):
-                            os.environ.pop(key)
-                    else:
-                        os.environ[key] = value
+                env_vars = context_env(current_context)
+                changed = apply_env(env_vars)
+                for key in changed:
+                    self.logger.debug("Set env var {} = {}".format(key, env_vars[key]))
@@ -16,8 +16,13 @@ Hook that gets executed every time an engine has fully initialized.
 from tank import Hook
 import os
 
+from cbfx import nuke_tools_index
+from cbfx import profiling
+from cbfx import shotgun_cache
+
 class EngineInit(Hook):
 
+    @profiling.profiled("engine_init", record="engine")
     def execute(self, engine, **kwargs):
         """
         Gets executed when a Toolkit engine has fully initialized.
@@ -25,7 +30,24 @@ class EngineInit(Hook):
         and the engine is fully operational.
         """
 
-        pass
+        profiling.annotate(engine=engine.instance_name)
+
+        # the engine (re)started, Shotgun data cached by the previous engine
+        # may be outdated.
+        shotgun_cache.invalidate()
+        self.logger.debug("[CBFX] cleared the Shotgun entity cache")
+
+        # gizmos, toolsets and plugins of the nuke_tools root, registered from
+        # their indexes rather than by walking the trees.
+        # Terminal sessions and Hiero have no Nodes toolbar, the tools are
+        # only added to the plugin path there.
+        if engine.name == "tk-nuke":
+            import nuke
+
+            menus = bool(nuke.env.get("gui")) and not engine.hiero_enabled
+            with profiling.timed("nuke_tools"):
+                nuke_tools_index.register_trees(engine.sgtk, self.logger, menus)
+
         # if engine.instance_name == "tk-desktop":
         #     os.environ.pop("NUKE_PATH")
         #     self.logger.debug("[CBFX] RESET NUKE PATH")
@@ -12,42 +12,112 @@
 Hook which chooses an environment file to use based on the current context.
 """
 
+import functools
+import os
+import sys
+
 from tank import Hook
 
+# Code shared between the hooks of this configuration lives in hooks/lib.
+# Toolkit picks the environment before starting any engine, ahead of every
+# other hook of the engine and its apps, so the folder is added to sys.path
+# here once for the whole process, see cbfx.
+_HOOKS_LIB = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "hooks",
+    "lib",
+)
+if _HOOKS_LIB not in sys.path:
+    sys.path.append(_HOOKS_LIB)
+
+from cbfx import profiling
+
+
+# Matches any value in an environment rule.
+ANY = "*"
+
+# Environment routing rules, tried in order. Each rule matches the context on
+# (source entity type, has project, entity type, has step), the first rule
+# matching all four picks the environment. A condition is either ANY, a
+# single value or a collection of accepted values. None stands for "no
+# entity" in the source entity and entity type conditions.
+ENVIRONMENT_RULES = (
+    # source entity                project  entity      step   environment
+    (("Version", "PublishedFile"), ANY,     ANY,        ANY,   "publishedfile_version"),
+    # Our context is completely empty. We're going into the site context.
+    (ANY,                          False,   ANY,        ANY,   "site"),
+    # We have a project but not an entity.
+    (ANY,                          True,    None,       ANY,   "project"),
+    # We have an entity but no step.
+    (ANY,                          True,    "Shot",     False, "shot"),
+    (ANY,                          True,    "Asset",    False, "asset"),
+    (ANY,                          True,    "Sequence", False, "sequence"),
+    # We have a step and an entity.
+    (ANY,                          True,    "Shot",     True,  "shot_step"),
+    (ANY,                          True,    "Asset",    True,  "asset_step"),
+)
+
+
+def compile_rules(rules):
+    """
+    Turns environment rules into tuples of frozenset conditions.
+
+    :param rules: Rules, in the :data:`ENVIRONMENT_RULES` format.
+    :returns: Tuple of (conditions, environment) pairs.
+    """
+    compiled = []
+    for rule in rules:
+        conditions = []
+        for condition in rule[:-1]:
+            if condition is not ANY and not isinstance(condition, (tuple, list, set, frozenset)):
+                condition = (condition,)
+            conditions.append(condition if condition is ANY else frozenset(condition))
+        compiled.append((tuple(conditions), rule[-1]))
+    return tuple(compiled)
+
+
+_COMPILED_RULES = compile_rules(ENVIRONMENT_RULES)
+
+
+def context_key(context):
+    """
+    Returns the routing key of a context.
+
+    :returns: (source entity type, has project, entity type, has step)
+    :rtype: tuple
+    """
+    return (
+        context.source_entity["type"] if context.source_entity else None,
+        context.project is not None,
+        context.entity["type"] if context.entity else None,
+        context.step is not None,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def environment_for_key(key):
+    """
+    Returns the environment the routing rules pick for a context key.
+
+    Results are memoized per key.
+
+    :param tuple key: A key returned by :func:`context_key`.
+    :returns: The environment name, None if no rule matches.
+    """
+    for (conditions, environment) in _COMPILED_RULES:
+        if all(c is ANY or value in c for (c, value) in zip(conditions, key)):
+            return environment
+    return None
+
 
 class PickEnvironment(Hook):
 
+    @profiling.profiled("pick_environment")
     def execute(self, context, **kwargs):
         """
         The default implementation assumes there are three environments, called shot, asset
         and project, and switches to these based on entity type.
+
+        The routing is driven by :data:`ENVIRONMENT_RULES`.
         """
-        if context.source_entity:
-            if context.source_entity["type"] in ["Version", "PublishedFile"]:
-                return "publishedfile_version"
-
-        if context.project is None:
-            # Our context is completely empty. We're going into the site context.
-            return "site"
-
-        if context.entity is None:
-            # We have a project but not an entity.
-            return "project"
-
-        if context.entity and context.step is None:
-            # We have an entity but no step.
-            if context.entity["type"] == "Shot":
-                return "shot"
-            if context.entity["type"] == "Asset":
-                return "asset"
-            if context.entity["type"] == "Sequence":
-                return "sequence"
-
-        if context.entity and context.step:
-            # We have a step and an entity.
-            if context.entity["type"] == "Shot":
-                return "shot_step"
-            if context.entity["type"] == "Asset":
-                return "asset_step"
-
-        return None
+        return environment_for_key(context_key(context))
@@ -0,0 +1,233 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+I/O Hook which creates folders on disk.
+
+Unlike the default core hook, which creates the items one at a time, the
+items are deduplicated, checked against a single listing of each parent
+folder and created on a thread pool.
+
+Core still expands the schema one entity at a time before calling this hook.
+The folders of whole sequences are expanded in memory in one go with the
+command line of :mod:`cbfx.schema_folders`, the regular folder creation then
+finds them on disk and only registers them.
+"""
+
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tank import Hook
+
+# code shared between the hooks of this configuration lives in hooks/lib,
+# which pick_environment adds to sys.path. Folders are also created by the
+# tank command and the API without an engine, see cbfx.
+_HOOKS_LIB = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "hooks",
+    "lib",
+)
+if _HOOKS_LIB not in sys.path:
+    sys.path.append(_HOOKS_LIB)
+
+from cbfx import schema_folders
+
+FOLDER_ACTIONS = ("entity_folder", "folder")
+
+
+class ProcessFolderCreation(Hook):
+
+    def execute(self, items, preview_mode, **kwargs):
+        """
+        Creates a list of files and folders.
+
+        The default implementation creates files and folders recursively using
+        open permissions.
+
+        :param list(dict): List of actions that needs to take place.
+
+        Six different types of actions are supported.
+
+        **Standard Folder**
+
+        This represents a standard folder in the file system which is not associated
+        with anything in Shotgun. It contains the following keys:
+
+        - **action** (:class:`str`) - ``folder``
+        - **metadata** (:class:`dict`) - The configuration yaml data for this item
+        - **path** (:class:`str`) - path on disk to the item
+
+        **Entity Folder**
+
+        This represents a folder in the file system which is associated
+        with a Shotgun entity. It contains the following keys:
+
+        - **action** (:class:`str`) - ``entity_folder``
+        - **metadata** (:class:`dict`) - The configuration yaml data for this item
+        - **path** (:class:`str`) - path on disk to the item
+        - **entity** (:class:`dict`) - Shotgun entity link with keys ``type``, ``id`` and ``name``.
+
+        **Remote Entity Folder**
+
+        This is the same as an entity folder, except that it was originally
+        created in another location. A remote folder request means that your
+        local toolkit instance has detected that folders have been created by
+        a different file system setup. It contains the following keys:
+
+        - **action** (:class:`str`) - ``remote_entity_folder``
+        - **metadata** (:class:`dict`) - The configuration yaml data for this item
+        - **path** (:class:`str`) - path on disk to the item
+        - **entity** (:class:`dict`) - Shotgun entity link with keys ``type``, ``id`` and ``name``.
+
+        **File Copy**
+
+        This represents a file copy operation which should be carried out.
+        It contains the following keys:
+
+        - **action** (:class:`str`) - ``copy``
+        - **metadata** (:class:`dict`) - The configuration yaml data associated with the directory level
+          on which this object exists.
+        - **source_path** (:class:`str`) - location of the file that should be copied
+        - **target_path** (:class:`str`) - target location to where the file should be copied.
+
+        **File Creation**
+
+        This is similar to the file copy, but instead of a source path, a chunk
+        of data is specified. It contains the following keys:
+
+        - **action** (:class:`str`) - ``create_file``
+        - **metadata** (:class:`dict`) - The configuration yaml data associated with the directory level
+          on which this object exists.
+        - **content** (:class:`str`) -- file content
+        - **target_path** (:class:`str`) -- target location to where the file should be copied.
+
+        **Symbolic Links**
+
+        This represents a request that a symbolic link is created. Note that symbolic links are not
+        supported in the same way on all operating systems. The default hook therefore does not
+        implement symbolic link support on Windows systems. If you want to add symbolic link support
+        on windows, simply copy this hook to your project configuration and make the necessary
+        modifications.
+
+        - **action** (:class:`str`) - ``symlink``
+        - **metadata** (:class:`dict`) - The raw configuration yaml data associated with symlink yml config file.
+        - **path** (:class:`str`) - the path to the symbolic link
+        - **target** (:class:`str`) - the target to which the symbolic link should point
+
+        :param bool preview_mode: Only report what would be created, as a dry run.
+        :returns: List of files and folders that have been created.
+        :rtype: list(str)
+        """
+        start = time.time()
+
+        # paths are compared normalized, and returned as core passed them
+        key = schema_folders.path_key
+        folders = {}
+        copies = []
+        files = []
+        symlinks = []
+        for i in items:
+            action = i.get("action")
+            if action in FOLDER_ACTIONS:
+                folders.setdefault(key(i.get("path")), i.get("path"))
+            elif action == "remote_entity_folder":
+                # created by another user on the shared project storage, like
+                # the core hook, nothing to replay locally.
+                pass
+            elif action == "copy":
+                copies.append((i.get("source_path"), i.get("target_path")))
+            elif action == "create_file":
+                files.append((i.get("path"), i.get("content")))
+            elif action == "symlink":
+                if sys.platform != "win32":
+                    symlinks.append((i.get("path"), i.get("target")))
+            else:
+                raise Exception("Unknown folder hook action '%s'" % action)
+
+        # dedupe, and find what exists with one listing per parent folder
+        folders = [folders[k] for k in sorted(folders)]
+        targets = (
+            folders
+            + [target for (_, target) in copies]
+            + [path for (path, _) in files]
+            + [path for (path, _) in symlinks]
+        )
+        existing = schema_folders.existing_paths(targets)
+
+        folders = [path for path in folders if key(path) not in existing]
+        copies = [(source, target) for (source, target) in copies if key(target) not in existing]
+        files = [(path, content) for (path, content) in files if key(path) not in existing]
+        symlinks = [(path, target) for (path, target) in symlinks if key(path) not in existing]
+
+        locations = (
+            folders
+            + [target for (_, target) in copies]
+            + [path for (path, _) in files]
+            + [path for (path, _) in symlinks]
+        )
+
+        if preview_mode:
+            for path in locations:
+                self.logger.info("Would create %s" % path)
+            self.logger.info(
+                "Folder creation dry run: %d paths to create out of %d planned, "
+                "computed in %.2fs" % (len(locations), len(targets), time.time() - start)
+            )
+            return locations
+
+        # set the umask so that we get true permissions
+        old_umask = os.umask(0)
+        try:
+            with ThreadPoolExecutor(max_workers=schema_folders.CREATE_WORKERS) as pool:
+                # sorted, so that parents are usually created before their children
+                list(pool.map(self._create_folder, folders))
+                list(pool.map(self._copy_file, copies))
+                list(pool.map(self._create_file, files))
+            for (path, target) in symlinks:
+                os.symlink(target, path)
+        finally:
+            # reset umask
+            os.umask(old_umask)
+
+        self.logger.debug(
+            "Created %d paths out of %d planned in %.2fs"
+            % (len(locations), len(targets), time.time() - start)
+        )
+        return locations
+
+    def _create_folder(self, path):
+        # create the folder using open permissions
+        try:
+            os.makedirs(path, 0o777)
+        except OSError:
+            # another thread may have created it as a parent
+            if not os.path.isdir(path):
+                raise
+
+    def _copy_file(self, item):
+        (source_path, target_path) = item
+        # do a standard file copy
+        shutil.copy(source_path, target_path)
+        # set permissions to open
+        os.chmod(target_path, 0o666)
+
+    def _create_file(self, item):
+        (path, content) = item
+        parent_folder = os.path.dirname(path)
+        if not os.path.exists(parent_folder):
+            self._create_folder(parent_folder)
+        # create the file
+        with open(path, "wb") as fp:
+            fp.write(content)
+        # and set permissions to open
+        os.chmod(path, 0o666)
@@ -0,0 +1,23 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Code shared between the core and app hooks of this configuration.
+
+Hooks are loaded from their file path by Toolkit, the ``hooks/lib`` folder
+of the configuration is added to ``sys.path`` by the ``pick_environment``
+core hook, which Toolkit runs before starting any engine. The hooks of the
+engines and apps can then import this package as is. The few hooks which
+also run without an engine, ``process_folder_creation`` and the
+``after_project_create`` setup hook, add the folder themselves.
+
+Modules imported from here live for the whole process and survive hook
+reloads.
+"""
@@ -0,0 +1,220 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Build step caching the parsed YAML files of the configuration.
+
+Toolkit loads ``yaml_cache.pickle`` from the pipeline configuration root, if
+there is one, when the pipeline configuration is created. The files found
+in it are not parsed again, which makes up most of the cost of loading the
+environments. Each cached file is checked against the file on disk
+(modification time and size) when it's used, and read again if it changed,
+so an outdated cache falls back to the disk file by file.
+
+This module resolves every environment of the configuration (includes and
+``@`` references) through Toolkit, so that a broken configuration is caught
+at build time, then writes the cache with all the files involved. The build
+is keyed by a hash of the content of the configuration YAML files and of the
+core version, and skipped when neither changed::
+
+    python hooks/lib/cbfx/config_cache.py /path/to/pipeline_configuration
+    python hooks/lib/cbfx/config_cache.py /path/to/pipeline_configuration --check
+
+``--check`` exits with a non zero status when the cache is missing or
+outdated, without needing Toolkit.
+
+``core/templates.yml`` is cached along with the environments, so that a
+farm task loading Toolkit for a template or two doesn't parse it again. The
+templates are still built by Toolkit, and match paths exactly as
+``Sgtk.templates`` does.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+# Environments resolved by the build.
+ENVIRONMENTS = (
+    "site",
+    "project",
+    "sequence",
+    "shot",
+    "shot_step",
+    "asset",
+    "asset_step",
+    "publishedfile_version",
+)
+
+# Cache read by Toolkit, and the description of the build which wrote it,
+# in the pipeline configuration root.
+CACHE_NAME = "yaml_cache.pickle"
+MANIFEST_NAME = "yaml_cache.json"
+
+# Pickle protocol readable by all the Python versions Toolkit runs in.
+PICKLE_PROTOCOL = 2
+
+
+def source_files(config_path):
+    """
+    Returns the YAML files of a configuration.
+
+    :param str config_path: The ``config`` folder of the pipeline configuration.
+    :returns: Sorted file paths.
+    :rtype: list
+    """
+    files = []
+    for (root, dirs, names) in os.walk(config_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        files.extend(os.path.join(root, name) for name in names if name.endswith(".yml"))
+    return sorted(files)
+
+
+def content_hash(config_path, files):
+    """
+    Returns a hash of the relative path and content of the given files.
+
+    :param str config_path: The folder the paths are made relative to.
+    :param list files: The files to hash.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for path in files:
+        digest.update(os.path.relpath(path, config_path).replace(os.path.sep, "/").encode("utf-8"))
+        digest.update(b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def load_manifest(pc_root):
+    """
+    Returns the description of the last build, None if there's none.
+    """
+    try:
+        with open(os.path.join(pc_root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(pc_root, config_path, core_version=None):
+    """
+    Tells whether the cache of a pipeline configuration is up to date.
+
+    :param str pc_root: The pipeline configuration root.
+    :param str config_path: Its ``config`` folder.
+    :param str core_version: If set, the cache must also have been built with
+        this version of Toolkit.
+    :rtype: bool
+    """
+    manifest = load_manifest(pc_root)
+    if not manifest or not os.path.exists(os.path.join(pc_root, CACHE_NAME)):
+        return False
+    if core_version is not None and manifest.get("core_version") != core_version:
+        return False
+    return manifest.get("hash") == content_hash(config_path, source_files(config_path))
+
+
+def build(tk, force=False):
+    """
+    Resolves the environments of a pipeline configuration and caches its
+    YAML files.
+
+    :param tk: Toolkit instance of the pipeline configuration.
+    :param bool force: Build even if the cache is up to date.
+    :returns: The build description, and whether the cache was written.
+    :rtype: tuple
+    :raises: The Toolkit error of the first environment which fails to resolve.
+    """
+    from tank.util.yaml_cache import g_yaml_cache
+
+    pipeline_configuration = tk.pipeline_configuration
+    pc_root = pipeline_configuration.get_path()
+    config_path = pipeline_configuration.get_config_location()
+
+    if not force and is_current(pc_root, config_path, tk.version):
+        return (load_manifest(pc_root), False)
+
+    start = time.time()
+    files = source_files(config_path)
+    digest = content_hash(config_path, files)
+
+    # resolving the environments reads all their includes through the
+    # Toolkit YAML cache.
+    environments = {}
+    for name in ENVIRONMENTS:
+        environment = pipeline_configuration.get_environment(name)
+        environments[name] = sorted(environment.get_engines())
+
+    # and pick up the files no environment includes, such as the templates
+    for path in files:
+        g_yaml_cache.get(path, deepcopy_data=False)
+
+    items = g_yaml_cache.get_cached_items()
+    _write(os.path.join(pc_root, CACHE_NAME), pickle.dumps(items, PICKLE_PROTOCOL))
+
+    manifest = {
+        "hash": digest,
+        "core_version": tk.version,
+        "generated": time.time(),
+        "seconds": time.time() - start,
+        "files": [os.path.relpath(p, config_path).replace(os.path.sep, "/") for p in files],
+        "cached_items": len(items),
+        "environments": environments,
+    }
+    _write(
+        os.path.join(pc_root, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return (manifest, True)
+
+
+def _write(path, data):
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Caches the YAML files of a pipeline configuration.")
+    parser.add_argument("pipeline_configuration", help="Root of the pipeline configuration.")
+    parser.add_argument("--check", action="store_true",
+                        help="Only check whether the cache is up to date.")
+    parser.add_argument("--force", action="store_true", help="Build even if the cache is up to date.")
+    args = parser.parse_args()
+
+    # hooks/lib, for the other modules of the build
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    pc_root = os.path.abspath(args.pipeline_configuration)
+    if args.check:
+        current = is_current(pc_root, os.path.join(pc_root, "config"))
+        print("%s cache is %s" % (pc_root, "up to date" if current else "missing or outdated"))
+        return 0 if current else 1
+
+    import sgtk
+
+    tk = sgtk.sgtk_from_path(pc_root)
+    (manifest, written) = build(tk, args.force)
+    if written:
+        print("Cached %d YAML files of %s in %.2fs" % (
+            manifest["cached_items"], pc_root, manifest["seconds"]))
+    else:
+        print("%s cache is up to date" % pc_root)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
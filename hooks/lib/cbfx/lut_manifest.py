@@ -0,0 +1,299 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Manifest of the LUT files of a project.
+
+The LUT area (``editorial/luts``, with a folder per sequence and per shot) is
+walked once and the first file of each folder is written to a JSON manifest,
+next to the LUT area, along with the folder modification time. Looking a
+folder up in the manifest then costs a ``stat`` instead of a directory
+listing, and a folder changed since the manifest was written is reported as
+unknown so that the caller falls back to the disk.
+
+The manifest is written and kept current from the command line::
+
+    python hooks/lib/cbfx/lut_manifest.py /path/to/project/editorial/luts
+    python hooks/lib/cbfx/lut_manifest.py /path/to/project/editorial/luts --watch 60
+
+With ``--watch``, the LUT area is polled and the manifest rewritten when a
+folder changed. Folders unchanged since the last pass are not listed again.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+# Version of the manifest layout, manifests of another version are ignored.
+MANIFEST_VERSION = 1
+
+# Name of the manifest file, written next to the LUT area folder.
+MANIFEST_NAME = ".%s_manifest.json"
+
+# Folder levels walked under the LUT area: sequences, then shots.
+MAX_DEPTH = 2
+
+# Returned by lookups for a folder which isn't in the manifest or changed
+# since the manifest was written.
+UNKNOWN = object()
+
+logger = logging.getLogger(__name__)
+
+# Manifests loaded by this process, by path: (manifest file mtime, manifest)
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def manifest_path(lut_root):
+    """
+    Returns the path of the manifest of a LUT area.
+
+    The manifest sits next to the LUT area rather than inside it, so that
+    writing it doesn't change the modification time of the folder it
+    describes.
+
+    :param str lut_root: The LUT area folder.
+    """
+    lut_root = os.path.normpath(lut_root)
+    return os.path.join(os.path.dirname(lut_root), MANIFEST_NAME % os.path.basename(lut_root))
+
+
+class LutManifest(object):
+    """
+    First file of each folder of a LUT area.
+
+    Folders are keyed by their path relative to the LUT area, with forward
+    slashes, the LUT area itself being ``""``. Each entry holds the folder
+    modification time in nanoseconds, the name of its first file or None,
+    and the names of its sub folders.
+    """
+
+    def __init__(self, root, folders, generated=None):
+        """
+        :param str root: The LUT area folder.
+        :param dict folders: ``relative path -> [mtime, file name, sub folders]``
+        :param float generated: When the folders were scanned.
+        """
+        self.root = os.path.normpath(root)
+        self.folders = folders
+        self.generated = generated or time.time()
+
+    def lookup(self, path):
+        """
+        Returns the first file of a folder of the LUT area.
+
+        :param str path: The folder to look up.
+        :returns: The path of the file, None if the folder has no file, or
+            :data:`UNKNOWN` if the manifest can't tell.
+        """
+        rel = os.path.relpath(os.path.normpath(path), self.root).replace(os.path.sep, "/")
+        if rel == ".":
+            rel = ""
+        entry = self.folders.get(rel)
+        if entry is None:
+            return UNKNOWN
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return UNKNOWN
+        if mtime != entry[0]:
+            return UNKNOWN
+
+        return os.path.join(path, entry[1]) if entry[1] else None
+
+    def to_dict(self):
+        return {
+            "version": MANIFEST_VERSION,
+            "root": self.root,
+            "generated": self.generated,
+            "folders": self.folders,
+        }
+
+
+def scan(lut_root, previous=None):
+    """
+    Walks a LUT area.
+
+    :param str lut_root: The LUT area folder.
+    :param previous: A manifest of the same LUT area. Folders whose
+        modification time didn't change since are not listed again.
+    :type previous: :class:`LutManifest`
+    :returns: The manifest of the LUT area.
+    :rtype: :class:`LutManifest`
+    """
+    folders = {}
+    known = previous.folders if previous else {}
+    _scan(os.path.normpath(lut_root), "", 0, known, folders)
+    return LutManifest(lut_root, folders)
+
+
+def _scan(path, rel, depth, known, folders):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+
+    entry = known.get(rel)
+    if entry is None or entry[0] != mtime:
+        first = None
+        subfolders = []
+        try:
+            with os.scandir(path) as entries:
+                for item in entries:
+                    if item.is_dir():
+                        subfolders.append(item.name)
+                    elif first is None and item.is_file():
+                        first = item.name
+        except OSError:
+            return
+        entry = [mtime, first, sorted(subfolders)]
+
+    folders[rel] = entry
+    if depth < MAX_DEPTH:
+        for name in entry[2]:
+            _scan(os.path.join(path, name), "%s/%s" % (rel, name) if rel else name, depth + 1, known, folders)
+
+
+def save(manifest, path=None):
+    """
+    Writes a manifest, atomically.
+
+    :param manifest: The manifest to write.
+    :type manifest: :class:`LutManifest`
+    :param str path: Where to write it, defaults to :func:`manifest_path`.
+    """
+    path = path or manifest_path(manifest.root)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(manifest.to_dict(), f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """
+    Reads a manifest.
+
+    :param str path: The manifest file.
+    :returns: The manifest, None if it is missing, unreadable or of another
+        version.
+    :rtype: :class:`LutManifest`
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != MANIFEST_VERSION:
+        return None
+    return LutManifest(data["root"], data["folders"], data.get("generated"))
+
+
+def get_manifest(lut_root):
+    """
+    Returns the manifest of a LUT area, as written on disk.
+
+    Manifests are kept in memory and read again when the manifest file
+    changes, so repeated calls cost a ``stat``.
+
+    :param str lut_root: The LUT area folder.
+    :returns: The manifest, None if there's no usable manifest.
+    :rtype: :class:`LutManifest`
+    """
+    path = manifest_path(lut_root)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _manifests_lock:
+        cached = _manifests.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    manifest = load(path)
+    if manifest is not None and manifest.root != os.path.normpath(lut_root):
+        # the LUT area was moved or is seen through another mount point,
+        # the manifest entries still hold for it.
+        manifest.root = os.path.normpath(lut_root)
+    with _manifests_lock:
+        _manifests[path] = (mtime, manifest)
+    return manifest
+
+
+def refresh(lut_root):
+    """
+    Brings the manifest of a LUT area up to date.
+
+    Only the folders changed since the manifest was written are listed, the
+    manifest is only written if one of them changed.
+
+    :param str lut_root: The LUT area folder.
+    :returns: The current manifest, and whether it was written.
+    :rtype: tuple
+    """
+    previous = load(manifest_path(lut_root))
+    manifest = scan(lut_root, previous)
+    if previous is not None and previous.folders == manifest.folders:
+        return (previous, False)
+    save(manifest)
+    return (manifest, True)
+
+
+def watch(lut_root, interval):
+    """
+    Keeps the manifest of a LUT area up to date, until interrupted.
+
+    :param str lut_root: The LUT area folder.
+    :param float interval: Seconds between two passes.
+    """
+    while True:
+        start = time.time()
+        try:
+            (manifest, written) = refresh(lut_root)
+        except Exception:
+            logger.exception("Failed to refresh the LUT manifest of %s" % lut_root)
+        else:
+            if written:
+                logger.info(
+                    "LUT manifest of %s written, %d folders (%.2fs)"
+                    % (lut_root, len(manifest.folders), time.time() - start)
+                )
+        time.sleep(max(0, interval - (time.time() - start)))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Writes the LUT manifest of a project.")
+    parser.add_argument("lut_root", help="The LUT area folder, e.g. /projects/xyz/editorial/luts")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Keep the manifest up to date, polling every SECONDS.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.watch:
+        watch(args.lut_root, args.watch)
+    else:
+        start = time.time()
+        (manifest, written) = refresh(args.lut_root)
+        logger.info(
+            "LUT manifest of %s %s, %d folders (%.2fs)" % (
+                args.lut_root,
+                "written" if written else "already up to date",
+                len(manifest.folders),
+                time.time() - start,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Index of the gizmos, toolsets and plugins of the ``nuke_tools`` storage root.
+
+Each tree listed in :data:`TREES` gets a JSON index, written next to the
+tree folder, holding every folder of the tree with its modification time,
+its sub folders, its tool files and whether it holds icons. Nuke registers
+the tools from the index at startup instead of walking the trees over the
+network, see :func:`register_trees`. Folders changed since the index was
+written are listed again.
+
+Indexes are written and kept current from the command line::
+
+    python hooks/lib/cbfx/nuke_tools_index.py /path/to/pipeline_configuration
+    python hooks/lib/cbfx/nuke_tools_index.py /path/to/pipeline_configuration --watch 300
+
+Folders unchanged since the last pass are not listed again, only the
+modification times of their files are refreshed.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+# Version of the index layout, indexes of another version are ignored.
+INDEX_VERSION = 2
+
+# Name of the index file, written next to the tree folder.
+INDEX_NAME = ".%s_index.json"
+
+GIZMOS = "gizmos"
+TOOLSETS = "toolsets"
+PLUGINS = "plugins"
+
+# File extensions of the tools, by kind.
+KIND_EXTENSIONS = {
+    GIZMOS: (".gizmo",),
+    TOOLSETS: (".nk",),
+    PLUGINS: (".so", ".dll", ".dylib", ".py", ".tcl"),
+}
+
+# File extensions of the icons of the tools, found through the plugin path.
+ICON_EXTENSIONS = (".png", ".svg", ".xpm")
+
+# Trees of the nuke_tools root: (template, kind, menu label).
+TREES = (
+    ("nuke_tools_all_gizmos_cbfx", GIZMOS, "CBFX"),
+    ("nuke_tools_all_gizmos_nukepedia", GIZMOS, "Nukepedia"),
+    ("nuke_tools_project_gizmos", GIZMOS, "Project"),
+    ("nuke_tools_all_toolsets", TOOLSETS, "CBFX"),
+    ("nuke_tools_project_toolsets", TOOLSETS, "Project"),
+    ("nuke_tools_all_plugins", PLUGINS, None),
+    ("nuke_tools_project_plugins", PLUGINS, None),
+)
+
+logger = logging.getLogger(__name__)
+
+# Tree folders already registered in this Nuke session.
+_registered = set()
+_registered_lock = threading.Lock()
+
+
+class Tool(collections.namedtuple("Tool", ["name", "path", "mtime", "category"])):
+    """
+    A tool file found in a tree.
+
+    :ivar str name: File name without extension, the gizmo node class.
+    :ivar str path: Path of the file.
+    :ivar int mtime: Modification time of the file, in nanoseconds.
+    :ivar str category: Folder of the file relative to the tree, with
+        forward slashes, used as menu path. Empty at the tree root.
+    """
+    __slots__ = ()
+
+
+def index_path(tree):
+    """
+    Returns the path of the index of a tree.
+
+    The index sits next to the tree rather than inside it, so that writing
+    it doesn't change the modification time of the folder it describes.
+
+    :param str tree: The tree folder.
+    """
+    tree = os.path.normpath(tree)
+    return os.path.join(os.path.dirname(tree), INDEX_NAME % os.path.basename(tree))
+
+
+class ToolsIndex(object):
+    """
+    Folders and tool files of a tree.
+
+    Folders are keyed by their path relative to the tree, with forward
+    slashes, the tree itself being ``""``. Each entry holds the folder
+    modification time in nanoseconds, the ``[name, mtime]`` of its tool files,
+    the names of its sub folders and whether it holds icons.
+    """
+
+    def __init__(self, root, kind, folders, generation=0):
+        """
+        :param str root: The tree folder.
+        :param str kind: :data:`GIZMOS`, :data:`TOOLSETS` or :data:`PLUGINS`.
+        :param dict folders: ``relative path -> [mtime, files, sub folders, icons]``
+        :param int generation: Number of times the index was written.
+        """
+        self.root = os.path.normpath(root)
+        self.kind = kind
+        self.folders = folders
+        self.generation = generation
+
+    def tools(self):
+        """
+        Returns the tools of the tree, sorted by category and name.
+
+        :rtype: list of :class:`Tool`
+        """
+        tools = []
+        for (rel, (_, files, _, _)) in sorted(self.folders.items()):
+            folder = os.path.join(self.root, *rel.split("/")) if rel else self.root
+            for (name, mtime) in files:
+                tools.append(Tool(os.path.splitext(name)[0], os.path.join(folder, name), mtime, rel))
+        return tools
+
+    def tool_folders(self):
+        """
+        Returns the folders holding tools or icons, sorted.
+        """
+        return sorted(
+            os.path.join(self.root, *rel.split("/")) if rel else self.root
+            for (rel, (_, files, _, icons)) in self.folders.items()
+            if files or icons
+        )
+
+    def is_current(self):
+        """
+        Tells whether none of the folders of the tree changed since the index
+        was written. Costs a ``stat`` per folder.
+        """
+        if "" not in self.folders:
+            return False
+        for (rel, entry) in self.folders.items():
+            path = os.path.join(self.root, *rel.split("/")) if rel else self.root
+            try:
+                if os.stat(path).st_mtime_ns != entry[0]:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def to_dict(self):
+        return {
+            "version": INDEX_VERSION,
+            "generation": self.generation,
+            "kind": self.kind,
+            "root": self.root,
+            "folders": self.folders,
+        }
+
+
+def scan(tree, kind, previous=None):
+    """
+    Walks a tree.
+
+    :param str tree: The tree folder.
+    :param str kind: The kind of tools the tree holds.
+    :param previous: An index of the same tree. Folders whose modification
+        time didn't change since are not listed again.
+    :type previous: :class:`ToolsIndex`
+    :rtype: :class:`ToolsIndex`
+    """
+    folders = {}
+    known = previous.folders if previous else {}
+    _scan(os.path.normpath(tree), "", KIND_EXTENSIONS[kind], known, folders)
+    return ToolsIndex(tree, kind, folders, previous.generation if previous else 0)
+
+
+def _scan(path, rel, extensions, known, folders):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+
+    entry = known.get(rel)
+    if entry is not None and entry[0] == mtime:
+        # same files, only their content may have changed
+        files = []
+        for (name, file_mtime) in entry[1]:
+            try:
+                file_mtime = os.stat(os.path.join(path, name)).st_mtime_ns
+            except OSError:
+                continue
+            files.append([name, file_mtime])
+        entry = [mtime, files, entry[2], entry[3]]
+    else:
+        files = []
+        subfolders = []
+        icons = False
+        try:
+            with os.scandir(path) as items:
+                for item in items:
+                    if item.name.startswith("."):
+                        continue
+                    if item.is_dir():
+                        subfolders.append(item.name)
+                    elif item.name.lower().endswith(extensions):
+                        files.append([item.name, item.stat().st_mtime_ns])
+                    elif item.name.lower().endswith(ICON_EXTENSIONS):
+                        icons = True
+        except OSError:
+            return
+        entry = [mtime, sorted(files), sorted(subfolders), icons]
+
+    folders[rel] = entry
+    for name in entry[2]:
+        _scan(os.path.join(path, name), "%s/%s" % (rel, name) if rel else name, extensions, known, folders)
+
+
+def save(index, path=None):
+    """
+    Writes an index atomically, bumping its generation.
+
+    :param index: The index to write.
+    :type index: :class:`ToolsIndex`
+    :param str path: Where to write it, defaults to :func:`index_path`.
+    """
+    index.generation += 1
+    path = path or index_path(index.root)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(index.to_dict(), f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load(tree, kind):
+    """
+    Reads the index of a tree.
+
+    :returns: The index, None if it is missing, unreadable, of another
+        version or of another kind.
+    :rtype: :class:`ToolsIndex`
+    """
+    try:
+        with open(index_path(tree)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != INDEX_VERSION or data.get("kind") != kind:
+        return None
+    # the tree may be seen through another mount point than when indexed
+    return ToolsIndex(tree, kind, data["folders"], data.get("generation", 0))
+
+
+def refresh(tree, kind):
+    """
+    Brings the index of a tree up to date.
+
+    :returns: The current index, and whether it was written.
+    :rtype: tuple
+    """
+    previous = load(tree, kind)
+    index = scan(tree, kind, previous)
+    if previous is not None and previous.folders == index.folders:
+        return (previous, False)
+    save(index)
+    return (index, True)
+
+
+def tree_paths(tk):
+    """
+    Returns the trees of a pipeline configuration.
+
+    :param tk: Toolkit instance.
+    :returns: ``(path, kind, label)`` of each tree found in the templates.
+    :rtype: list
+    """
+    trees = []
+    for (template_name, kind, label) in TREES:
+        template = tk.templates.get(template_name)
+        if template is None:
+            continue
+        trees.append((os.path.normpath(template.apply_fields({})), kind, label))
+    return trees
+
+
+def register_trees(tk, log=logger, menus=True):
+    """
+    Registers the tools of all the trees in Nuke.
+
+    Each tree is registered from its index when none of its folders changed
+    since the index was written. Otherwise the changed folders are listed
+    again, or the whole tree is walked when it has no index.
+
+    :param tk: Toolkit instance.
+    :param log: Logger to report to.
+    :param bool menus: Whether to list the tools in the Nodes toolbar, there
+        is none in terminal sessions and in Hiero.
+    """
+    for (tree, kind, label) in tree_paths(tk):
+        with _registered_lock:
+            if tree in _registered:
+                continue
+            _registered.add(tree)
+
+        start = time.time()
+        index = load(tree, kind)
+        source = "index"
+        if index is None:
+            if not os.path.isdir(tree):
+                continue
+            index = scan(tree, kind)
+            source = "walk"
+        elif not index.is_current():
+            index = scan(tree, kind, index)
+            source = "updated index"
+
+        register(index, label, menus)
+        log.debug(
+            "[CBFX] registered %d %s of %s from %s (%.3fs)"
+            % (len(index.tools()), kind, tree, source, time.time() - start)
+        )
+
+
+def register(index, label, menus=True):
+    """
+    Registers the tools of an index in Nuke.
+
+    The folders holding gizmos, plugins or their icons are added to the
+    plugin path.
+    Gizmos get a command creating them and toolsets a command loading them,
+    under ``label`` in the Nodes toolbar, following the folders of the tree.
+
+    :param index: The index to register.
+    :type index: :class:`ToolsIndex`
+    :param str label: Menu the tools are listed under.
+    :param bool menus: Whether to add the menus, or only the plugin path.
+    """
+    import nuke
+
+    if index.kind in (GIZMOS, PLUGINS):
+        for folder in index.tool_folders():
+            nuke.pluginAddPath(folder.replace(os.path.sep, "/"))
+
+    if not menus:
+        return
+
+    if index.kind == GIZMOS:
+        menu = nuke.toolbar("Nodes").addMenu(label)
+        for tool in index.tools():
+            menu.addCommand(
+                "/".join(filter(None, (tool.category, tool.name))),
+                "nuke.createNode(%r)" % tool.name,
+            )
+    elif index.kind == TOOLSETS:
+        menu = nuke.toolbar("Nodes").addMenu("ToolSets").addMenu(label)
+        for tool in index.tools():
+            menu.addCommand(
+                "/".join(filter(None, (tool.category, tool.name))),
+                "nuke.loadToolset(%r)" % tool.path.replace(os.path.sep, "/"),
+            )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Writes the nuke_tools indexes of a project.")
+    parser.add_argument("pipeline_configuration", help="Root of the pipeline configuration.")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Keep the indexes up to date, polling every SECONDS.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    import sgtk
+
+    trees = tree_paths(sgtk.sgtk_from_path(args.pipeline_configuration))
+    while True:
+        for (tree, kind, _) in trees:
+            start = time.time()
+            try:
+                (index, written) = refresh(tree, kind)
+            except Exception:
+                logger.exception("Failed to index %s" % tree)
+                continue
+            if written:
+                logger.info(
+                    "Indexed %d %s of %s, generation %d (%.2fs)"
+                    % (len(index.tools()), kind, tree, index.generation, time.time() - start)
+                )
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cheap validation of Nuke scripts and Hiero projects before they are handed
+to the DCC.
+
+A file is stat-ed once and only its first and last bytes are read, through a
+memory map, so checking a large script on network storage costs about the
+same as checking a small one. Results are cached by path, modification time
+and size.
+"""
+import collections
+import mmap
+import os
+import re
+import threading
+
+# Number of bytes looked at, at each end of the file.
+HEADER_SIZE = 4096
+TRAILER_SIZE = 256
+
+# Maximum number of files remembered.
+CACHE_SIZE = 256
+
+# File kinds: kind -> (description, header pattern, trailer pattern)
+#
+# Nuke scripts start with the ``#!`` line written by Nuke, a ``version`` line
+# or, for copied node fragments, a ``set cut_paste_input`` line. They end on
+# the closing brace of the last node, or the end of a group.
+NUKE_SCRIPT = "nuke_script"
+HIERO_PROJECT = "hiero_project"
+
+FORMATS = {
+    NUKE_SCRIPT: (
+        "Nuke script",
+        re.compile(br"^\s*(#!|version\s+\d|set\s+cut_paste_input|Root\s*\{)", re.MULTILINE),
+        re.compile(br"(\}|end_group)\s*$"),
+    ),
+    HIERO_PROJECT: (
+        "Hiero project",
+        re.compile(br"^(\xef\xbb\xbf)?\s*(<\?xml[^>]*\?>\s*)?<hieroXML\b"),
+        re.compile(br">\s*$"),
+    ),
+}
+
+# Preflight outcome by path: (mtime, size, error message or None)
+_results = collections.OrderedDict()
+_results_lock = threading.Lock()
+
+
+class PreflightError(Exception):
+    """
+    Raised for a file which is missing, can't be read or isn't of the
+    expected kind.
+    """
+
+
+def check(path, kind):
+    """
+    Makes sure a file exists and looks like a file of the given kind.
+
+    :param str path: The file to check.
+    :param str kind: :data:`NUKE_SCRIPT` or :data:`HIERO_PROJECT`.
+    :raises PreflightError: If the file can't be used.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise PreflightError("File not found on disk - '%s'" % path)
+
+    key = (path, kind)
+    with _results_lock:
+        cached = _results.get(key)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            _results.move_to_end(key)
+            error = cached[2]
+        else:
+            cached = None
+
+    if cached is None:
+        error = _probe(path, kind, stat.st_size)
+        with _results_lock:
+            _results[key] = (stat.st_mtime_ns, stat.st_size, error)
+            _results.move_to_end(key)
+            while len(_results) > CACHE_SIZE:
+                _results.popitem(last=False)
+
+    if error:
+        raise PreflightError(error)
+
+
+def clear_cache():
+    """
+    Forgets all the files checked so far.
+    """
+    with _results_lock:
+        _results.clear()
+
+
+def _probe(path, kind, size):
+    """
+    Reads the ends of a file to validate it.
+
+    :returns: A description of the problem, None if the file looks fine.
+    """
+    (description, header_pattern, trailer_pattern) = FORMATS[kind]
+
+    if size == 0:
+        return "'%s' is empty" % path
+
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header = data[:HEADER_SIZE]
+                trailer = data[max(0, size - TRAILER_SIZE):]
+    except (OSError, ValueError) as e:
+        return "'%s' can't be read: %s" % (path, e)
+
+    if not header_pattern.search(header):
+        return "'%s' is not a %s" % (path, description)
+    if not trailer_pattern.search(trailer):
+        return "'%s' looks truncated, it doesn't end like a %s" % (path, description)
+    return None
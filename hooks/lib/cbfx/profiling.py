@@ -0,0 +1,254 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Lightweight startup profiling for the hooks on the launch path.
+
+Hooks wrap their entry point with :func:`profiled`, which records the wall
+time of each call along with the number of Shotgun API calls and filesystem
+calls made while it runs. The counters are only in place while a profiled
+section runs. The launcher side writes one JSON line when the application
+is started and the engine side writes another one once the engine is
+initialized. Both carry the same launch id so they can be joined.
+"""
+import contextlib
+import functools
+import getpass
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+# Environment variables handing the launch over to the launched application.
+LAUNCH_ID_ENV = "CBFX_LAUNCH_ID"
+LAUNCH_TIME_ENV = "CBFX_LAUNCH_TIME"
+
+# Name of the log file, in the Toolkit logging folder.
+LOG_FILE_NAME = "cbfx_launch_profile.jsonl"
+
+# Filesystem functions counted while a profiled section runs.
+FS_FUNCTIONS = ("stat", "lstat", "listdir", "scandir")
+
+_lock = threading.RLock()
+_hooks = {}
+_annotations = {}
+
+# Sections running on all the threads, and the functions their counters
+# replaced: (owner, name) -> (original, wrapper).
+_running = 0
+_originals = {}
+
+# Sections running on each thread, innermost last.
+_local = threading.local()
+
+
+def _active():
+    active = getattr(_local, "sections", None)
+    if active is None:
+        active = _local.sections = []
+    return active
+
+
+def _count(counter):
+    # only the thread running the sections touches its list
+    for section in getattr(_local, "sections", ()):
+        section[counter] += 1
+
+
+def _counting(counter, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _count(counter)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _install_counters():
+    """
+    Wraps the filesystem and Shotgun API entry points with call counters
+    when the first section starts. The wrappers only count for the threads
+    running a section.
+    """
+    global _running
+    with _lock:
+        _running += 1
+        if _running > 1:
+            return
+
+        for name in FS_FUNCTIONS:
+            _wrap(os, name, "fs")
+
+        try:
+            from tank_vendor.shotgun_api3 import Shotgun
+        except ImportError:
+            return
+        _wrap(Shotgun, "_call_rpc", "shotgun")
+
+
+def _wrap(owner, name, counter):
+    original = getattr(owner, name)
+    wrapper = _counting(counter, original)
+    _originals[(owner, name)] = (original, wrapper)
+    setattr(owner, name, wrapper)
+
+
+def _uninstall_counters():
+    """
+    Puts the original functions back once the last section ended, so
+    nothing is wrapped outside of the profiled sections.
+    """
+    global _running
+    with _lock:
+        _running -= 1
+        if _running:
+            return
+
+        for ((owner, name), (original, wrapper)) in _originals.items():
+            # left alone if it was wrapped again since
+            if getattr(owner, name) is wrapper:
+                setattr(owner, name, original)
+        _originals.clear()
+
+
+@contextlib.contextmanager
+def timed(name):
+    """
+    Records the wall time and call counts of a block of code.
+
+    Only the calls made by the thread running the block are counted.
+
+    :param str name: Name the timings are recorded under.
+    """
+    _install_counters()
+    section = {"shotgun": 0, "fs": 0}
+    active = _active()
+    active.append(section)
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        wall = time.time() - start
+        # sections are compared by identity, nested sections often hold
+        # equal counts.
+        active[:] = [s for s in active if s is not section]
+        _uninstall_counters()
+        with _lock:
+            stats = _hooks.setdefault(name, {"calls": 0, "wall": 0.0, "shotgun": 0, "fs": 0})
+            stats["calls"] += 1
+            stats["wall"] += wall
+            stats["shotgun"] += section["shotgun"]
+            stats["fs"] += section["fs"]
+
+
+def profiled(name, record=None):
+    """
+    Decorator recording the timings of a hook method.
+
+    :param str name: Name the timings are recorded under.
+    :param str record: If set, a launch record for this stage (``launcher``
+        or ``engine``) is written once the method returns.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with timed(name):
+                    return func(*args, **kwargs)
+            finally:
+                if record:
+                    write_record(record)
+        return wrapper
+    return decorator
+
+
+def annotate(**fields):
+    """
+    Adds fields to the next launch record.
+    """
+    with _lock:
+        _annotations.update(fields)
+
+
+def start_launch():
+    """
+    Starts a new launch, inherited by the processes started from now on.
+
+    :returns: The launch id.
+    :rtype: str
+    """
+    launch_id = uuid.uuid4().hex
+    os.environ[LAUNCH_ID_ENV] = launch_id
+    os.environ[LAUNCH_TIME_ENV] = repr(time.time())
+    return launch_id
+
+
+def log_path():
+    """
+    Returns the path of the launch profile log.
+    """
+    from tank.util import LocalFileStorageManager
+
+    return os.path.join(
+        LocalFileStorageManager.get_global_root(LocalFileStorageManager.LOGGING),
+        LOG_FILE_NAME,
+    )
+
+
+def write_record(stage, path=None):
+    """
+    Appends the timings recorded so far to the launch log and resets them.
+
+    Errors are swallowed, profiling must never get in the way of a launch.
+
+    :param str stage: The launch stage, ``launcher`` or ``engine``.
+    :param str path: Log file to write to, defaults to :func:`log_path`.
+    """
+    with _lock:
+        hooks = dict(_hooks)
+        annotations = dict(_annotations)
+        _hooks.clear()
+        _annotations.clear()
+
+    now = time.time()
+    record = {
+        "launch_id": os.environ.get(LAUNCH_ID_ENV),
+        "stage": stage,
+        "time": now,
+        "host": socket.gethostname(),
+        "user": getpass.getuser(),
+        "pid": os.getpid(),
+        "hooks": hooks,
+        "total_wall": sum(h["wall"] for h in hooks.values()),
+        "total_shotgun": sum(h["shotgun"] for h in hooks.values()),
+        "total_fs": sum(h["fs"] for h in hooks.values()),
+    }
+    try:
+        record["since_launch"] = now - float(os.environ[LAUNCH_TIME_ENV])
+    except (KeyError, ValueError):
+        pass
+    record.update(annotations)
+
+    try:
+        path = path or log_path()
+        with open(path, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+    except Exception:
+        pass
+
+
+def stats():
+    """
+    Returns a copy of the timings recorded since the last launch record.
+    """
+    with _lock:
+        return dict((name, dict(s)) for (name, s) in _hooks.items())
@@ -0,0 +1,391 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Batched, parallel publishing for the tk-multi-publish2 plugins.
+
+The publish plugins of this configuration queue their work here during the
+publish phase instead of doing it item by item: file transfers, see
+:mod:`cbfx.transfer`, start right away on a bounded worker pool, the
+PublishedFile and Version records wait. All the items are published before
+any is finalized, so the first finalize flushes the batch: it waits for the
+copies, creates the records with a few ``batch`` calls, and uploads the
+thumbnails and movies on the pool.
+
+A batch belongs to a single publish session. It is dropped when an item
+fails to publish, and a session stopped before finalizing leaves nothing
+behind for the next one, see :func:`current`.
+
+Worker threads only move files and talk to Shotgun. Logging, which updates
+the publisher UI, stays on the main thread.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cbfx import transfer
+
+# Number of copies and uploads running at the same time.
+PUBLISH_WORKERS = 4
+
+# Fields of the dependency records, by publish entity type.
+DEPENDENCY_FIELDS = {
+    "PublishedFile": ("published_file", "dependent_published_file"),
+    "TankPublishedFile": ("tank_published_file", "dependent_tank_published_file"),
+}
+
+# Kinds of records queued for an item.
+PUBLISH = "publish"
+VERSION = "version"
+
+# Failure messages of the transfers, by step.
+STEP_ERRORS = {
+    "upload": "Failed to upload the media: %s",
+    "thumbnail": "Failed to upload the thumbnail: %s",
+}
+
+_executor = None
+_current = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS)
+        return _executor
+
+
+def _root(item):
+    while getattr(item, "parent", None) is not None:
+        item = item.parent
+    return item
+
+
+def current(item, kind):
+    """
+    Returns the batch to queue a record of an item in.
+
+    Each publish session gets its own batch. A new batch is started when the
+    pending one was flushed, belongs to another tree of items, or already
+    holds a record of this kind for the item: the previous session then
+    stopped before finalizing, and its pending batch is dropped.
+
+    :param item: The publish2 item.
+    :param str kind: :data:`PUBLISH` or :data:`VERSION`.
+    :rtype: :class:`PublishBatch`
+    """
+    global _current
+    root = _root(item)
+    with _lock:
+        if (_current is None or _current.flushed or _current.root is not root
+                or _current.holds(item, kind)):
+            _current = PublishBatch(root)
+        return _current
+
+
+def queued(item, kind):
+    """
+    Returns the batch holding a record of an item.
+
+    :param item: The publish2 item.
+    :param str kind: :data:`PUBLISH` or :data:`VERSION`.
+    :returns: The batch, None if the record isn't queued in the current one.
+    :rtype: :class:`PublishBatch`
+    """
+    with _lock:
+        if _current is not None and _current.holds(item, kind):
+            return _current
+    return None
+
+
+def discard():
+    """
+    Drops the pending batch, when an item failed to publish. The copies
+    already running complete, no record is created.
+    """
+    global _current
+    with _lock:
+        if _current is not None and not _current.flushed:
+            _current = None
+
+
+def copy_files(copies, manifest=None, hardlink=False, verify=True):
+    """
+    Transfers files, see :func:`cbfx.transfer.transfer_files`.
+
+    :returns: Seconds spent, and the number of files transferred by each
+        method.
+    :rtype: tuple
+    """
+    start = time.time()
+    methods = transfer.transfer_files(copies, manifest, hardlink, verify)
+    return (time.time() - start, methods)
+
+
+def _timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+class _Record(object):
+    """
+    Work queued for an item.
+    """
+
+    def __init__(self, item, data):
+        self.item = item
+        self.data = data
+        self.futures = {}
+        self.timings = {}
+        self.errors = []
+        self.entity = None
+
+
+class PublishBatch(object):
+    """
+    PublishedFile and Version records of the items of a publish, and the
+    file transfers they need.
+    """
+
+    def __init__(self, root=None):
+        """
+        :param root: Root of the tree of the items of the publish.
+        """
+        self.root = root
+        self.flushed = False
+        self._publishes = []
+        self._versions = []
+        self._queued = set()
+        self._results = {}
+
+    def holds(self, item, kind):
+        """
+        Tells whether a record of the given kind is queued for an item.
+        """
+        return (id(item), kind) in self._queued
+
+    def add_publish(self, item, publish_data, copies, thumbnail_path=None,
+                    dependency_paths=None, dependency_ids=None, manifest=None,
+                    hardlink=False, verify=True):
+        """
+        Queues a PublishedFile.
+
+        :param item: The publish2 item.
+        :param dict publish_data: The fields of the record, as returned by
+            ``sgtk.util.register_publish`` with ``dry_run`` set.
+        :param list copies: ``(work file, publish file)`` paths to copy
+            before the record is created. The copies start right away.
+        :param str thumbnail_path: Thumbnail to upload to the record.
+        :param list dependency_paths: Paths of the publishes it depends on.
+        :param list dependency_ids: Ids of the publishes it depends on. The
+            publish queued for the parent item, if any, is added on flush.
+        :param str manifest: Where to write the manifest of the copies.
+        :param bool hardlink: Allow hard links for the copies.
+        :param bool verify: Compare the checksums of the copied files.
+        """
+        record = _Record(item, dict(publish_data))
+        record.thumbnail_path = thumbnail_path
+        record.dependency_paths = list(dependency_paths or [])
+        record.dependency_ids = list(dependency_ids or [])
+        if copies:
+            record.futures["copy"] = _pool().submit(copy_files, copies, manifest, hardlink, verify)
+        self._publishes.append(record)
+        self._queued.add((id(item), PUBLISH))
+
+    def add_version(self, item, version_data, upload_path=None, thumbnail_path=None):
+        """
+        Queues a Version.
+
+        :param item: The publish2 item.
+        :param dict version_data: The fields of the record. The publish of
+            the item is linked to it on flush, if any.
+        :param str upload_path: Movie or image to upload to the record.
+        :param str thumbnail_path: Thumbnail to upload when nothing else is.
+        """
+        record = _Record(item, dict(version_data))
+        record.upload_path = upload_path
+        record.thumbnail_path = thumbnail_path
+        self._versions.append(record)
+        self._queued.add((id(item), VERSION))
+
+    def result(self, item):
+        """
+        Returns the outcome of the work queued for an item.
+
+        :returns: The timings of each step, in seconds, and the errors.
+        :rtype: tuple
+        """
+        return self._results.get(id(item), ({}, []))
+
+    def flush(self, tk):
+        """
+        Creates the queued records and runs the uploads, waiting for all the
+        transfers to complete. Runs on the main thread, once.
+
+        :param tk: Toolkit instance.
+        """
+        if self.flushed:
+            return
+        self.flushed = True
+
+        sg = tk.shotgun
+
+        # the records are created once their files are in place
+        for record in self._publishes:
+            future = record.futures.pop("copy", None)
+            if future is None:
+                continue
+            try:
+                (record.timings["copy"], methods) = future.result()
+            except Exception as e:
+                record.errors.append("Failed to copy the work files: %s" % e)
+            else:
+                record.item.properties["publish_transfer"] = methods
+
+        self._create_publishes(tk, sg)
+        self._create_versions(sg)
+
+        # uploads, in parallel
+        for record in self._publishes:
+            if record.entity and record.thumbnail_path:
+                record.futures["thumbnail"] = _pool().submit(
+                    _timed, self._upload_thumbnail, tk, record.entity, record.thumbnail_path
+                )
+        for record in self._versions:
+            if not record.entity:
+                continue
+            if record.upload_path:
+                record.futures["upload"] = _pool().submit(
+                    _timed, self._upload, tk, record.entity, record.upload_path
+                )
+            elif record.thumbnail_path:
+                record.futures["thumbnail"] = _pool().submit(
+                    _timed, self._upload_thumbnail, tk, record.entity, record.thumbnail_path
+                )
+
+        for record in self._publishes + self._versions:
+            for (step, future) in record.futures.items():
+                try:
+                    record.timings[step] = future.result()
+                except Exception as e:
+                    record.errors.append(STEP_ERRORS[step] % e)
+
+            (timings, errors) = self._results.setdefault(id(record.item), ({}, []))
+            prefix = "version " if record in self._versions else ""
+            timings.update(("%s%s" % (prefix, step), seconds) for (step, seconds) in record.timings.items())
+            errors.extend(record.errors)
+
+    def _create_publishes(self, tk, sg):
+        pending = [r for r in self._publishes if not r.errors]
+        by_item = dict((id(r.item), r) for r in pending)
+
+        # parents are created first, their children depend on them
+        while pending:
+            ready = []
+            for record in pending:
+                parent = by_item.get(id(getattr(record.item, "parent", None)))
+                if parent is None or parent.entity or parent.errors:
+                    ready.append(record)
+            if not ready:
+                ready = pending
+            pending = [r for r in pending if r not in ready]
+
+            start = time.time()
+            try:
+                entities = sg.batch([
+                    {
+                        "request_type": "create",
+                        "entity_type": record.data.get("type", "PublishedFile"),
+                        "data": dict((k, v) for (k, v) in record.data.items() if k != "type"),
+                    }
+                    for record in ready
+                ])
+            except Exception as e:
+                for record in ready:
+                    record.errors.append("Failed to register the publish: %s" % e)
+                continue
+
+            seconds = time.time() - start
+            for (record, entity) in zip(ready, entities):
+                record.entity = entity
+                record.timings["register"] = seconds / len(ready)
+                record.item.properties["sg_publish_data"] = entity
+
+                parent = by_item.get(id(getattr(record.item, "parent", None)))
+                if parent is not None and parent.entity:
+                    record.dependency_ids.append(parent.entity["id"])
+
+        self._create_dependencies(tk, sg)
+
+    def _create_dependencies(self, tk, sg):
+        records = [r for r in self._publishes if r.entity]
+        paths = set(p for r in records for p in r.dependency_paths)
+        by_path = {}
+        if paths:
+            from tank.util import find_publish
+            by_path = find_publish(tk, list(paths))
+
+        requests = []
+        for record in records:
+            (field, dependent_field) = DEPENDENCY_FIELDS[record.entity["type"]]
+            dependencies = [by_path[p]["id"] for p in record.dependency_paths if p in by_path]
+            for dependency_id in sorted(set(dependencies + record.dependency_ids)):
+                requests.append({
+                    "request_type": "create",
+                    "entity_type": "%sDependency" % record.entity["type"],
+                    "data": {
+                        field: record.entity,
+                        dependent_field: {"type": record.entity["type"], "id": dependency_id},
+                    },
+                })
+        if requests:
+            try:
+                sg.batch(requests)
+            except Exception as e:
+                for record in records:
+                    if record.dependency_paths or record.dependency_ids:
+                        record.errors.append("Failed to register the publish dependencies: %s" % e)
+
+    def _create_versions(self, sg):
+        records = [r for r in self._versions if not r.errors]
+        for record in records:
+            publish = record.item.properties.get("sg_publish_data")
+            if publish and "published_files" not in record.data:
+                record.data["published_files"] = [publish]
+        if not records:
+            return
+
+        start = time.time()
+        try:
+            entities = sg.batch([
+                {"request_type": "create", "entity_type": "Version", "data": record.data}
+                for record in records
+            ])
+        except Exception as e:
+            for record in records:
+                record.errors.append("Failed to create the version: %s" % e)
+            return
+
+        seconds = time.time() - start
+        for (record, entity) in zip(records, entities):
+            record.entity = entity
+            record.timings["register"] = seconds / len(records)
+            record.item.properties["sg_version_data"] = entity
+
+    @staticmethod
+    def _upload(tk, entity, path):
+        tk.shotgun.upload(entity["type"], entity["id"], path, "sg_uploaded_movie")
+
+    @staticmethod
+    def _upload_thumbnail(tk, entity, path):
+        tk.shotgun.upload_thumbnail(entity["type"], entity["id"], path)
@@ -0,0 +1,481 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+In-memory expansion of the folder schema, for bulk folder creation.
+
+The schema in ``core/schema`` is loaded once and expanded against Shotgun
+entities fetched up front, which gives the full list of folders and files to
+create without a Shotgun query per folder. The folders are then created on a
+thread pool, skipping the ones a single listing of their parent folders
+shows already exist.
+
+The folders of a batch of sequences, their shots and the steps of their
+tasks, on all the roots of the schema, are created from the command line::
+
+    python hooks/lib/cbfx/schema_folders.py /path/to/pipeline_configuration sq010 sq020
+    python hooks/lib/cbfx/schema_folders.py /path/to/pipeline_configuration sq010 --dry-run
+
+Only the folders are created, they are not registered in the Toolkit path
+cache. Running the regular folder creation afterwards registers them.
+"""
+import fnmatch
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from tank_vendor import yaml
+except ImportError:
+    import yaml
+
+# File listing the file name patterns of the schema which are not copied.
+IGNORE_FILES = "ignore_files"
+
+# Number of threads creating folders and copying files.
+CREATE_WORKERS = 16
+
+# Scope key holding the entity the step folders are created for.
+ENTITY_SCOPE_KEY = "_entity"
+
+# Shotgun fields fetched to expand the schema, by entity type.
+SCHEMA_FIELDS = {
+    "Sequence": ["code", "project"],
+    "Shot": ["code", "project", "sg_sequence"],
+    "Asset": ["code", "project", "sg_asset_type"],
+    "Task": ["entity", "step", "step.Step.short_name"],
+}
+
+
+class SchemaFolder(object):
+    """
+    A folder of the schema, with its configuration, files and sub folders.
+    """
+
+    def __init__(self, name, config, schema_path):
+        """
+        :param str name: Name of the folder in the schema.
+        :param dict config: The folder configuration, empty for a static folder
+            without a yml file.
+        :param str schema_path: Path to the folder in the schema.
+        """
+        self.name = name
+        self.config = config
+        self.schema_path = schema_path
+        self.type = config.get("type", "static")
+        self.children = []
+        self.files = []
+
+    def __repr__(self):
+        return "<SchemaFolder %s (%s)>" % (self.name, self.type)
+
+    def find(self, path):
+        """
+        Returns the descendant folder at the given schema relative path.
+
+        :param str path: Slash separated folder names, relative to this folder.
+        :returns: The folder, None if there is no such folder.
+        """
+        folder = self
+        for name in path.strip("/").split("/"):
+            folder = next((c for c in folder.children if c.name == name), None)
+            if folder is None:
+                return None
+        return folder
+
+
+def _read_yaml(path):
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_schema(schema_root):
+    """
+    Loads the folder schema.
+
+    :param str schema_root: Path to the ``core/schema`` folder.
+    :returns: The top level (project) folders, by root name.
+    :rtype: dict
+    """
+    ignore_path = os.path.join(schema_root, IGNORE_FILES)
+    ignored = [IGNORE_FILES]
+    if os.path.exists(ignore_path):
+        with open(ignore_path) as f:
+            ignored.extend(l.strip() for l in f if l.strip() and not l.startswith("#"))
+
+    def load(name, path, config):
+        folder = SchemaFolder(name, config, path)
+        with os.scandir(path) as entries:
+            entries = sorted(entries, key=lambda e: e.name)
+        names = set(e.name for e in entries)
+        for entry in entries:
+            if entry.is_dir():
+                yml = entry.name + ".yml"
+                child_config = _read_yaml(os.path.join(path, yml)) if yml in names else {}
+                folder.children.append(load(entry.name, entry.path, child_config))
+            elif entry.name.endswith(".yml") and entry.name[:-4] in names:
+                # configuration of a sub folder
+                continue
+            elif not any(fnmatch.fnmatch(entry.name, p) for p in ignored):
+                folder.files.append(entry.path)
+        return folder
+
+    roots = {}
+    with os.scandir(schema_root) as entries:
+        for entry in entries:
+            config_path = os.path.join(schema_root, entry.name + ".yml")
+            if entry.is_dir() and os.path.exists(config_path):
+                config = _read_yaml(config_path)
+                roots[config.get("root_name", "primary")] = load(entry.name, entry.path, config)
+    return roots
+
+
+def _matches(entity, filters, scope):
+    """
+    Checks an entity against the filters of a schema folder.
+
+    Values starting with ``$`` refer to the entities or values of the parent
+    folders, by schema folder name.
+    """
+    for condition in filters or []:
+        value = entity.get(condition["path"])
+        if isinstance(value, dict):
+            value = value.get("id")
+
+        expected = []
+        for v in condition["values"]:
+            if isinstance(v, str) and v.startswith("$"):
+                v = scope.get(v[1:])
+            if isinstance(v, dict):
+                v = v.get("id")
+            expected.append(v)
+
+        relation = condition["relation"]
+        if relation in ("is", "in") and value not in expected:
+            return False
+        if relation in ("is_not", "not_in") and value in expected:
+            return False
+    return True
+
+
+class FolderPlanner(object):
+    """
+    Expands schema folders into the folders and files to create on disk.
+    """
+
+    def __init__(self, entities):
+        """
+        :param dict entities: Shotgun entities by entity type. The entities
+            must hold the fields used in the schema: folder name fields and
+            filter paths. Step folders are expanded from the ``Task``
+            entities, which need the ``entity`` and ``step.Step.short_name``
+            fields.
+        """
+        self.entities = entities
+
+        # steps of each entity, from its tasks
+        self._steps = {}
+        for task in entities.get("Task", []):
+            if not task.get("entity") or not task.get("step"):
+                continue
+            step = dict(task["step"], short_name=task.get("step.Step.short_name"))
+            key = (task["entity"]["type"], task["entity"]["id"])
+            steps = self._steps.setdefault(key, [])
+            if step["id"] not in [s["id"] for s in steps]:
+                steps.append(step)
+
+    def plan(self, folder, path, scope):
+        """
+        Expands a schema folder and its sub folders.
+
+        Folders whose creation is deferred to an engine are skipped.
+
+        :param folder: The :class:`SchemaFolder` to expand.
+        :param str path: Path on disk of the folder.
+        :param dict scope: The entities of the parent folders, by schema folder name.
+        :returns: Folders to create, and (source, destination) files to copy.
+        :rtype: tuple
+        """
+        folders = [path]
+        copies = [(f, os.path.join(path, os.path.basename(f))) for f in folder.files]
+
+        for child in folder.children:
+            for (child_path, child_scope) in self.expand(child, path, scope):
+                (child_folders, child_copies) = self.plan(child, child_path, child_scope)
+                folders.extend(child_folders)
+                copies.extend(child_copies)
+
+        return (folders, copies)
+
+    def expand(self, folder, parent_path, scope):
+        """
+        Returns the paths a schema folder expands to below a parent path.
+
+        :returns: List of (path, scope) tuples.
+        """
+        if folder.type == "static":
+            if folder.config.get("defer_creation"):
+                return []
+            return [(os.path.join(parent_path, folder.name), scope)]
+
+        if folder.type == "shotgun_entity":
+            expanded = []
+            for entity in self.entities.get(folder.config["entity_type"], []):
+                name = entity.get(folder.config["name"])
+                if not name or not _matches(entity, folder.config.get("filters"), scope):
+                    continue
+                child_scope = dict(scope)
+                child_scope[folder.name] = entity
+                child_scope[ENTITY_SCOPE_KEY] = entity
+                expanded.append((os.path.join(parent_path, name), child_scope))
+            return expanded
+
+        if folder.type == "shotgun_step":
+            entity = scope.get(ENTITY_SCOPE_KEY)
+            if entity is None:
+                return []
+            expanded = []
+            for step in self._steps.get((entity["type"], entity["id"]), []):
+                name = step.get(folder.config.get("name", "short_name"))
+                if not name or not _matches(step, folder.config.get("filters"), scope):
+                    continue
+                child_scope = dict(scope)
+                child_scope[folder.name] = step
+                expanded.append((os.path.join(parent_path, name), child_scope))
+            return expanded
+
+        if folder.type == "shotgun_list_field":
+            # only the values in use are known without a schema query
+            values = sorted(set(
+                e.get(folder.config["field_name"])
+                for e in self.entities.get(folder.config["entity_type"], [])
+                if e.get(folder.config["field_name"])
+            ))
+            expanded = []
+            for value in values:
+                child_scope = dict(scope)
+                child_scope[folder.name] = value
+                expanded.append((os.path.join(parent_path, value), child_scope))
+            return expanded
+
+        # other folder types need Toolkit folder creation
+        return []
+
+
+# Filters restricting the entities to a batch of sequences, by entity type.
+SEQUENCE_FILTERS = {
+    "Sequence": [["code", "in", "$sequences"]],
+    "Shot": [["sg_sequence.Sequence.code", "in", "$sequences"]],
+    "Task": [{
+        "filter_operator": "any",
+        "filters": [
+            ["entity.Sequence.code", "in", "$sequences"],
+            ["entity.Shot.sg_sequence.Sequence.code", "in", "$sequences"],
+        ],
+    }],
+}
+
+
+def _sequence_filters(entity_type, sequences):
+    def resolve(condition):
+        if isinstance(condition, dict):
+            return dict(condition, filters=[resolve(c) for c in condition["filters"]])
+        return [sequences if v == "$sequences" else v for v in condition]
+    return [resolve(c) for c in SEQUENCE_FILTERS[entity_type]]
+
+
+def fetch_entities(sg, project, entity_types=None, sequences=None):
+    """
+    Fetches the entities of a project needed to expand the schema.
+
+    One query is made per entity type, whatever the number of entities.
+
+    :param sg: Shotgun connection.
+    :param dict project: The project entity.
+    :param list entity_types: Entity types to fetch, all the
+        :data:`SCHEMA_FIELDS` types by default.
+    :param list sequences: Only fetch these sequences, by code, their shots
+        and their tasks. The other entity types are left out.
+    :returns: Entities by entity type.
+    :rtype: dict
+    """
+    entities = {}
+    for entity_type in entity_types or SCHEMA_FIELDS:
+        filters = [["project", "is", project]]
+        if sequences is not None:
+            if entity_type not in SEQUENCE_FILTERS:
+                entities[entity_type] = []
+                continue
+            filters.extend(_sequence_filters(entity_type, list(sequences)))
+        entities[entity_type] = sg.find(entity_type, filters, SCHEMA_FIELDS[entity_type])
+    return entities
+
+
+def plan_tree(folder, path, project, entities, subfolders=None):
+    """
+    Expands a top level folder of the schema for a project.
+
+    :param folder: The top level :class:`SchemaFolder`, as returned by :func:`load_schema`.
+    :param str path: Path to the project folder on this root.
+    :param dict project: The project entity.
+    :param dict entities: Entities by type, see :func:`fetch_entities`.
+    :param list subfolders: Only expand these schema relative folders.
+    :returns: Folders to create, and (source, destination) files to copy.
+    :rtype: tuple
+    """
+    planner = FolderPlanner(entities)
+    scope = {folder.name: project}
+    if not subfolders:
+        return planner.plan(folder, path, scope)
+
+    folders = []
+    copies = []
+    for subfolder in subfolders:
+        child = folder.find(subfolder)
+        if child is None:
+            continue
+        (parent, _) = os.path.split(subfolder.strip("/"))
+        parent_path = os.path.join(path, *parent.split("/")) if parent else path
+        for (child_path, child_scope) in planner.expand(child, parent_path, scope):
+            (f, c) = planner.plan(child, child_path, child_scope)
+            folders.extend(f)
+            copies.extend(c)
+    return (folders, copies)
+
+
+def path_key(path):
+    """
+    Returns a path normalized for comparisons, case insensitive on the
+    platforms whose file systems are.
+    """
+    return os.path.normcase(os.path.normpath(path))
+
+
+def existing_paths(paths, workers=CREATE_WORKERS):
+    """
+    Returns which of the given paths exist on disk.
+
+    Each distinct parent folder is listed once, on a thread pool, instead of
+    checking every path on its own.
+
+    :param paths: Paths to check.
+    :param int workers: Number of threads.
+    :returns: The existing paths, as returned by :func:`path_key`.
+    :rtype: set
+    """
+    parents = {}
+    for path in paths:
+        (parent, name) = os.path.split(path_key(path))
+        parents.setdefault(parent, set()).add(name)
+
+    def list_parent(parent):
+        try:
+            with os.scandir(parent) as entries:
+                return [
+                    path_key(os.path.join(parent, e.name)) for e in entries
+                    if os.path.normcase(e.name) in parents[parent]
+                ]
+        except OSError:
+            return []
+
+    existing = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(list_parent, list(parents)):
+            existing.update(found)
+    return existing
+
+
+def create_folders(folders, copies, workers=CREATE_WORKERS, dry_run=False):
+    """
+    Creates folders and copies files on a thread pool.
+
+    Folders are deduplicated and the ones already on disk are skipped.
+    Existing files are not overwritten.
+
+    :param list folders: Folders to create.
+    :param list copies: (source, destination) files to copy.
+    :param int workers: Number of threads.
+    :param bool dry_run: Only compute what would be created.
+    :returns: Counters: ``planned`` and ``created`` folders, ``copied``
+        files and the ``seconds`` it took.
+    :rtype: dict
+    """
+    start = time.time()
+    planned = sorted(set(os.path.normpath(f) for f in folders))
+    copies = dict((os.path.normpath(d), s) for (s, d) in copies)
+    existing = existing_paths(planned + list(copies), workers)
+    missing = [f for f in planned if path_key(f) not in existing]
+    to_copy = [(s, d) for (d, s) in copies.items() if path_key(d) not in existing]
+
+    if not dry_run:
+        def make_folder(path):
+            os.makedirs(path, exist_ok=True)
+
+        def copy(item):
+            shutil.copy2(*item)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # sorted, so that parents are usually created before their children
+            list(pool.map(make_folder, missing))
+            list(pool.map(copy, to_copy))
+
+    return {
+        "planned": len(planned),
+        "created": len(missing),
+        "copied": len(to_copy),
+        "seconds": time.time() - start,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Creates the folders of sequences, their shots and their steps."
+    )
+    parser.add_argument("pipeline_configuration", help="Root of the pipeline configuration.")
+    parser.add_argument("sequences", nargs="+", metavar="SEQUENCE", help="Codes of the sequences.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report the number of folders to create.")
+    args = parser.parse_args()
+
+    import sgtk
+
+    tk = sgtk.sgtk_from_path(args.pipeline_configuration)
+    config = tk.pipeline_configuration
+    project = {"type": "Project", "id": config.get_project_id()}
+
+    start = time.time()
+    entities = fetch_entities(tk.shotgun, project, sequences=args.sequences)
+    folders = []
+    copies = []
+    schema = load_schema(os.path.join(config.get_config_location(), "core", "schema"))
+    for (root_name, folder) in sorted(schema.items()):
+        if root_name not in tk.roots:
+            continue
+        path = os.path.join(tk.roots[root_name], *config.get_project_disk_name().split("/"))
+        (f, c) = plan_tree(folder, path, project, entities)
+        folders.extend(f)
+        copies.extend(c)
+    planned = time.time() - start
+
+    stats = create_folders(folders, copies, dry_run=args.dry_run)
+    print(
+        "%s %d of %d folders and %d files for %d shots, planned in %.2fs, %s in %.2fs" % (
+            "Would create" if args.dry_run else "Created",
+            stats["created"], stats["planned"], stats["copied"], len(entities["Shot"]),
+            planned, "checked" if args.dry_run else "done", stats["seconds"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Process-wide cache of Shotgun entity records.
+"""
+import collections
+import threading
+import time
+
+
+class EntityCache(object):
+    """
+    Time and size bounded cache of Shotgun entities keyed by ``(type, id)``.
+
+    Each record remembers which fields were queried for it, so a lookup only
+    hits when all the requested fields are available. The least recently used
+    records are evicted once the cache is full.
+    """
+
+    def __init__(self, ttl=300, max_size=512):
+        """
+        :param float ttl: Number of seconds a record stays valid.
+        :param int max_size: Maximum number of records kept in the cache.
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._records = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, entity_type, entity_id, fields):
+        """
+        Returns a cached entity.
+
+        :param str entity_type: Shotgun entity type.
+        :param int entity_id: Shotgun entity id.
+        :param list fields: Fields the entity must hold.
+        :returns: A copy of the entity dictionary, or None on a cache miss.
+        """
+        key = (entity_type, entity_id)
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                return None
+
+            (expiry, entity) = record
+            if expiry < time.time():
+                del self._records[key]
+                return None
+
+            if any(field not in entity for field in fields):
+                return None
+
+            self._records.move_to_end(key)
+            return dict(entity)
+
+    def put(self, entity):
+        """
+        Adds or refreshes an entity in the cache.
+
+        Fields already cached for the entity are kept and updated with the
+        new values.
+
+        :param dict entity: Shotgun entity dictionary, with ``type`` and ``id`` keys.
+        """
+        key = (entity["type"], entity["id"])
+        with self._lock:
+            record = self._records.pop(key, None)
+            cached = dict(record[1]) if record else {}
+            cached.update(entity)
+            self._records[key] = (time.time() + self.ttl, cached)
+
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def invalidate(self, entity_type=None, entity_id=None):
+        """
+        Drops records from the cache.
+
+        :param str entity_type: Only drop records of this type.
+        :param int entity_id: Only drop the record with this id.
+        """
+        with self._lock:
+            if entity_type is None:
+                self._records.clear()
+                return
+
+            for key in list(self._records):
+                if key[0] == entity_type and entity_id in (None, key[1]):
+                    del self._records[key]
+
+    def __len__(self):
+        return len(self._records)
+
+
+# The cache shared by all the hooks running in this process.
+entities = EntityCache()
+
+
+def invalidate():
+    """
+    Clears the process-wide entity cache.
+    """
+    entities.invalidate()
@@ -0,0 +1,193 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Background task status updates, queued on local disk.
+"""
+import json
+import os
+import threading
+import time
+
+# Delay before the first retry of a failed update, doubled on every attempt.
+RETRY_DELAY = 5.0
+
+# Longest delay between two attempts.
+MAX_RETRY_DELAY = 600.0
+
+# Updates still failing after this many attempts are dropped.
+MAX_ATTEMPTS = 12
+
+
+class TaskStatusQueue(object):
+    """
+    Durable queue of task status changes sent to Shotgun from a worker thread.
+
+    Pending changes are stored in a JSON file keyed by task id, so repeated
+    requests for the same task are coalesced into a single update and
+    changes which couldn't be sent survive the process. Each change is a
+    read-check-write: the task status is only updated if it still holds the
+    expected value when the change is sent.
+    """
+
+    def __init__(self, path, logger):
+        """
+        :param str path: Path to the JSON file backing the queue.
+        :param logger: Standard python logger to report progress to.
+        """
+        self.path = path
+        self.logger = logger
+        self._condition = threading.Condition()
+        self._tk = None
+        self._worker = None
+        self._pending = self._load()
+
+    def enqueue(self, task_id, from_status, to_status):
+        """
+        Queues a task status change.
+
+        A change already queued for the task is replaced.
+
+        :param int task_id: Id of the task to update.
+        :param str from_status: Status the task must have to be updated.
+        :param str to_status: Status to set on the task.
+        """
+        with self._condition:
+            self._pending[str(task_id)] = {
+                "from": from_status,
+                "to": to_status,
+                "attempts": 0,
+                "next_attempt": 0,
+            }
+            self._save()
+            self._condition.notify()
+
+    def start(self, tk):
+        """
+        Starts the worker thread sending the queued changes, if not running.
+
+        :param tk: The :class:`~sgtk.Sgtk` instance whose Shotgun connection is used.
+        """
+        with self._condition:
+            self._tk = tk
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="TaskStatusQueue")
+            self._worker.daemon = True
+            self._worker.start()
+
+    def _run(self):
+        """
+        Sends the due changes until the queue is empty.
+        """
+        while True:
+            with self._condition:
+                if not self._pending:
+                    self._worker = None
+                    return
+
+                now = time.time()
+                due = [
+                    (task_id, dict(change))
+                    for (task_id, change) in self._pending.items()
+                    if change["next_attempt"] <= now
+                ]
+                if not due:
+                    next_attempt = min(c["next_attempt"] for c in self._pending.values())
+                    self._condition.wait(next_attempt - now)
+                    continue
+                tk = self._tk
+
+            for (task_id, change) in due:
+                self._send(tk, task_id, change)
+
+    def _send(self, tk, task_id, change):
+        """
+        Applies a single change and updates the queue accordingly.
+        """
+        try:
+            # the toolkit connection is cached per thread, this one is ours.
+            shotgun = tk.shotgun
+            task = shotgun.find_one("Task", [["id", "is", int(task_id)]], ["sg_status_list"])
+            if task and task["sg_status_list"] == change["from"]:
+                shotgun.update("Task", int(task_id), {"sg_status_list": change["to"]})
+                self.logger.debug(
+                    "[CBFX] changed task %s status to '%s'" % (task_id, change["to"])
+                )
+        except Exception as e:
+            attempts = change["attempts"] + 1
+            with self._condition:
+                # leave the change alone if it was requested again meanwhile
+                if self._pending.get(task_id) != change:
+                    return
+                if attempts >= MAX_ATTEMPTS:
+                    self.logger.warning(
+                        "[CBFX] giving up on task %s status change: %s" % (task_id, e)
+                    )
+                    del self._pending[task_id]
+                else:
+                    delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                    self.logger.debug(
+                        "[CBFX] task %s status change failed, retrying in %ds: %s"
+                        % (task_id, delay, e)
+                    )
+                    change["attempts"] = attempts
+                    change["next_attempt"] = time.time() + delay
+                    self._pending[task_id] = change
+                self._save()
+            return
+
+        with self._condition:
+            if self._pending.get(task_id) == change:
+                del self._pending[task_id]
+                self._save()
+
+    def _load(self):
+        """
+        Reads the pending changes from disk.
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _save(self):
+        """
+        Writes the pending changes to disk, atomically.
+        """
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(self._pending, f)
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            self.logger.warning("[CBFX] unable to save the task status queue: %s" % e)
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(path, logger):
+    """
+    Returns the process-wide queue backed by the given file.
+
+    :param str path: Path to the JSON file backing the queue.
+    :param logger: Standard python logger to report progress to.
+    :rtype: :class:`TaskStatusQueue`
+    """
+    with _queues_lock:
+        if path not in _queues:
+            _queues[path] = TaskStatusQueue(path, logger)
+        return _queues[path]
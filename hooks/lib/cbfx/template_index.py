@@ -0,0 +1,147 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Index of the path templates of a configuration, for fast path matching.
+
+``Sgtk.template_from_path`` validates a path against every path template of
+the configuration. The index buckets the templates by storage root, first
+static folder below the root and file extension, so that only a handful of
+candidates need to be validated for a given path. Templates without an
+extension are candidates for any path, the values of their last key may
+hold a dot.
+"""
+import os
+import sys
+import threading
+
+# Bucket for templates whose first folder or extension holds a key.
+ANY = "*"
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _normalize(path):
+    path = path.replace("\\", "/")
+    if sys.platform == "win32":
+        path = path.lower()
+    return path
+
+
+def _is_static(token):
+    return not any(c in token for c in "{}[]")
+
+
+class TemplateIndex(object):
+    """
+    Path templates bucketed by root, first folder and extension.
+    """
+
+    def __init__(self, templates):
+        """
+        :param dict templates: Template names and templates, as found in
+            ``Sgtk.templates``. Only path templates are indexed.
+        """
+        self.templates = templates
+        self._roots = {}
+
+        for (name, template) in templates.items():
+            root_path = getattr(template, "root_path", None)
+            if root_path is None:
+                # string template
+                continue
+
+            definition = template.definition.replace("\\", "/").strip("/")
+            segments = definition.split("/")
+
+            first = segments[0] if len(segments) > 1 and _is_static(segments[0]) else ANY
+            ext = os.path.splitext(segments[-1])[1]
+            if not _is_static(ext):
+                ext = ANY
+
+            root = _normalize(root_path).rstrip("/")
+            buckets = self._roots.setdefault(root, {})
+            buckets.setdefault(
+                (_normalize(first) if first is not ANY else ANY, _normalize(ext) if ext is not ANY else ANY),
+                [],
+            ).append(template)
+
+        # longest roots first, so nested roots resolve to the deepest one
+        self._root_order = sorted(self._roots, key=len, reverse=True)
+
+    def candidates(self, path):
+        """
+        Returns the templates which could match the given path.
+
+        :param str path: Path to look up.
+        :rtype: list
+        """
+        normalized = _normalize(path)
+        candidates = []
+        for root in self._root_order:
+            if not normalized.startswith(root + "/"):
+                continue
+
+            segments = normalized[len(root) + 1:].split("/")
+            first = segments[0] if len(segments) > 1 else None
+            ext = os.path.splitext(segments[-1])[1]
+
+            buckets = self._roots[root]
+            exts = (ext, "", ANY) if ext else ("", ANY)
+            for key in [(f, e) for f in (first, ANY) for e in exts]:
+                candidates.extend(buckets.get(key, ()))
+        return candidates
+
+    def templates_from_path(self, path):
+        """
+        Returns all the templates matching the given path.
+
+        :param str path: Path to match.
+        :rtype: list
+        """
+        return [t for t in self.candidates(path) if t.validate(path)]
+
+    def template_from_path(self, path):
+        """
+        Returns the template matching the given path.
+
+        :param str path: Path to match.
+        :returns: The matching template, None if no template matches.
+        :raises ValueError: If more than one template matches the path.
+        """
+        matches = self.templates_from_path(path)
+        if len(matches) > 1:
+            raise ValueError(
+                "%d templates are matching the path '%s': %s" % (
+                    len(matches), path, ", ".join(str(t) for t in matches)
+                )
+            )
+        return matches[0] if matches else None
+
+
+def get_index(tk):
+    """
+    Returns the template index of a Toolkit instance.
+
+    The index is built on first use for each pipeline configuration and
+    rebuilt whenever its templates are reloaded.
+
+    :param tk: The :class:`~sgtk.Sgtk` instance.
+    :rtype: :class:`TemplateIndex`
+    """
+    templates = tk.templates
+    key = tk.pipeline_configuration.get_path()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.templates is not templates:
+            index = TemplateIndex(templates)
+            _indexes[key] = index
+        return index
@@ -0,0 +1,344 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Copy of work files to the publish area without moving their data around
+when possible, with a verification manifest.
+
+Each file is transferred with the cheapest of:
+
+- a reflink (copy-on-write clone, Linux ``FICLONE``), when the work and
+  publish areas share a file system which supports it,
+- a hard link, on the same file system, when allowed,
+- a kernel side copy, ``copy_file_range`` or ``sendfile``, in chunks,
+- a plain copy.
+
+The files of a sequence are transferred in parallel. Each transfer is then
+verified: linked files must be the same file or have the same size, copied
+files the same size and checksum. The outcome is written to a JSON manifest
+next to the published files, which can be checked again later::
+
+    python hooks/lib/cbfx/transfer.py /path/to/.comp_v001.%04d.exr.manifest.json
+
+Hard links share their data with the work file: saving or rendering over
+it in place would change the publish. They are off by default, and are only
+meant for read-only render outputs, never for session or work files.
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Version of the manifest layout.
+MANIFEST_VERSION = 1
+
+# Name of the manifest of a published file, written next to it.
+MANIFEST_NAME = ".%s.manifest.json"
+
+# Number of files transferred at the same time.
+TRANSFER_WORKERS = 8
+
+# Bytes moved by each kernel copy call, and read at a time for checksums.
+CHUNK_SIZE = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# Transfer methods, from the cheapest.
+REFLINK = "reflink"
+HARDLINK = "hardlink"
+KERNEL_COPY = "kernel_copy"
+COPY = "copy"
+
+# ioctl cloning a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Errors telling a link or kernel copy isn't possible, so the next method
+# is tried.
+_UNSUPPORTED = set(
+    getattr(errno, name) for name in (
+        "EXDEV", "EPERM", "EACCES", "EMLINK", "ENOTSUP", "EOPNOTSUPP",
+        "EINVAL", "ENOSYS", "ENOTTY", "EBADF",
+    )
+    if hasattr(errno, name)
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class TransferError(Exception):
+    """
+    Raised when a file can't be transferred or doesn't match its source.
+    """
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS)
+        return _executor
+
+
+def manifest_path(path):
+    """
+    Returns the path of the manifest of a published file or sequence.
+
+    :param str path: The published file, or the sequence path with its
+        frame token.
+    """
+    return os.path.join(os.path.dirname(path), MANIFEST_NAME % os.path.basename(path))
+
+
+def checksum(path):
+    """
+    Returns the checksum of a file, as stored in the manifests.
+
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def transfer_file(source, destination, hardlink=False):
+    """
+    Transfers a file, replacing the destination if it exists.
+
+    :param str source: The file to transfer.
+    :param str destination: Where to transfer it. Its folder must exist.
+    :param bool hardlink: Allow hard links.
+    :returns: The method used.
+    :rtype: str
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+    same_device = os.stat(source).st_dev == os.stat(os.path.dirname(destination) or ".").st_dev
+    if same_device:
+        if _reflink(source, destination):
+            return REFLINK
+        if hardlink:
+            try:
+                os.link(source, destination)
+                return HARDLINK
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+
+    if _kernel_copy(source, destination):
+        method = KERNEL_COPY
+    else:
+        shutil.copyfile(source, destination)
+        method = COPY
+    shutil.copystat(source, destination)
+    return method
+
+
+def _reflink(source, destination):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    with open(source, "rb") as src:
+        with open(destination, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except (IOError, OSError) as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                cloned = False
+            else:
+                cloned = True
+    if not cloned:
+        os.remove(destination)
+    return cloned
+
+
+def _kernel_copy(source, destination):
+    copy_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None) if sys.platform.startswith("linux") else None
+    if copy_range is None and sendfile is None:
+        return False
+
+    with open(source, "rb") as src:
+        size = os.fstat(src.fileno()).st_size
+        with open(destination, "wb") as dst:
+            (src_fd, dst_fd) = (src.fileno(), dst.fileno())
+            offset = 0
+            while offset < size:
+                count = min(CHUNK_SIZE, size - offset)
+                try:
+                    if copy_range is not None:
+                        copied = copy_range(src_fd, dst_fd, count, offset, offset)
+                    else:
+                        copied = sendfile(dst_fd, src_fd, offset, count)
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    if copy_range is None or offset:
+                        break
+                    # not between these file systems, try the other call
+                    copy_range = None
+                    if sendfile is None:
+                        break
+                    continue
+                if not copied:
+                    break
+                offset += copied
+    if offset < size:
+        os.remove(destination)
+        return False
+    return True
+
+
+def _transfer(source, destination, hardlink, verify):
+    method = transfer_file(source, destination, hardlink)
+
+    src_stat = os.stat(source)
+    dst_stat = os.stat(destination)
+    entry = {
+        "source": source,
+        "size": src_stat.st_size,
+        "method": method,
+    }
+    if dst_stat.st_size != src_stat.st_size:
+        raise TransferError(
+            "'%s' is %d bytes, its source '%s' is %d bytes"
+            % (destination, dst_stat.st_size, source, src_stat.st_size)
+        )
+    if method == HARDLINK:
+        if (dst_stat.st_dev, dst_stat.st_ino) != (src_stat.st_dev, src_stat.st_ino):
+            raise TransferError("'%s' is not a link to '%s'" % (destination, source))
+    elif method != REFLINK and verify:
+        # a clone shares the data of its source, a copy has to be read back
+        entry["checksum"] = checksum(source)
+        if checksum(destination) != entry["checksum"]:
+            raise TransferError("'%s' doesn't match its source '%s'" % (destination, source))
+    return (destination, entry)
+
+
+def transfer_files(transfers, manifest=None, hardlink=False, verify=True):
+    """
+    Transfers files in parallel, creating the destination folders, and
+    verifies them.
+
+    :param list transfers: ``(source, destination)`` paths.
+    :param str manifest: Where to write the manifest of the transfer, see
+        :func:`manifest_path`.
+    :param bool hardlink: Allow hard links.
+    :param bool verify: Compare the checksums of the copied files.
+    :returns: Number of files transferred by each method.
+    :rtype: dict
+    :raises TransferError: If a file couldn't be transferred or verified.
+    """
+    for folder in set(os.path.dirname(d) for (_, d) in transfers):
+        if folder and not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+
+    start = time.time()
+    futures = [
+        _pool().submit(_transfer, source, destination, hardlink, verify)
+        for (source, destination) in transfers
+    ]
+    files = {}
+    errors = []
+    for future in futures:
+        try:
+            (destination, entry) = future.result()
+        except Exception as e:
+            errors.append(str(e))
+        else:
+            files[os.path.basename(destination)] = entry
+    if errors:
+        raise TransferError(
+            "%d of %d file(s) failed to transfer:\n%s"
+            % (len(errors), len(transfers), "\n".join(errors[:10]))
+        )
+
+    methods = {}
+    for entry in files.values():
+        methods[entry["method"]] = methods.get(entry["method"], 0) + 1
+
+    if manifest:
+        data = {
+            "version": MANIFEST_VERSION,
+            "generated": time.time(),
+            "seconds": time.time() - start,
+            "files": files,
+        }
+        tmp_path = "%s.%d.tmp" % (manifest, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest)
+    return methods
+
+
+def verify_manifest(manifest):
+    """
+    Checks the files of a manifest against it.
+
+    :param str manifest: The manifest file.
+    :returns: Descriptions of the problems found, empty if none.
+    :rtype: list
+    """
+    with open(manifest) as f:
+        data = json.load(f)
+    if data.get("version") != MANIFEST_VERSION:
+        return ["'%s' is of an unknown version" % manifest]
+
+    folder = os.path.dirname(manifest)
+    problems = []
+    for (name, entry) in sorted(data["files"].items()):
+        path = os.path.join(folder, name)
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            problems.append("'%s' is missing" % path)
+            continue
+        if size != entry["size"]:
+            problems.append("'%s' is %d bytes, %d expected" % (path, size, entry["size"]))
+        elif "checksum" in entry and checksum(path) != entry["checksum"]:
+            problems.append("'%s' doesn't match its checksum" % path)
+    return problems
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Checks published files against their manifests.")
+    parser.add_argument("manifests", nargs="+", help="Manifest files.")
+    args = parser.parse_args()
+
+    status = 0
+    for manifest in args.manifests:
+        problems = verify_manifest(manifest)
+        for problem in problems:
+            print(problem)
+        if problems:
+            status = 1
+        else:
+            print("%s: ok" % manifest)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Bounded queues of background jobs, shared by the hooks of a process.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue(object):
+    """
+    Runs jobs on a fixed number of daemon threads.
+
+    The queue is bounded: :meth:`submit` refuses new jobs once ``max_size``
+    jobs are waiting, leaving it to the caller to decide what to do.
+    """
+
+    def __init__(self, name, workers=1, max_size=16):
+        """
+        :param str name: Name of the queue, used to name its threads.
+        :param int workers: Number of worker threads.
+        :param int max_size: Maximum number of jobs waiting to run.
+        """
+        self.name = name
+        self._jobs = queue.Queue(max_size)
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name="%s-%d" % (name, i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queues a job.
+
+        :param func: Callable to run on a worker thread.
+        :returns: False if the queue is full and the job was not queued.
+        :rtype: bool
+        """
+        try:
+            self._jobs.put_nowait((func, args, kwargs))
+        except queue.Full:
+            return False
+        return True
+
+    def join(self):
+        """
+        Blocks until all the queued jobs are done.
+        """
+        self._jobs.join()
+
+    def _run(self):
+        while True:
+            (func, args, kwargs) = self._jobs.get()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                # jobs are expected to report their own errors
+                logger.exception("Unhandled error in %s job" % self.name)
+            finally:
+                self._jobs.task_done()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(name, workers=1, max_size=16):
+    """
+    Returns the process-wide queue with the given name, creating it if needed.
+
+    :param str name: Name of the queue.
+    :param int workers: Number of worker threads of a new queue.
+    :param int max_size: Maximum number of jobs waiting in a new queue.
+    :rtype: :class:`WorkQueue`
+    """
+    with _queues_lock:
+        if name not in _queues:
+            _queues[name] = WorkQueue(name, workers, max_size)
+        return _queues[name]
@@ -0,0 +1,362 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cache of the versioned files of the work and publish areas, for the
+tk-multi-workfiles2 file browser.
+
+The file browser lists the files of an area with ``Sgtk.paths_from_template``,
+on every open and every context change of its UI. :func:`paths_from_template`
+is a cached equivalent, which scans each area once and keeps, for every
+folder of the area, its modification time, its sub folders and its files
+with the fields parsed from the template. A folder is listed again only when
+its modification time changed, an unchanged area costs a ``stat`` per folder.
+
+Scans are kept in memory and written to the local cache of the workstation,
+so that all the DCC sessions of the workstation share them. They are keyed
+by the definition of the template and of its keys, a scan made with another
+version of the templates is never used.
+
+The app has no hook its own lookups go through, it isn't routed through the
+cache: hooks and tools of this configuration listing the versioned files of
+an area call :func:`paths_from_template` instead of Toolkit's.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+
+# Version of the cache layout, caches of another version are ignored.
+CACHE_VERSION = 2
+
+# Folder of the cache files, in the Toolkit cache of the workstation.
+CACHE_FOLDER = "cbfx_work_scan"
+
+# Maximum number of area scans kept in memory.
+MEMORY_SIZE = 256
+
+# Field values stored as is in the cache, others are parsed again from the
+# path when needed.
+_PLAIN_TYPES = (int, float, str, bool, type(None))
+
+logger = logging.getLogger(__name__)
+
+# Area scans, by cache file path
+_scans = collections.OrderedDict()
+_scans_lock = threading.Lock()
+
+
+class AreaScan(object):
+    """
+    Files of an area matching a template.
+
+    Folders are keyed by their path relative to the area, with forward
+    slashes, the area itself being ``""``. Each entry holds the folder
+    modification time in nanoseconds, the names of its sub folders and, for
+    the folders holding the files, ``file name -> fields``.
+    """
+
+    def __init__(self, root, template_name, folders):
+        """
+        :param str root: The area folder.
+        :param str template_name: Name of the template of the files.
+        :param dict folders: ``relative path -> [mtime, sub folders, files]``
+        """
+        self.root = os.path.normpath(root)
+        self.template_name = template_name
+        self.folders = folders
+
+    def files(self):
+        """
+        Yields the path of each file of the area and its fields, None when
+        they aren't cached.
+        """
+        for (rel, (_, _, files)) in self.folders.items():
+            folder = os.path.join(self.root, *rel.split("/")) if rel else self.root
+            for (name, fields) in files.items():
+                yield (os.path.join(folder, name), fields)
+
+    def to_dict(self):
+        return {
+            "version": CACHE_VERSION,
+            "root": self.root,
+            "template": self.template_name,
+            "folders": self.folders,
+        }
+
+
+def template_signature(template):
+    """
+    Returns the definition of a template and of its keys, as a string.
+
+    Key attributes without a stable representation are left out.
+    """
+    parts = [template.name, template.definition]
+    keys = template.keys if isinstance(template.keys, dict) else dict.fromkeys(template.keys)
+    for name in sorted(keys):
+        key = keys[name]
+        attributes = sorted(
+            (attr, repr(value)) for (attr, value) in getattr(key, "__dict__", {}).items()
+        )
+        parts.append("%s:%s:%s" % (
+            name,
+            type(key).__name__,
+            ",".join("%s=%s" % (attr, value) for (attr, value) in attributes if " at 0x" not in value),
+        ))
+    return "|".join(parts)
+
+
+def cache_path(root, template):
+    """
+    Returns the cache file of an area scan.
+
+    :param str root: The area folder.
+    :param template: The template of the files.
+    """
+    from tank.util import LocalFileStorageManager
+
+    key = hashlib.sha1(
+        ("%s|%s" % (os.path.normpath(root), template_signature(template))).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(
+        LocalFileStorageManager.get_global_root(LocalFileStorageManager.CACHE),
+        CACHE_FOLDER,
+        "%s.json" % key,
+    )
+
+
+def scan(root, template, segments, previous=None):
+    """
+    Lists the files of an area matching a template.
+
+    :param str root: The area folder.
+    :param template: The template of the files.
+    :param list segments: The folder and file name segments of the template
+        below the area. Static folders are the only ones walked into.
+    :param previous: A scan of the same area. Folders whose modification
+        time didn't change since are not listed again.
+    :type previous: :class:`AreaScan`
+    :rtype: :class:`AreaScan`
+    """
+    folders = {}
+    known = previous.folders if previous else {}
+    _scan(os.path.normpath(root), "", template, segments, known, folders)
+    return AreaScan(root, template.name, folders)
+
+
+def _scan(path, rel, template, segments, known, folders):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return
+
+    entry = known.get(rel)
+    if entry is None or entry[0] != mtime:
+        subfolders = []
+        files = {}
+        try:
+            with os.scandir(path) as items:
+                for item in items:
+                    if item.name.startswith("."):
+                        continue
+                    if len(segments) > 1:
+                        if item.is_dir() and _matches(segments[0], item.name):
+                            subfolders.append(item.name)
+                    elif item.is_file() and template.validate(item.path):
+                        files[item.name] = _plain(template.get_fields(item.path))
+        except OSError:
+            return
+        entry = [mtime, sorted(subfolders), files]
+
+    folders[rel] = entry
+    for name in entry[1]:
+        _scan(
+            os.path.join(path, name),
+            "%s/%s" % (rel, name) if rel else name,
+            template,
+            segments[1:],
+            known,
+            folders,
+        )
+
+
+def _matches(segment, name):
+    if "{" in segment or "[" in segment:
+        return True
+    if os.path.normcase(segment) != segment:
+        return os.path.normcase(segment) == os.path.normcase(name)
+    return segment == name
+
+
+def _plain(fields):
+    if all(isinstance(v, _PLAIN_TYPES) for v in fields.values()):
+        return fields
+    return None
+
+
+def is_current(area_scan):
+    """
+    Tells whether none of the folders of a scan changed since.
+    """
+    for (rel, entry) in area_scan.folders.items():
+        path = os.path.join(area_scan.root, *rel.split("/")) if rel else area_scan.root
+        try:
+            if os.stat(path).st_mtime_ns != entry[0]:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def save(area_scan, path):
+    """
+    Writes a scan, atomically.
+    """
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+    tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.current_thread().ident)
+    with open(tmp_path, "w") as f:
+        json.dump(area_scan.to_dict(), f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """
+    Reads a scan.
+
+    :returns: The scan, None if it is missing, unreadable or of another
+        version.
+    :rtype: :class:`AreaScan`
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CACHE_VERSION:
+        return None
+    return AreaScan(data["root"], data["template"], data["folders"])
+
+
+def get_scan(root, template, segments):
+    """
+    Returns the current scan of an area, from memory, from the workstation
+    cache or from the disk, in that order, and updates the caches.
+
+    :rtype: :class:`AreaScan`
+    """
+    path = cache_path(root, template)
+    with _scans_lock:
+        cached = _scans.get(path)
+        if cached is not None:
+            _scans.move_to_end(path)
+
+    if cached is None:
+        cached = load(path)
+    if cached is not None and is_current(cached):
+        area_scan = cached
+    else:
+        area_scan = scan(root, template, segments, cached)
+        try:
+            save(area_scan, path)
+        except OSError as e:
+            logger.debug("Failed to cache the scan of %s: %s" % (root, e))
+
+    with _scans_lock:
+        _scans[path] = area_scan
+        _scans.move_to_end(path)
+        while len(_scans) > MEMORY_SIZE:
+            _scans.popitem(last=False)
+    return area_scan
+
+
+def area_of(template, fields, skip_keys):
+    """
+    Returns the deepest folder of a template the fields fully resolve.
+
+    :returns: The folder and the template segments below it, or
+        ``(None, None)`` if not even the root of the template resolves.
+    :rtype: tuple
+    """
+    known = set(k for k in fields if k not in skip_keys)
+    area_template = template.parent
+    while area_template is not None and not set(area_template.keys) <= known:
+        area_template = area_template.parent
+    if area_template is None:
+        return (None, None)
+
+    rel = template.definition[len(area_template.definition):].replace("\\", "/").strip("/")
+    return (area_template.apply_fields(fields), rel.split("/"))
+
+
+def paths_from_template(tk, template, fields, skip_keys=None, skip_missing_optional_keys=False):
+    """
+    Cached equivalent of ``Sgtk.paths_from_template``.
+
+    :param tk: Toolkit instance, used when the area can't be resolved.
+    :param template: The template of the files.
+    :param dict fields: Fields the files must match.
+    :param list skip_keys: Keys whose value doesn't matter.
+    :param bool skip_missing_optional_keys: Whether the optional keys
+        missing from ``fields`` don't matter, rather than being required to
+        be absent from the files.
+    :returns: The matching paths.
+    :rtype: list
+    """
+    skip_keys = set(skip_keys or [])
+    (root, segments) = area_of(template, fields, skip_keys)
+    if root is None or _has_abstract_fields(template, fields, skip_keys):
+        # abstract values (%04d, %V, ...) are matched by Toolkit
+        return tk.paths_from_template(template, fields, list(skip_keys), skip_missing_optional_keys)
+
+    required = {}
+    absent = []
+    for key in template.keys:
+        if key in skip_keys:
+            continue
+        if key in fields:
+            required[key] = fields[key]
+        elif not skip_missing_optional_keys and _is_optional(template, key):
+            absent.append(key)
+
+    paths = []
+    for (path, file_fields) in get_scan(root, template, segments).files():
+        if file_fields is None:
+            file_fields = template.get_fields(path)
+        if any(file_fields.get(k) != v for (k, v) in required.items()):
+            continue
+        if any(file_fields.get(k) is not None for k in absent):
+            continue
+        paths.append(path)
+    return paths
+
+
+def _is_optional(template, key):
+    is_optional = getattr(template, "is_optional", None)
+    return bool(is_optional and is_optional(key))
+
+
+def _has_abstract_fields(template, fields, skip_keys):
+    keys = template.keys
+    if not isinstance(keys, dict):
+        return False
+    return any(
+        getattr(keys[name], "is_abstract", False)
+        for name in keys
+        if name in fields and name not in skip_keys
+    )
+
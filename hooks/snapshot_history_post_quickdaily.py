@@ -8,22 +8,125 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import hashlib
+import threading
+import time
+
 from tank import Hook
 from tank import TankError
 
+from cbfx import work_queue
+
+# Maximum number of snapshots waiting to be copied. Snapshots are taken
+# synchronously when the queue is full.
+SNAPSHOT_QUEUE_SIZE = 4
+
+# Version of tk-multi-snapshot whose internal Snapshot handler splits the
+# save, on the main thread, from the copy, in the background. It is pinned in
+# env/includes/app_locations.yml. Other versions are snapshotted through the
+# public snapshot() method of the app, in the foreground.
+SNAPSHOT_APP_VERSION = "v0.7.4"
+
+# Digest of the last snapshotted content, by work file path.
+_snapshot_digests = {}
+_snapshot_digests_lock = threading.Lock()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    Returns the sha1 hex digest of a file.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class SnapshotHistoryPostQuickdaily(Hook):
 
     def execute(self, mov_path, version_id, comments, **kwargs):
         app = self.parent
         # get app
         snapshot_app = app.engine.apps["tk-multi-snapshot"]
-        # try to snapshot the file and add a comment
+
+        comment = "Automatically snapshotted after Quickdaily. "
+        comment += "User Comments: %s " % comments
+        comment += "Version id: %d " % version_id
+        comment += "Quicktime: %s" % mov_path
+
+        handler_class = None
+        if snapshot_app.version == SNAPSHOT_APP_VERSION:
+            handler_class = getattr(getattr(snapshot_app, "tk_multi_snapshot", None), "Snapshot", None)
+        if handler_class is None:
+            app.engine.logger.warning(
+                "tk-multi-snapshot %s doesn't expose the Snapshot handler of %s, "
+                "the Quickdaily snapshot is taken in the foreground."
+                % (snapshot_app.version, SNAPSHOT_APP_VERSION)
+            )
+            self._snapshot(snapshot_app.snapshot, None, comment)
+            return
+
+        # The current file is resolved and saved here, on the main thread,
+        # while the copy to the snapshot area happens in the background.
         try:
-            comment = "Automatically snapshotted after Quickdaily. "
-            comment += "User Comments: %s " % comments
-            comment += "Version id: %d " % version_id
-            comment += "Quicktime: %s" % mov_path
-            snapshot_app.snapshot(comment)
-        except TankError:
+            handler = handler_class(snapshot_app)
+            work_path = handler.get_current_file_path()
+            handler.save_current_file()
+        except TankError as e:
             # fine, means file wasn't a proper snapshot
-            pass
+            app.engine.logger.info("Quickdaily snapshot skipped: %s" % e)
+            return
+
+        queue = work_queue.get_queue("quickdaily-snapshot", max_size=SNAPSHOT_QUEUE_SIZE)
+        if not queue.submit(self._snapshot, handler.do_snapshot, work_path, comment):
+            app.engine.logger.debug("Snapshot queue is full, snapshotting in the foreground.")
+            self._snapshot(handler.do_snapshot, work_path, comment)
+
+    def _snapshot(self, snapshot, work_path, comment):
+        """
+        Takes a snapshot and reports the outcome to the engine logger.
+
+        When the work file is known, it is only copied if its content changed
+        since the last snapshot taken from this session.
+
+        :param snapshot: Callable taking the snapshot.
+        :param str work_path: The work file, None to let the snapshot app find it.
+        :param str comment: The snapshot comment.
+        """
+        logger = self.parent.engine.logger
+        start = time.time()
+        try:
+            digest = None
+            if work_path:
+                digest = file_digest(work_path)
+                with _snapshot_digests_lock:
+                    unchanged = _snapshot_digests.get(work_path) == digest
+                if unchanged:
+                    logger.info(
+                        "Quickdaily snapshot of %s skipped, unchanged since the last "
+                        "snapshot (%.2fs)" % (work_path, time.time() - start)
+                    )
+                    return
+                snapshot(work_path, None, comment)
+            else:
+                snapshot(comment)
+
+            if digest:
+                with _snapshot_digests_lock:
+                    _snapshot_digests[work_path] = digest
+        except TankError as e:
+            # means file wasn't a proper snapshot
+            logger.info(
+                "Quickdaily snapshot skipped after %.2fs: %s" % (time.time() - start, e)
+            )
+        except Exception as e:
+            logger.error(
+                "Quickdaily snapshot of %s failed after %.2fs: %s"
+                % (work_path or "the current file", time.time() - start, e)
+            )
+        else:
+            logger.info(
+                "Quickdaily snapshot of %s done in %.2fs"
+                % (work_path or "the current file", time.time() - start)
+            )
@@ -16,14 +16,22 @@ to set environment variables or run scripts as part of the app initialization.
 """
 
 import os
+
 import tank
 
+from cbfx import profiling
+from cbfx import task_status
+
+# File, in the app cache location, holding the task status changes not yet
+# sent to Shotgun.
+TASK_STATUS_QUEUE_FILE = "task_status_queue.json"
 
 class BeforeAppLaunch(tank.Hook):
     """
     Hook to set up the system prior to app launch.
     """
 
+    @profiling.profiled("before_app_launch", record="launcher")
     def execute(self, app_path, app_args, version, engine_name, **kwargs):
         """
         The execute functon of the hook will be called prior to starting the required application
@@ -48,6 +56,11 @@ class BeforeAppLaunch(tank.Hook):
 
         # this is the way SG says to do this
 
+        # the launched application picks the launch id up from the
+        # environment, so that startup timings on both sides can be joined.
+        profiling.start_launch()
+        profiling.annotate(engine=engine_name, version=version, app_path=app_path)
+
         self.logger.debug("[CBFX] engine name: %s" % engine_name)
 
         # if engine_name == "tk-nuke":
@@ -69,14 +82,14 @@ class BeforeAppLaunch(tank.Hook):
         #         tank.util.append_path_to_env_var(k, v)
         #         self.logger.debug("[CBFX] added environ %s=%s" % (k, v))
 
-        # Sets the current task to in progress
+        # Sets the current task to in progress. The update is sent from a
+        # background thread so that the launch is never blocked by Shotgun.
         if self.parent.context.task:
             task_id = self.parent.context.task['id']
-            task = self.parent.sgtk.shotgun.find_one("Task", filters=[["id", "is", task_id]], fields=["sg_status_list"])
-            self.logger.debug("[CBFX] task %s status is %s" % (task_id, task['sg_status_list']))
-            if task['sg_status_list'] == 'rdy':
-                data = {
-                    'sg_status_list': 'ip'
-                }
-                self.parent.shotgun.update("Task", task_id, data)
-                self.logger.debug("[CBFX] changed task status to 'ip'")
+            queue = task_status.get_queue(
+                os.path.join(self.parent.cache_location, TASK_STATUS_QUEUE_FILE),
+                self.logger,
+            )
+            queue.enqueue(task_id, 'rdy', 'ip')
+            queue.start(self.parent.sgtk)
+            self.logger.debug("[CBFX] queued task %s status change 'rdy' -> 'ip'" % task_id)
@@ -8,8 +8,11 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+
 import sgtk
 
+from cbfx import profiling
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
 class BeforeRegisterCommand(HookBaseClass):
@@ -20,6 +23,7 @@ class BeforeRegisterCommand(HookBaseClass):
     the parent engine. Note: this hook is only run for Software entity
     launchers.
     """
+    @profiling.profiled("before_register_command")
     def determine_engine_instance_name(self, software_version, engine_instance_name):
         """
         Hook method to intercept SoftwareLauncher and engine instance name data prior to
@@ -11,16 +11,291 @@
 """
 Hook that loads defines all the available actions, broken down by publish type.
 """
+import collections
 import os
 import re
-import glob
-import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import sgtk
 
+from cbfx import preflight
+from cbfx import template_index
+
 HookBaseClass = sgtk.get_hook_baseclass()
 
 
+# This pattern will match the following at the end of a file root and
+# retain the frame number or frame token as group(1) in the resulting
+# match object:
+#
+# 0001
+# ####
+# %04d
+#
+# The number of digits or hashes does not matter; we match as many as
+# exist.
+FRAME_TOKEN_PATTERN = re.compile(r"([0-9#]+|[%]0\dd)$")
+
+# Maximum number of directory listings, and of sequence scans, kept in memory
+# by the sequence scanner.
+DIRECTORY_CACHE_SIZE = 128
+
+# Number of threads used to run the disk work of batched loader actions.
+PREPARE_WORKERS = 8
+
+# Files checked with cbfx.preflight before they are handed to Nuke or
+# Hiero, by action.
+PREFLIGHT_KINDS = {
+    "script_import": preflight.NUKE_SCRIPT,
+    "open_project": preflight.HIERO_PROJECT,
+}
+
+# Number of clips created and added to the bin at a time by bulk clip imports.
+# Progress is reported and cancellation checked between chunks.
+CLIP_IMPORT_CHUNK_SIZE = 25
+
+# Marker for a sequence range that hasn't been looked up yet.
+_NOT_SCANNED = object()
+
+# Node classes by action and extension, keyed by the value of the
+# node_extensions setting merged into NODE_EXTENSIONS.
+_node_extension_registries = {}
+_node_extension_lock = threading.Lock()
+
+# Actions whose disk work is prefetched when the publish is clicked.
+PREFETCH_ACTIONS = frozenset(["read_node", "script_import", "open_project"])
+
+# Number of prefetched publishes kept in memory, and how long they stay valid
+# in seconds. Renders may still be landing on disk, so keep it short.
+PREFETCH_CACHE_SIZE = 64
+PREFETCH_TTL = 30
+
+_prefetch_executor = None
+_prefetch_cache = collections.OrderedDict()
+_prefetch_pending = set()
+_prefetch_lock = threading.Lock()
+
+# Actions handled by this hook, in the order they are listed in the loader:
+# action name -> (handler method, caption, description)
+ACTIONS = collections.OrderedDict([
+    ("read_node", ("_create_read_node",
+                   "Create Read Node",
+                   "This will add a read node to the current scene.")),
+    ("camera_node", ("_create_camera_node",
+                     "Create Camera Node",
+                     "This will add a Camera node to the current scene.")),
+    ("readgeo_node", ("_create_readgeo_node",
+                      "Create ReadGeo Node",
+                      "This will add a ReadGeo node to the current scene.")),
+    ("script_import", ("_import_script",
+                       "Import Contents",
+                       "This will import all the nodes into the current scene.")),
+    ("open_project", ("_open_project",
+                      "Open Project",
+                      "This will open the Nuke Studio project in the current session.")),
+    ("clip_import", ("_import_clip",
+                     "Import Clip",
+                     "This will import a publish as clip in Hiero or Nuke Studio.")),
+])
+
+# Node class created for each supported file extension, by action. More
+# extensions can be registered with the ``node_extensions`` setting of the
+# loader, using the same layout.
+NODE_EXTENSIONS = {
+    "read_node": dict.fromkeys(
+        frozenset([".png", ".jpg", ".jpeg", ".exr", ".cin", ".dpx", ".tiff", ".tif",
+                   ".mov", ".mp4", ".psd", ".tga", ".ari", ".gif", ".iff"]),
+        "Read",
+    ),
+    "readgeo_node": {".abc": "ReadGeo2", ".fbx": "ReadGeo2"},
+    "camera_node": {".abc": "Camera2", ".fbx": "Camera2"},
+}
+
+# If this is an Alembic cache, use a ReadGeo2.
+NODE_EXTENSIONS["read_node"][".abc"] = "ReadGeo2"
+
+_directory_cache = collections.OrderedDict()
+_directory_cache_lock = threading.Lock()
+
+# Sequences found by scan_sequence, keyed by (directory, frame pattern):
+# (directory mtime, scan)
+_sequence_cache = collections.OrderedDict()
+
+
+class SequenceScan(collections.namedtuple("SequenceScan", ["first", "last", "frames"])):
+    """
+    Result of scanning a frame sequence on disk.
+
+    :ivar int first: The first frame found on disk.
+    :ivar int last: The last frame found on disk.
+    :ivar tuple frames: Sorted frame numbers found on disk.
+    """
+    __slots__ = ()
+
+    @property
+    def range(self):
+        """
+        The ``(first, last)`` frame range of the sequence.
+        """
+        return (self.first, self.last)
+
+    @property
+    def missing_frames(self):
+        """
+        Sorted list of frame numbers missing between first and last.
+
+        The frames must be unique, see :func:`scan_sequence`.
+        """
+        if len(self.frames) == self.last - self.first + 1:
+            return []
+        present = set(self.frames)
+        return [f for f in range(self.first, self.last + 1) if f not in present]
+
+    @property
+    def gaps(self):
+        """
+        List of ``(start, end)`` inclusive frame runs missing from the sequence.
+        """
+        gaps = []
+        for previous, current in zip(self.frames, self.frames[1:]):
+            if current - previous > 1:
+                gaps.append((previous + 1, current - 1))
+        return gaps
+
+
+def _prefetch_key(sg_publish_data, name):
+    return (sg_publish_data.get("type"), sg_publish_data.get("id"), name)
+
+
+def _prefetch_hit(key, now):
+    """
+    Returns a valid prefetch cache entry, dropping it if expired.
+
+    Must be called with the prefetch lock held.
+    """
+    entry = _prefetch_cache.get(key)
+    if entry is None:
+        return None
+    if now - entry[0] > PREFETCH_TTL:
+        del _prefetch_cache[key]
+        return None
+    return entry
+
+
+def list_directory(path):
+    """
+    Returns the names of the files in the given directory.
+
+    Listings are cached per directory and reused for as long as the
+    directory modification time is unchanged, so repeated scans of the
+    same render folder only cost a single ``stat`` call.
+
+    :param str path: The directory to list.
+    :returns: The file names found in the directory.
+    :rtype: tuple
+    """
+    return _list_directory(path)[1]
+
+
+def _list_directory(path):
+    """
+    Returns the modification time of a directory, None if it can't be
+    listed, and the names of its files.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return (None, ())
+
+    with _directory_cache_lock:
+        cached = _directory_cache.get(path)
+        if cached and cached[0] == mtime:
+            _directory_cache.move_to_end(path)
+            return cached
+
+    try:
+        with os.scandir(path) as entries:
+            names = tuple(entry.name for entry in entries if not entry.is_dir())
+    except OSError:
+        return (None, ())
+
+    with _directory_cache_lock:
+        _directory_cache[path] = (mtime, names)
+        _directory_cache.move_to_end(path)
+        while len(_directory_cache) > DIRECTORY_CACHE_SIZE:
+            _directory_cache.popitem(last=False)
+
+    return (mtime, names)
+
+
+def clear_directory_cache():
+    """
+    Drops all the cached directory listings and sequence scans.
+    """
+    with _directory_cache_lock:
+        _directory_cache.clear()
+        _sequence_cache.clear()
+
+
+def scan_sequence(path):
+    """
+    Scans the disk for the frames of the sequence the given path belongs to.
+
+    The frame number or frame token (``0001``, ``####``, ``%04d``) is expected
+    at the end of the basename, just ahead of the file extension. The parent
+    directory is listed once and every file name is matched against a single
+    compiled pattern built from the sequence prefix and extension.
+
+    Scans are cached per directory and sequence, and reused for as long as
+    the directory modification time is unchanged. Frame numbers written
+    with a different padding (``001`` and ``0001``) count as one frame.
+
+    :param str path: A frame path or frame token path of the sequence.
+    :returns: None if no frames could be found, otherwise a :class:`SequenceScan`.
+    """
+    directory, basename = os.path.split(path)
+    root, ext = os.path.splitext(basename)
+    match = FRAME_TOKEN_PATTERN.search(root)
+
+    # If we did not match, we don't know how to parse the file name, or there
+    # is no frame number to extract.
+    if not match:
+        return None
+
+    directory = directory or "."
+    pattern = r"^%s(\d+)%s$" % (re.escape(root[:match.start()]), re.escape(ext))
+    (mtime, names) = _list_directory(directory)
+    key = (directory, pattern)
+
+    with _directory_cache_lock:
+        cached = _sequence_cache.get(key)
+        if cached and mtime is not None and cached[0] == mtime:
+            _sequence_cache.move_to_end(key)
+            return cached[1]
+
+    frame_regex = re.compile(pattern)
+    frames = set()
+    for name in names:
+        frame_match = frame_regex.match(name)
+        if frame_match:
+            frames.add(int(frame_match.group(1)))
+
+    scan = None
+    if frames:
+        frames = sorted(frames)
+        scan = SequenceScan(frames[0], frames[-1], tuple(frames))
+
+    if mtime is not None:
+        with _directory_cache_lock:
+            _sequence_cache[key] = (mtime, scan)
+            _sequence_cache.move_to_end(key)
+            while len(_sequence_cache) > DIRECTORY_CACHE_SIZE:
+                _sequence_cache.popitem(last=False)
+    return scan
+
+
 class NukeActions(HookBaseClass):
 
     ##############################################################################################################
@@ -69,41 +344,15 @@ class NukeActions(HookBaseClass):
 
         action_instances = []
 
-        if "read_node" in actions:
-            action_instances.append({"name": "read_node",
-                                     "params": None,
-                                     "caption": "Create Read Node",
-                                     "description": "This will add a read node to the current scene."})
-
-        if "camera_node" in actions:
-            action_instances.append({"name": "camera_node",
-                                     "params": None,
-                                     "caption": "Create Camera Node",
-                                     "description": "This will add a Camera node to the current scene."})
-
-        if "readgeo_node" in actions:
-            action_instances.append({"name": "readgeo_node",
-                                     "params": None,
-                                     "caption": "Create ReadGeo Node",
-                                     "description": "This will add a ReadGeo node to the current scene."})
-
-        if "script_import" in actions:
-            action_instances.append({"name": "script_import",
-                                     "params": None,
-                                     "caption": "Import Contents",
-                                     "description": "This will import all the nodes into the current scene."})
-
-        if "open_project" in actions:
-            action_instances.append({"name": "open_project",
-                                     "params": None,
-                                     "caption": "Open Project",
-                                     "description": "This will open the Nuke Studio project in the current session."})
-
-        if "clip_import" in actions:
-            action_instances.append({"name": "clip_import",
-                                     "params": None,
-                                     "caption": "Import Clip",
-                                     "description": "This will import a publish as clip in Hiero or Nuke Studio."})
+        requested = frozenset(actions)
+        for (name, (_, caption, description)) in ACTIONS.items():
+            if name in requested:
+                action_instances.append({"name": name,
+                                         "params": None,
+                                         "caption": caption,
+                                         "description": description})
+
+        self._schedule_prefetch(sg_publish_data, requested)
 
         return action_instances
 
@@ -111,8 +360,15 @@ class NukeActions(HookBaseClass):
         """
         Executes the specified action on a list of items.
 
-        The default implementation dispatches each item from ``actions`` to
-        the ``execute_action`` method.
+        A single item is dispatched to the ``execute_action`` method. When
+        several items are selected, they are processed as a batch: the actions
+        are grouped by type, the disk work (existence checks and sequence
+        range scans) runs in parallel on a thread pool and all the Nuke nodes
+        are then created in one pass on the main thread. Clips are imported
+        together, see :meth:`_import_clips`.
+
+        Without a UI, as on the farm, the pool uses all the cores and the
+        nodes are created through ``nuke.nodes``, see :meth:`_new_node`.
 
         The ``actions`` is a list of dictionaries holding all the actions to execute.
         Each entry will have the following values:
@@ -127,16 +383,86 @@ class NukeActions(HookBaseClass):
             version of the loader.
 
         .. note::
-            The hook will stop applying the actions on the selection if an error
-            is raised midway through.
+            A failing item doesn't stop the batch. Failures are logged as they
+            happen and reported together once all the items have been processed.
 
         :param list actions: Action dictionaries.
         """
+        if len(actions) < 2:
+            for single_action in actions:
+                name = single_action["name"]
+                sg_publish_data = single_action["sg_publish_data"]
+                params = single_action["params"]
+                self.execute_action(name, params, sg_publish_data)
+            return
+
+        app = self.parent
+        app.log_debug("Execute multiple actions called for %d items." % len(actions))
+
+        failures = []
+
+        # resolve paths and group the items by action, keeping the selection order
+        groups = collections.OrderedDict()
+        prepared = {}
         for single_action in actions:
             name = single_action["name"]
             sg_publish_data = single_action["sg_publish_data"]
-            params = single_action["params"]
-            self.execute_action(name, params, sg_publish_data)
+            prefetched = self._prefetched(sg_publish_data, name)
+            if prefetched:
+                (path, seq_range) = prefetched
+                prepared[(name, path)] = (seq_range, None)
+            else:
+                try:
+                    path = self.get_publish_path(sg_publish_data).replace(os.path.sep, "/")
+                except Exception as e:
+                    failures.append(self._report_action_failure(sg_publish_data, e))
+                    continue
+            groups.setdefault(name, []).append((single_action, path))
+
+        # run all the disk work which wasn't prefetched in parallel
+        work = set(
+            (name, path) for (name, items) in groups.items() for (_, path) in items
+            if (name, path) not in prepared
+        )
+        workers = PREPARE_WORKERS
+        if self._headless():
+            # farm nodes run nothing but us, use all their cores
+            workers = max(PREPARE_WORKERS, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            prepared.update(zip(work, pool.map(self._safe_prepare_action, work)))
+
+        # and create the nodes on the main thread
+        for (name, items) in groups.items():
+            if name == "clip_import":
+                clips = []
+                for (single_action, path) in items:
+                    (_, error) = prepared[(name, path)]
+                    if error:
+                        failures.append(self._report_action_failure(single_action["sg_publish_data"], error))
+                    else:
+                        clips.append((path, single_action["sg_publish_data"]))
+                try:
+                    failures.extend(self._import_clips(clips))
+                except Exception as e:
+                    failures.extend(self._report_action_failure(data, e) for (_, data) in clips)
+                continue
+
+            for (single_action, path) in items:
+                sg_publish_data = single_action["sg_publish_data"]
+                (seq_range, error) = prepared[(name, path)]
+                try:
+                    if error:
+                        raise error
+                    self._run_action(name, path, sg_publish_data, seq_range)
+                except Exception as e:
+                    failures.append(self._report_action_failure(sg_publish_data, e))
+
+        if failures:
+            raise Exception(
+                "Failed to load %d of %d items:\n%s" % (
+                    len(failures), len(actions), "\n".join(failures)
+                )
+            )
 
     def execute_action(self, name, params, sg_publish_data):
         """
@@ -153,29 +479,194 @@ class NukeActions(HookBaseClass):
         app.log_debug("Execute action called for action %s. "
                       "Parameters: %s. Publish Data: %s" % (name, params, sg_publish_data))
 
+        # use the work prefetched when the publish was clicked, if any
+        prefetched = self._prefetched(sg_publish_data, name)
+        if prefetched:
+            (path, seq_range) = prefetched
+            self._run_action(name, path, sg_publish_data, seq_range)
+            return
+
         # resolve path - forward slashes on all platforms in Nuke
         path = self.get_publish_path(sg_publish_data).replace(os.path.sep, "/")
 
+        self._run_action(name, path, sg_publish_data)
+
+    ##############################################################################################################
+    # helper methods which can be subclassed in custom hooks to fine tune the behavior of things
+
+    def _run_action(self, name, path, sg_publish_data, seq_range=_NOT_SCANNED):
+        """
+        Runs the given action on a resolved publish path.
+
+        :param str name: Action name.
+        :param str path: Path to the file(s) to load.
+        :param dict sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+        :param seq_range: Sequence range already looked up for read nodes, if any.
+        """
+        if name not in ACTIONS:
+            return
+
+        handler = getattr(self, ACTIONS[name][0])
         if name == "read_node":
-            self._create_read_node(path, sg_publish_data)
+            handler(path, sg_publish_data, seq_range=seq_range)
+        else:
+            handler(path, sg_publish_data)
 
-        if name == "camera_node":
-            self._create_camera_node(path, sg_publish_data)
+    def _node_extensions(self, name):
+        """
+        Returns the node class to create for each supported extension of an action.
 
-        if name == "readgeo_node":
-            self._create_readgeo_node(path, sg_publish_data)
+        The defaults from :data:`NODE_EXTENSIONS` are merged with the
+        ``node_extensions`` setting of the app once per value of the setting,
+        for all the instances of the hook.
 
-        if name == "script_import":
-            self._import_script(path, sg_publish_data)
+        :param str name: Action name.
+        :returns: Lower case extensions mapped to Nuke node classes.
+        :rtype: dict
+        """
+        extensions = self.parent.get_setting("node_extensions") or {}
+        key = tuple(sorted(
+            (action, tuple(sorted((ext.lower(), node_class) for (ext, node_class) in mapping.items())))
+            for (action, mapping) in extensions.items()
+        ))
+        with _node_extension_lock:
+            registry = _node_extension_registries.get(key)
+            if registry is None:
+                registry = dict((action, dict(mapping)) for (action, mapping) in NODE_EXTENSIONS.items())
+                for (action, mapping) in key:
+                    registry.setdefault(action, {}).update(mapping)
+                _node_extension_registries[key] = registry
+        return registry.get(name, {})
+
+    def _node_class(self, name, path):
+        """
+        Returns the node class an action creates for the given file.
 
-        if name == "open_project":
-            self._open_project(path, sg_publish_data)
+        :param str name: Action name.
+        :param str path: Path to the file.
+        :raises Exception: If the file extension is not supported by the action.
+        """
+        (_, ext) = os.path.splitext(path)
+        node_class = self._node_extensions(name).get(ext.lower())
+        if node_class is None:
+            raise Exception("Unsupported file extension for '%s'!" % path)
+        return node_class
 
-        if name == "clip_import":
-            self._import_clip(path, sg_publish_data)
+    def _prepare_action(self, name, path):
+        """
+        Performs the disk work of an action ahead of its execution.
 
-    ##############################################################################################################
-    # helper methods which can be subclassed in custom hooks to fine tune the behavior of things
+        This runs on a worker thread and must not touch the Nuke API.
+
+        :param str name: Action name.
+        :param str path: Path to the file(s) to load.
+        :returns: The sequence range for read nodes, None otherwise.
+        :raises Exception: If the file the action needs doesn't exist or
+            isn't of the expected kind.
+        """
+        if name == "read_node":
+            return self._find_sequence_range(path)
+
+        if name in PREFLIGHT_KINDS:
+            preflight.check(path, PREFLIGHT_KINDS[name])
+
+        return None
+
+    def _safe_prepare_action(self, work_item):
+        """
+        Wraps :meth:`_prepare_action` so that errors are returned rather than raised.
+
+        :param tuple work_item: The ``(name, path)`` to prepare.
+        :returns: A ``(result, error)`` tuple.
+        """
+        try:
+            return (self._prepare_action(*work_item), None)
+        except Exception as e:
+            return (None, e)
+
+    def _schedule_prefetch(self, sg_publish_data, actions):
+        """
+        Prefetches the disk work of the given actions in the background.
+
+        The publish path is resolved and the actions prepared on a single
+        worker thread, so that prefetching never competes with the loader
+        for more than one core. Publishes already cached or queued are skipped.
+
+        :param dict sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+        :param actions: Names of the actions available for the publish.
+        """
+        global _prefetch_executor
+
+        names = [name for name in actions if name in PREFETCH_ACTIONS]
+        if not names or sg_publish_data.get("id") is None:
+            return
+
+        now = time.time()
+        with _prefetch_lock:
+            names = [
+                name for name in names
+                if _prefetch_key(sg_publish_data, name) not in _prefetch_pending
+                and not _prefetch_hit(_prefetch_key(sg_publish_data, name), now)
+            ]
+            if not names:
+                return
+            _prefetch_pending.update(_prefetch_key(sg_publish_data, name) for name in names)
+            if _prefetch_executor is None:
+                _prefetch_executor = ThreadPoolExecutor(max_workers=1)
+
+        _prefetch_executor.submit(self._prefetch, dict(sg_publish_data), names)
+
+    def _prefetch(self, sg_publish_data, names):
+        """
+        Resolves the publish path and prepares the actions, on the prefetch thread.
+
+        Failures are not cached, the action will report them when it runs.
+        """
+        keys = [_prefetch_key(sg_publish_data, name) for name in names]
+        try:
+            path = self.get_publish_path(sg_publish_data).replace(os.path.sep, "/")
+            for (key, name) in zip(keys, names):
+                (seq_range, error) = self._safe_prepare_action((name, path))
+                if error:
+                    continue
+                with _prefetch_lock:
+                    _prefetch_cache[key] = (time.time(), path, seq_range)
+                    _prefetch_cache.move_to_end(key)
+                    while len(_prefetch_cache) > PREFETCH_CACHE_SIZE:
+                        _prefetch_cache.popitem(last=False)
+        except Exception as e:
+            self.parent.log_debug("Prefetch failed for %s: %s" % (sg_publish_data.get("id"), e))
+        finally:
+            with _prefetch_lock:
+                _prefetch_pending.difference_update(keys)
+
+    def _prefetched(self, sg_publish_data, name):
+        """
+        Returns the prefetched work of an action, if still valid.
+
+        :returns: None, or the resolved path and the prepared sequence range.
+        :rtype: tuple
+        """
+        if name not in PREFETCH_ACTIONS:
+            return None
+        with _prefetch_lock:
+            entry = _prefetch_hit(_prefetch_key(sg_publish_data, name), time.time())
+        if entry:
+            return (entry[1], entry[2])
+        return None
+
+    def _report_action_failure(self, sg_publish_data, error):
+        """
+        Logs an item which failed to load in a batch.
+
+        :param dict sg_publish_data: Shotgun data dictionary of the failed item.
+        :param error: The exception raised for the item.
+        :returns: A one line description of the failure.
+        :rtype: str
+        """
+        message = "%s: %s" % (sg_publish_data.get("code") or sg_publish_data.get("id"), error)
+        self.parent.log_warning("Failed to load %s" % message)
+        return message
 
     def _import_clip(self, path, sg_publish_data):
         """
@@ -185,24 +676,116 @@ class NukeActions(HookBaseClass):
         :param dict sg_publish_data: Shotgun data dictionary with all of the standard publish
             fields.
         """
-        if not self.parent.engine.studio_enabled and not self.parent.engine.hiero_enabled:
-            raise Exception("Importing shot clips is only supported in Hiero and Nuke Studio.")
+        from hiero.core import (
+            BinItem,
+            MediaSource,
+            Clip,
+        )
 
-        import hiero
+        (_, clips_bin) = self._clip_import_target()
+        media_source = MediaSource(path)
+        clip = Clip(media_source)
+        clips_bin.addItem(BinItem(clip))
+
+    def _import_clips(self, items):
+        """
+        Imports several publishes into Nuke Studio or Hiero as clips.
+
+        The target project and bin are looked up once, then the clips are
+        created and added to the bin in chunks of :data:`CLIP_IMPORT_CHUNK_SIZE`,
+        all under a single undo group. When the engine has a UI, a progress
+        dialog is shown between chunks and cancelling it stops the import,
+        keeping the clips already imported.
+
+        :param list items: ``(path, sg_publish_data)`` tuples to import.
+        :returns: A one line description of each item which failed to import.
+        :rtype: list
+        """
         from hiero.core import (
             BinItem,
             MediaSource,
             Clip,
         )
 
-        if not hiero.core.projects():
+        if not items:
+            return []
+
+        (project, clips_bin) = self._clip_import_target()
+        progress = self._clip_import_progress(len(items))
+
+        failures = []
+        imported = 0
+        project.beginUndo("Import %d Clips" % len(items))
+        try:
+            for start in range(0, len(items), CLIP_IMPORT_CHUNK_SIZE):
+                if progress and progress.wasCanceled():
+                    self.parent.log_info(
+                        "Clip import cancelled, %d of %d clips imported." % (imported, len(items))
+                    )
+                    break
+
+                bin_items = []
+                for (path, sg_publish_data) in items[start:start + CLIP_IMPORT_CHUNK_SIZE]:
+                    try:
+                        bin_items.append(BinItem(Clip(MediaSource(path))))
+                    except Exception as e:
+                        failures.append(self._report_action_failure(sg_publish_data, e))
+
+                for bin_item in bin_items:
+                    clips_bin.addItem(bin_item)
+                imported += len(bin_items)
+
+                if progress:
+                    progress.setValue(min(start + CLIP_IMPORT_CHUNK_SIZE, len(items)))
+        finally:
+            project.endUndo()
+            if progress:
+                progress.close()
+
+        self.parent.log_debug("Imported %d of %d clips." % (imported, len(items)))
+        return failures
+
+    def _clip_import_target(self):
+        """
+        Returns the project and bin clips are imported into.
+
+        :returns: The last opened project and its clips bin.
+        :rtype: tuple
+        :raises Exception: If not running Hiero or Nuke Studio, or if no project is open.
+        """
+        if not self.parent.engine.studio_enabled and not self.parent.engine.hiero_enabled:
+            raise Exception("Importing shot clips is only supported in Hiero and Nuke Studio.")
+
+        import hiero
+
+        projects = hiero.core.projects()
+        if not projects:
             raise Exception("An active project must exist to import clips into.")
 
-        project = hiero.core.projects()[-1]
-        bins = project.clipsBin().bins()
-        media_source = MediaSource(path)
-        clip = Clip(media_source)
-        project.clipsBin().addItem(BinItem(clip))
+        project = projects[-1]
+        return (project, project.clipsBin())
+
+    def _clip_import_progress(self, count):
+        """
+        Returns a progress dialog for a bulk clip import.
+
+        :param int count: Number of clips to import.
+        :returns: A modal progress dialog, None if the engine has no UI or
+            the import fits in a single chunk.
+        """
+        if count <= CLIP_IMPORT_CHUNK_SIZE or not getattr(self.parent.engine, "has_ui", False):
+            return None
+
+        from sgtk.platform.qt import QtCore, QtGui
+
+        progress = QtGui.QProgressDialog("Importing %d clips..." % count, "Cancel", 0, count)
+        progress.setWindowTitle("Import Clips")
+        # a modal dialog processes the UI events on each update, which lets
+        # the user cancel between chunks.
+        progress.setWindowModality(QtCore.Qt.ApplicationModal)
+        progress.setMinimumDuration(0)
+        progress.setValue(0)
+        return progress
 
     def _import_script(self, path, sg_publish_data):
         """
@@ -213,9 +796,9 @@ class NukeActions(HookBaseClass):
         """
         import nuke
 
-        # must use unicode otherwise path won't be found
-        if not os.path.exists(path.decode('utf-8')):
-            raise Exception("File not found on disk - '%s'" % path)
+        # a missing, locked or truncated script is reported before Nuke
+        # spends time reading it.
+        preflight.check(path, preflight.NUKE_SCRIPT)
 
         nuke.nodePaste(path)
 
@@ -226,9 +809,7 @@ class NukeActions(HookBaseClass):
         :param path: Path to file.
         :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
         """
-
-        if not os.path.exists(path):
-            raise Exception("File not found on disk - '%s'" % path)
+        preflight.check(path, preflight.HIERO_PROJECT)
 
         import nuke
 
@@ -239,57 +820,55 @@ class NukeActions(HookBaseClass):
         import hiero
         hiero.core.openProject(path)
 
-    def _create_read_node(self, path, sg_publish_data):
+    def _create_read_node(self, path, sg_publish_data, seq_range=_NOT_SCANNED):
         """
         Create a read node representing the publish.
 
         :param path: Path to file.
         :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
+        :param seq_range: Sequence range already looked up for the path, if any.
         """
-        import nuke
-
-        (_, ext) = os.path.splitext(path)
+        node_class = self._node_class("read_node", path)
 
-        # If this is an Alembic cache, use a ReadGeo2 and we're done.
-        if ext.lower() == ".abc":
-            nuke.createNode("ReadGeo2", "file {%s}" % path)
+        # If this is geometry, such as an Alembic cache, we're done.
+        if node_class != "Read":
+            self._new_node(node_class, file=path)
             return
 
-        valid_extensions = [".png",
-                            ".jpg",
-                            ".jpeg",
-                            ".exr",
-                            ".cin",
-                            ".dpx",
-                            ".tiff",
-                            ".tif",
-                            ".mov",
-                            ".mp4",
-                            ".psd",
-                            ".tga",
-                            ".ari",
-                            ".gif",
-                            ".iff"]
-
-        if ext.lower() not in valid_extensions:
-            raise Exception("Unsupported file extension for '%s'!" % path)
-
-        # `nuke.createNode()` will extract the format and frame range from the
-        # file itself (if possible), whereas `nuke.nodes.Read()` won't. We'll
-        # also check to see if there's a matching template and override the
-        # frame range, but this should handle the zero config case. This will
-        # also automatically extract the format and frame range for movie files.
-        read_node = nuke.createNode("Read")
+        # Setting the file from user text extracts the format and frame range
+        # from the file itself (if possible). We'll also check to see if
+        # there's a matching template and override the frame range, but this
+        # should handle the zero config case. This will also automatically
+        # extract the format and frame range for movie files.
+        read_node = self._new_node("Read")
         read_node["file"].fromUserText(path)
 
         # find the sequence range if it has one:
-        seq_range = self._find_sequence_range(path)
+        if seq_range is _NOT_SCANNED:
+            seq_range = self._find_sequence_range(path)
 
         if seq_range:
             # override the detected frame range.
             read_node["first"].setValue(seq_range[0])
             read_node["last"].setValue(seq_range[1])
 
+            # let the artist know about holes in the sequence, the read node
+            # will otherwise silently error on the missing frames.
+            scan = scan_sequence(path)
+            if scan and scan.gaps:
+                self.parent.log_warning(
+                    "Sequence '%s' is missing %d frame(s) in range %d-%d: %s" % (
+                        path,
+                        len(scan.missing_frames),
+                        scan.first,
+                        scan.last,
+                        ", ".join(
+                            "%d-%d" % gap if gap[0] != gap[1] else "%d" % gap[0]
+                            for gap in scan.gaps
+                        ),
+                    )
+                )
+
     def _create_readgeo_node(self, path, sg_publish_data):
         """
         Create a read node representing the publish.
@@ -297,17 +876,9 @@ class NukeActions(HookBaseClass):
         :param path: Path to file.
         :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
         """
-        import nuke
-
-        (_, ext) = os.path.splitext(path)
-
-        valid_extensions = [".abc",
-                            ".fbx"]
-
-        if ext.lower() not in valid_extensions:
-            raise Exception("Unsupported file extension for '%s'!" % path)
+        node_class = self._node_class("readgeo_node", path)
 
-        nuke.createNode("ReadGeo2", "file {%s}" % path)
+        self._new_node(node_class, file=path)
 
     def _create_camera_node(self, path, sg_publish_data):
         """
@@ -316,17 +887,38 @@ class NukeActions(HookBaseClass):
         :param path: Path to file.
         :param sg_publish_data: Shotgun data dictionary with all the standard publish fields.
         """
+        node_class = self._node_class("camera_node", path)
+
+        self._new_node(node_class, read_from_file=1, file=path, label=os.path.basename(path))
+
+    def _headless(self):
+        """
+        Tells whether Nuke runs without a UI, on the farm or from a terminal.
+        """
         import nuke
 
-        (_, ext) = os.path.splitext(path)
+        return not nuke.env.get("gui")
 
-        valid_extensions = [".abc",
-                            ".fbx"]
+    def _new_node(self, node_class, **knobs):
+        """
+        Creates a node, setting the given knobs.
 
-        if ext.lower() not in valid_extensions:
-            raise Exception("Unsupported file extension for '%s'!" % path)
+        In an interactive session, the node is created with ``nuke.createNode``,
+        connected to the selection and shown like a node created by the user.
+        Without a UI, it's created with ``nuke.nodes``, which skips all the UI
+        side effects.
 
-        nuke.createNode("Camera2", "read_from_file 1 file {0} label {1}".format(path, os.path.basename(path)))
+        :param str node_class: The class of the node.
+        :param knobs: Knob values.
+        :returns: The node created.
+        """
+        import nuke
+
+        if self._headless():
+            return getattr(nuke.nodes, node_class)(**knobs)
+
+        args = " ".join("%s {%s}" % (name, value) for (name, value) in knobs.items())
+        return nuke.createNode(node_class, args)
 
     def _sequence_range_from_path(self, path):
         """
@@ -342,42 +934,10 @@ class NukeActions(HookBaseClass):
         :returns: None if no range could be determined, otherwise (min, max)
         :rtype: tuple or None
         """
-        # This pattern will match the following at the end of a string and
-        # retain the frame number or frame token as group(1) in the resulting
-        # match object:
-        #
-        # 0001
-        # ####
-        # %04d
-        #
-        # The number of digits or hashes does not matter; we match as many as
-        # exist.
-        frame_pattern = re.compile(r"([0-9#]+|[%]0\dd)$")
-        root, ext = os.path.splitext(path)
-        match = re.search(frame_pattern, root)
-
-        # If we did not match, we don't know how to parse the file name, or there
-        # is no frame number to extract.
-        if not match:
+        scan = scan_sequence(path)
+        if not scan:
             return None
-
-        # We need to get all files that match the pattern from disk so that we
-        # can determine what the min and max frame number is.
-        glob_path = "%s%s" % (
-            re.sub(frame_pattern, "*", root),
-            ext,
-        )
-        files = glob.glob(glob_path)
-
-        # Our pattern from above matches against the file root, so we need
-        # to chop off the extension at the end.
-        file_roots = [os.path.splitext(f)[0] for f in files]
-
-        # We know that the search will result in a match at this point, otherwise
-        # the glob wouldn't have found the file. We can search and pull group 1
-        # to get the integer frame number from the file root name.
-        frames = [int(re.search(frame_pattern, f).group(1)) for f in file_roots]
-        return (min(frames), max(frames))
+        return scan.range
 
     def _find_sequence_range(self, path):
         """
@@ -390,12 +950,17 @@ class NukeActions(HookBaseClass):
         :param path: Path to file on disk.
         :returns: None if no range could be determined, otherwise (min, max)
         """
-        # find a template that matches the path:
+        # find a template that matches the path, only validating the
+        # templates sharing its root, first folder and extension:
+        # (the index reports ambiguous paths with a ValueError, Toolkit with a
+        # TankError)
         template = None
         try:
-            template = self.parent.sgtk.template_from_path(path)
-        except sgtk.TankError:
-            pass
+            template = template_index.get_index(self.parent.sgtk).template_from_path(path)
+            if template:
+                fields = template.get_fields(path)
+        except (ValueError, sgtk.TankError):
+            template = None
 
         if not template:
             # If we don't have a template to take advantage of, then
@@ -403,11 +968,16 @@ class NukeActions(HookBaseClass):
             # to determine the frame range.
             return self._sequence_range_from_path(path)
 
-        # get the fields and find all matching files:
-        fields = template.get_fields(path)
+        # find all matching files:
         if "SEQ" not in fields:
             return None
 
+        # The frame number sits at the end of the file name for all of our
+        # sequence templates, so a single directory scan gives us the range.
+        scan = scan_sequence(path)
+        if scan:
+            return scan.range
+
         files = self.parent.sgtk.paths_from_template(template, fields, ["SEQ", "eye"])
 
         # find frame numbers from these files:
@@ -0,0 +1,241 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Publish plugin layer copying the files in parallel and registering the
+publishes in batch.
+
+It sits between the publish_file plugin of the app and the plugins of the
+engines deriving from it::
+
+    hook: "{self}/publish_file.py:{config}/tk-multi-publish2/publish_file.py:{engine}/..."
+
+The publish phase transfers the work files to the publish area on a worker
+pool, linking them rather than copying them when possible, see
+:mod:`cbfx.transfer`, and queues the PublishedFile records. The first item
+to be finalized creates all the records with a few Shotgun ``batch`` calls,
+see :mod:`cbfx.publish_batch`. The ``sg_publish_data`` property of an item is
+therefore only set at finalize time, so the ``Parallel Publish`` setting is
+off by default and only turned on for the plugins of an environment where
+nothing reads it during the publish phase.
+"""
+import time
+
+import sgtk
+
+from cbfx import publish_batch
+from cbfx import transfer
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+
+class ParallelPublishFilePlugin(HookBaseClass):
+    """
+    Queues the file copies and the publish records of the publish_file
+    plugins on :mod:`cbfx.publish_batch`.
+    """
+
+    @property
+    def settings(self):
+        base_settings = super(ParallelPublishFilePlugin, self).settings or {}
+        base_settings["Parallel Publish"] = {
+            "type": "bool",
+            "default": False,
+            "description": "Copy the files on a worker pool and register the "
+                           "publishes in batch, once all the items are "
+                           "published. The publish data of the items is only "
+                           "available at finalize time.",
+        }
+        base_settings["Hardlink Files"] = {
+            "type": "bool",
+            "default": False,
+            "description": "Hard link the work files to the publish area when "
+                           "they can't be cloned and share a file system. "
+                           "The publish and work files then share their data: "
+                           "only enable it for read-only render outputs, "
+                           "never for session or work files.",
+        }
+        base_settings["Verify Copies"] = {
+            "type": "bool",
+            "default": True,
+            "description": "Read back the files copied to the publish area "
+                           "and compare their checksums. Linked files are "
+                           "always checked.",
+        }
+        return base_settings
+
+    def publish(self, settings, item):
+        """
+        Starts the copy of the work files and queues the publish record.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        if not settings["Parallel Publish"].value:
+            return super(ParallelPublishFilePlugin, self).publish(settings, item)
+
+        batch = publish_batch.current(item, publish_batch.PUBLISH)
+        try:
+            self._queue_publish(settings, item, batch)
+        except Exception:
+            # nothing of this session gets registered
+            publish_batch.discard()
+            raise
+
+    def _queue_publish(self, settings, item, batch):
+        """
+        Starts the copy of the work files and queues the publish record in
+        the given batch.
+        """
+        publisher = self.parent
+        start = time.time()
+
+        publish_path = self.get_publish_path(settings, item)
+        dependencies = self.get_publish_dependencies(settings, item)
+        publish_data = {
+            "tk": publisher.sgtk,
+            "context": item.context,
+            "comment": item.description,
+            "path": publish_path,
+            "name": self.get_publish_name(settings, item),
+            "version_number": self.get_publish_version(settings, item),
+            "published_file_type": self.get_publish_type(settings, item),
+            "dry_run": True,
+        }
+        # hooks of older versions of the app don't define these
+        if hasattr(self, "get_publish_user"):
+            publish_data["created_by"] = self.get_publish_user(settings, item)
+        if hasattr(self, "get_publish_fields"):
+            publish_data["sg_fields"] = self.get_publish_fields(settings, item)
+        if hasattr(self, "get_publish_kwargs"):
+            publish_data.update(self.get_publish_kwargs(settings, item))
+
+        # the copies start right away, the record is created once they are done
+        copies = self._work_to_publish_copies(settings, item)
+        entity = sgtk.util.register_publish(**publish_data)
+
+        parent_publish = item.parent.properties.get("sg_publish_data") if item.parent else None
+        batch.add_publish(
+            item,
+            entity,
+            copies,
+            thumbnail_path=item.get_thumbnail_as_path(),
+            dependency_paths=dependencies,
+            dependency_ids=[parent_publish["id"]] if parent_publish else [],
+            manifest=transfer.manifest_path(publish_path) if copies else None,
+            hardlink=settings["Hardlink Files"].value,
+            verify=settings["Verify Copies"].value,
+        )
+
+        item.properties["publish_path"] = publish_path
+        self.logger.info(
+            "Publish queued: %d file(s) copying, registered once all the items "
+            "are published (%.2fs)" % (len(copies), time.time() - start)
+        )
+
+    def finalize(self, settings, item):
+        """
+        Registers the queued publishes, the first time it's called, and
+        reports what was done for the item.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        if settings["Parallel Publish"].value:
+            batch = publish_batch.queued(item, publish_batch.PUBLISH)
+            if batch is None:
+                raise Exception(
+                    "The publish of this item wasn't queued by this publish "
+                    "session, publish it again."
+                )
+            start = time.time()
+            batch.flush(self.parent.sgtk)
+            if time.time() - start > 0.001:
+                self.logger.debug("Publish batch flushed (%.2fs)" % (time.time() - start))
+
+            (timings, errors) = batch.result(item)
+            methods = item.properties.get("publish_transfer")
+            if methods:
+                self.logger.info(
+                    "Files transferred to the publish area: %s" % ", ".join(
+                        "%d by %s" % (count, method.replace("_", " "))
+                        for (method, count) in sorted(methods.items())
+                    )
+                )
+            if timings:
+                self.logger.info(
+                    "Publish timings",
+                    extra={
+                        "action_show_more_info": {
+                            "label": "Timings",
+                            "tooltip": "Time spent on each step for this item",
+                            "text": "<pre>%s</pre>" % "\n".join(
+                                "%-20s %8.2fs" % (step, seconds)
+                                for (step, seconds) in sorted(timings.items())
+                            ),
+                        }
+                    },
+                )
+            if errors:
+                raise Exception("\n".join(errors))
+
+        super(ParallelPublishFilePlugin, self).finalize(settings, item)
+
+    def _work_to_publish_copies(self, settings, item):
+        """
+        Returns the work files of an item to copy to the publish area, as done
+        by ``_copy_work_to_publish``.
+
+        :returns: ``(work file, publish file)`` paths, empty when the item is
+            published in place.
+        :rtype: list
+        """
+        work_template = item.properties.get("work_template")
+        if not work_template:
+            return []
+
+        publish_template = self.get_publish_template(settings, item)
+        if not publish_template:
+            return []
+
+        work_files = [item.properties.path]
+        if "sequence_paths" in item.properties:
+            work_files = item.properties.get("sequence_paths", [])
+            if not work_files:
+                self.logger.warning(
+                    "Sequence publish without a list of files. Publishing "
+                    "in place without copying."
+                )
+                return []
+
+        copies = []
+        for work_file in work_files:
+            if not work_template.validate(work_file):
+                self.logger.warning(
+                    "Work file '%s' did not match work template '%s'. "
+                    "Publishing in place." % (work_file, work_template)
+                )
+                return []
+
+            work_fields = work_template.get_fields(work_file)
+            missing_keys = publish_template.missing_keys(work_fields)
+            if missing_keys:
+                self.logger.warning(
+                    "Work file '%s' missing keys required for the publish "
+                    "template: %s" % (work_file, missing_keys)
+                )
+                return []
+
+            copies.append((work_file, publish_template.apply_fields(work_fields)))
+        return copies
@@ -0,0 +1,161 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Upload plugin layer creating the versions in batch and uploading their media
+in parallel::
+
+    hook: "{self}/upload_version.py:{config}/tk-multi-publish2/upload_version.py"
+
+The publish phase queues the Version records. The first item to be finalized
+creates them with a single Shotgun ``batch`` call, once the publishes they
+link to are registered, and uploads the movies and thumbnails on a worker
+pool, see :mod:`cbfx.publish_batch`. Like that of the publish_file layer, the
+``Parallel Publish`` setting is off by default.
+"""
+import os
+import re
+
+import sgtk
+
+from cbfx import publish_batch
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+# Frame number of a file of a sequence, before the extension.
+FRAME_REGEX = re.compile(r"(\d+)\.[^.]+$")
+
+
+class ParallelUploadVersionPlugin(HookBaseClass):
+    """
+    Queues the Version records and uploads of the upload_version plugin on
+    :mod:`cbfx.publish_batch`.
+    """
+
+    @property
+    def settings(self):
+        base_settings = super(ParallelUploadVersionPlugin, self).settings or {}
+        base_settings["Parallel Publish"] = {
+            "type": "bool",
+            "default": False,
+            "description": "Create the version in batch and upload its media "
+                           "on a worker pool, once all the items are "
+                           "published. The version data of the items is only "
+                           "available at finalize time.",
+        }
+        return base_settings
+
+    def publish(self, settings, item):
+        """
+        Queues the version of the item and its upload.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        if not settings["Parallel Publish"].value:
+            return super(ParallelUploadVersionPlugin, self).publish(settings, item)
+
+        batch = publish_batch.current(item, publish_batch.VERSION)
+        try:
+            self._queue_version(settings, item, batch)
+        except Exception:
+            # nothing of this session gets registered
+            publish_batch.discard()
+            raise
+
+    def _queue_version(self, settings, item, batch):
+        """
+        Queues the version of the item and its upload in the given batch.
+        """
+        publisher = self.parent
+        path = item.properties["path"]
+
+        # allow the publish name to be obtained from the parent item
+        publish_name = item.properties.get("publish_name")
+        if not publish_name:
+            publish_name = publisher.util.get_publish_name(path)
+
+        version_data = {
+            "project": item.context.project,
+            "code": publish_name,
+            "description": item.description,
+            "entity": self._get_version_entity(item),
+            "sg_task": item.context.task,
+        }
+
+        # linked on flush when the publish of the item is queued as well
+        if "sg_publish_data" in item.properties:
+            version_data["published_files"] = [item.properties["sg_publish_data"]]
+
+        if settings["Link Local File"].value:
+            version_data["sg_path_to_movie"] = path
+
+        frames = sorted(
+            int(match.group(1))
+            for match in (FRAME_REGEX.search(p) for p in item.properties.get("sequence_paths") or [])
+            if match
+        )
+        if frames:
+            version_data["sg_first_frame"] = frames[0]
+            version_data["sg_last_frame"] = frames[-1]
+            version_data["frame_count"] = frames[-1] - frames[0] + 1
+            version_data["frame_range"] = "%s-%s" % (frames[0], frames[-1])
+
+        upload_path = None
+        if settings["Upload"].value:
+            upload_path = path
+            if sgtk.util.is_windows():
+                upload_path = os.path.normpath(upload_path)
+
+        batch.add_version(
+            item,
+            version_data,
+            upload_path=upload_path,
+            # with uploaded content, the thumbnail is extracted from it
+            thumbnail_path=None if upload_path else item.get_thumbnail_as_path(),
+        )
+        self.logger.info("Version queued, created once all the items are published.")
+
+    def finalize(self, settings, item):
+        """
+        Creates the queued versions, the first time it's called, and reports
+        what was done for the item.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param item: Item to process
+        """
+        if settings["Parallel Publish"].value:
+            batch = publish_batch.queued(item, publish_batch.VERSION)
+            if batch is None:
+                raise Exception(
+                    "The version of this item wasn't queued by this publish "
+                    "session, publish it again."
+                )
+            batch.flush(self.parent.sgtk)
+
+            (timings, errors) = batch.result(item)
+            if errors:
+                raise Exception("\n".join(errors))
+            version = item.properties.get("sg_version_data")
+            if version:
+                self.logger.info(
+                    "Version created (%s)" % ", ".join(
+                        "%s %.2fs" % (step, seconds)
+                        for (step, seconds) in sorted(timings.items())
+                        if step.startswith("version ")
+                    ),
+                    extra={"action_show_in_shotgun": {"label": "Show Version", "entity": version}},
+                )
+
+        super(ParallelUploadVersionPlugin, self).finalize(settings, item)